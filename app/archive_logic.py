@@ -0,0 +1,114 @@
+# app/archive_logic.py
+# Moves old orders out of `Order` / Order_Detail into the compressed archive tables.
+#
+# MySQL can't RANGE partition a table that has (or is referenced by) foreign keys,
+# so the "partitioning" is done with a hot store (`Order`, Order_Detail) and a cold
+# store (Order_Archive, Order_Detail_Archive). Reports ask needs_archive() to
+# decide whether a date range has to look at the cold store too.
+#
+# Schedule it (e.g. cron, nightly) from the project root:
+#   python -m app.archive_logic --years 3
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app.db_connect import create_connection
+from app.lanes import BACKGROUND
+from app.query_loader import load_queries
+
+queries = load_queries("db/queries.sql")
+
+
+def archive_orders_older_than(years, chunk_size=500, sleep_seconds=0.1):
+    """
+    Move orders older than `years` years (and their details) to the archive tables.
+    Each chunk is copied and deleted in its own short transaction, so the tills
+    are never blocked for long and an interrupted run can simply be restarted.
+    Returns (True, {"orders": n, "cutoff": datetime}) or (False, message).
+    """
+    cutoff = datetime.now() - timedelta(days=365 * years)
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+
+        names = ["archive_select_order_chunk", "archive_copy_orders", "archive_copy_order_details",
+                 "archive_delete_order_details", "archive_delete_orders"]
+        sql = {name: queries.get(name) for name in names}
+        missing = [name for name, text in sql.items() if not text]
+        if missing:
+            return False, f"Query '{missing[0]}' not found."
+
+        archived = 0
+        while True:
+            cursor.execute(sql["archive_select_order_chunk"], (cutoff, chunk_size))
+            order_ids = [row[0] for row in cursor.fetchall()]
+            if not order_ids:
+                break
+
+            # Re-check the date in every statement, so only old orders in this id range move
+            chunk = (min(order_ids), max(order_ids), cutoff)
+            try:
+                cursor.execute(sql["archive_copy_orders"], chunk)
+                moved = cursor.rowcount
+                cursor.execute(sql["archive_copy_order_details"], chunk)
+                cursor.execute(sql["archive_delete_order_details"], chunk)
+                cursor.execute(sql["archive_delete_orders"], chunk)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            archived += moved
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+
+        return True, {"orders": archived, "cutoff": cutoff}
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def fetch_archive_cutoff(cursor):
+    """
+    Newest order_date in the archive (None if nothing is archived yet).
+    Not cached: the archive job runs in its own process, so a cached cutoff would
+    hide newly archived orders from every till. MAX() over idx_order_archive_date
+    is a single index lookup anyway.
+    """
+    cursor.execute(queries.get("fetch_archive_cutoff"))
+    (value,) = cursor.fetchone()
+    return value
+
+
+def needs_archive(cursor, start_date):
+    """True if a range starting at start_date (None = all time) reaches archived orders."""
+    cutoff = fetch_archive_cutoff(cursor)
+    if cutoff is None:
+        return False
+    return start_date is None or start_date <= cutoff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old orders to the archive tables.")
+    parser.add_argument("--years", type=float, default=3, help="archive orders older than this (default 3)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="orders per transaction")
+    parser.add_argument("--sleep", type=float, default=0.1, help="seconds to pause between chunks")
+    args = parser.parse_args()
+
+    success, result = archive_orders_older_than(args.years, args.chunk_size, args.sleep)
+    if not success:
+        print(f"Archive failed: {result}")
+        sys.exit(1)
+    print(f"Archived {result['orders']} orders placed before {result['cutoff']:%Y-%m-%d}.")
@@ -0,0 +1,656 @@
+# app/backup.py
+# Hot backup and restore of the whole shop database, much faster than mysqldump.
+#
+# Backup: every table is read in primary key chunks by several connections at once.
+# All of them see the same moment in time: a separate connection takes
+# FLUSH TABLES WITH READ LOCK just long enough for each worker to open a
+# consistent snapshot (START TRANSACTION WITH CONSISTENT SNAPSHOT), then lets go,
+# so the tills are only paused for a fraction of a second, not for the whole dump.
+# Each chunk goes to its own gzipped JSON Lines file, and manifest.json lists the
+# tables (with their CREATE TABLE), chunks, row counts and SHA-256 checksums.
+# The manifest is written last: a folder without one is an unfinished backup.
+#
+# Restore: checks every checksum first, creates the tables without their secondary
+# indexes and foreign keys, loads the chunks in parallel (foreign key and unique
+# checks off), then adds the indexes and foreign keys back, one ALTER per table.
+# Building an index once at the end is much cheaper than updating it row by row.
+#
+# Run from the project root:
+#   python -m app.backup backup [--out DIR] [--workers 4] [--chunk-rows 50000]
+#   python -m app.backup verify DIR
+#   python -m app.backup restore DIR [--database NAME] [--workers 4] [--replace]
+#   python -m app.backup selftest          (local only: backup, restore to a scratch
+#                                           database, compare table checksums)
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from mysql.connector import Error
+
+from app.db_connect import create_connection, db_settings
+
+BACKUP_ROOT = "backups"
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+DEFAULT_WORKERS = 4
+CHUNK_ROWS = 50000          # primary key values per chunk file
+INSERT_BATCH_ROWS = 1000    # rows per multi-row INSERT on restore
+COMPRESS_LEVEL = 1          # gzip: level 1 is several times faster than 9 and nearly as small
+# Don't queue behind a long running query for the global read lock: while
+# FLUSH TABLES WITH READ LOCK waits, every write in the shop waits behind it.
+LOCK_WAIT_SECONDS = 10
+
+# Lines of SHOW CREATE TABLE that restore adds after the data is loaded
+_DEFERRED_LINE = re.compile(r"((UNIQUE|FULLTEXT|SPATIAL) )?KEY |CONSTRAINT `[^`]+` FOREIGN KEY ")
+_NAME = re.compile(r"^\w+$")
+
+
+def _q(name):
+    """Backtick-quote a table or column name (needed for `Order`)."""
+    return f"`{name}`"
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds > 0 else 0.0
+
+
+def _mb(num_bytes):
+    return num_bytes / (1024 * 1024)
+
+
+class _HashingFile:
+    """File wrapper that counts and SHA-256 hashes everything written through it."""
+
+    def __init__(self, f):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.bytes += len(data)
+        return self._f.write(data)
+
+    def flush(self):
+        self._f.flush()
+
+
+def _file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _run_parallel(conns, tasks, work):
+    """
+    Run work(conn, task) for every task, each on whichever connection is free.
+    Returns the results in task order; the first exception is raised.
+    """
+    free = queue.Queue()
+    for conn in conns:
+        free.put(conn)
+
+    def run(task):
+        conn = free.get()
+        try:
+            return work(conn, task)
+        finally:
+            free.put(conn)
+
+    with ThreadPoolExecutor(max_workers=len(conns)) as pool:
+        return list(pool.map(run, tasks))
+
+
+def _open_connections(count):
+    # Outside the connection lanes (app/lanes.py): a backup holds all its connections
+    # at once for the shared snapshot, so --workers sizes it instead
+    conns = []
+    for _ in range(count):
+        conn, error = create_connection(lane=None)
+        if conn is None:
+            _close_all(conns)
+            raise RuntimeError(error)
+        conns.append(conn)
+    return conns
+
+
+def _close_all(conns):
+    for conn in conns:
+        try:
+            conn.close()
+        except Error:
+            pass
+
+
+# ---------- Backup ----------
+
+def _binlog_position(cursor):
+    """Binary log file/position of the snapshot (for point-in-time recovery), if logging is on."""
+    for sql in ("SHOW BINARY LOG STATUS", "SHOW MASTER STATUS"):  # new name from MySQL 8.2
+        try:
+            cursor.execute(sql)
+            row = cursor.fetchone()
+            cursor.fetchall()
+            return {"file": row[0], "position": row[1]} if row else None
+        except Error:
+            continue
+    return None
+
+
+def _open_snapshots(workers):
+    """
+    Open `workers` connections that all read the same consistent snapshot.
+    Returns (connections, binlog position or None, how consistency was reached).
+    """
+    conns = _open_connections(workers)
+    lock_conn, error = create_connection(lane=None)
+    if lock_conn is None:
+        _close_all(conns)
+        raise RuntimeError(error)
+
+    lock_cursor = lock_conn.cursor()
+    locked = False
+    try:
+        lock_cursor.execute(f"SET SESSION lock_wait_timeout = {LOCK_WAIT_SECONDS}")
+        try:
+            lock_cursor.execute("FLUSH TABLES WITH READ LOCK")
+            locked = True
+            method = f"global read lock, {workers} snapshots"
+        except Error as e:
+            # No RELOAD privilege, or a long query held us up: a single
+            # connection's snapshot is consistent on its own, just slower
+            _close_all(conns[1:])
+            conns = conns[:1]
+            method = f"single snapshot ({e})"
+
+        binlog = _binlog_position(lock_cursor) if locked else None
+        for conn in conns:
+            cursor = conn.cursor()
+            cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            cursor.close()
+        return conns, binlog, method
+
+    except Exception:
+        _close_all(conns)
+        raise
+
+    finally:
+        if locked:
+            lock_cursor.execute("UNLOCK TABLES")
+        lock_cursor.close()
+        lock_conn.close()
+
+
+def _describe_tables(cursor):
+    """Name, CREATE TABLE, columns and single integer primary key (or None) of every table."""
+    cursor.execute(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE' ORDER BY table_name;")
+    names = [row[0] for row in cursor.fetchall()]
+
+    tables = []
+    for name in names:
+        cursor.execute(f"SHOW CREATE TABLE {_q(name)}")
+        create_sql = cursor.fetchone()[1]
+
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = %s ORDER BY ordinal_position;",
+            (name,))
+        columns = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(
+            "SELECT k.column_name, c.data_type FROM information_schema.key_column_usage k "
+            "JOIN information_schema.columns c ON c.table_schema = k.table_schema "
+            "  AND c.table_name = k.table_name AND c.column_name = k.column_name "
+            "WHERE k.table_schema = DATABASE() AND k.table_name = %s AND k.constraint_name = 'PRIMARY' "
+            "ORDER BY k.ordinal_position;",
+            (name,))
+        pk = cursor.fetchall()
+        # Only a single integer key can be split into ranges; anything else is one chunk
+        pk_column = pk[0][0] if len(pk) == 1 and pk[0][1].endswith("int") else None
+
+        tables.append({"name": name, "create_sql": create_sql, "columns": columns, "primary_key": pk_column})
+    return tables
+
+
+def _plan_chunks(cursor, table, chunk_rows):
+    pk = table["primary_key"]
+    if pk is None:
+        return [None]
+    cursor.execute(f"SELECT MIN({_q(pk)}), MAX({_q(pk)}) FROM {_q(table['name'])};")
+    low, high = cursor.fetchone()
+    if low is None:
+        return []
+    return [(start, min(start + chunk_rows - 1, high)) for start in range(low, high + 1, chunk_rows)]
+
+
+def _dump_chunk(conn, task, out_dir):
+    table, number, key_range = task
+    name = table["name"]
+    cols = ", ".join(_q(c) for c in table["columns"])
+    sql = f"SELECT {cols} FROM {_q(name)}"
+    params = ()
+    if key_range is not None:
+        pk = _q(table["primary_key"])
+        sql += f" WHERE {pk} BETWEEN %s AND %s ORDER BY {pk}"
+        params = key_range
+
+    file_name = f"{name}.{number:05d}.jsonl.gz"
+    rows = 0
+    raw_bytes = 0
+    cursor = conn.cursor()  # unbuffered: rows stream off the socket
+    try:
+        cursor.execute(sql, params)
+        with open(os.path.join(out_dir, file_name), "wb") as f:
+            hashing = _HashingFile(f)
+            with gzip.GzipFile(fileobj=hashing, mode="wb", compresslevel=COMPRESS_LEVEL) as gz:
+                while True:
+                    batch = cursor.fetchmany(INSERT_BATCH_ROWS)
+                    if not batch:
+                        break
+                    data = "".join(json.dumps(list(row), default=str, separators=(",", ":")) + "\n"
+                                   for row in batch).encode("utf-8")
+                    gz.write(data)
+                    rows += len(batch)
+                    raw_bytes += len(data)
+    finally:
+        cursor.close()
+
+    return {"file": file_name, "rows": rows, "raw_bytes": raw_bytes, "bytes": hashing.bytes,
+            "sha256": hashing.sha256.hexdigest(), "range": list(key_range) if key_range else None}
+
+
+def backup(out_dir=None, workers=DEFAULT_WORKERS, chunk_rows=CHUNK_ROWS):
+    """
+    Consistent parallel backup of every table into out_dir.
+    Returns (True, summary dict) or (False, error message).
+    """
+    started = time.perf_counter()
+    started_at = datetime.now()
+    database = db_settings.get("database")
+    if out_dir is None:
+        out_dir = os.path.join(BACKUP_ROOT, f"{database}-{started_at:%Y%m%d-%H%M%S}")
+
+    try:
+        os.makedirs(out_dir, exist_ok=False)
+    except OSError as e:
+        return False, f"Can't create backup folder: {e}"
+
+    try:
+        conns, binlog, method = _open_snapshots(workers)
+    except Exception as e:
+        return False, str(e)
+
+    try:
+        cursor = conns[0].cursor()
+        tables = _describe_tables(cursor)
+        tasks = []
+        for table in tables:
+            for number, key_range in enumerate(_plan_chunks(cursor, table, chunk_rows)):
+                tasks.append((table, number, key_range))
+        cursor.close()
+
+        chunks = _run_parallel(conns, tasks, lambda conn, task: _dump_chunk(conn, task, out_dir))
+
+    except Exception as e:
+        return False, f"Backup failed (folder {out_dir} is incomplete): {e}"
+
+    finally:
+        for conn in conns:
+            try:
+                conn.rollback()
+            except Error:
+                pass
+        _close_all(conns)
+
+    for table in tables:
+        table["chunks"] = []
+        table["rows"] = 0
+    for (table, _, _), chunk in zip(tasks, chunks):
+        table["chunks"].append(chunk)
+        table["rows"] += chunk["rows"]
+
+    seconds = time.perf_counter() - started
+    rows = sum(chunk["rows"] for chunk in chunks)
+    raw_bytes = sum(chunk["raw_bytes"] for chunk in chunks)
+    compressed = sum(chunk["bytes"] for chunk in chunks)
+    manifest = {
+        "format": FORMAT_VERSION,
+        "database": database,
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "seconds": round(seconds, 2),
+        "consistency": method,
+        "binlog": binlog,
+        "tables": tables,
+    }
+    tmp_path = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST))
+
+    return True, {
+        "folder": out_dir,
+        "tables": len(tables),
+        "chunks": len(chunks),
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": _rate(rows, seconds),
+        "mb_per_second": _rate(_mb(raw_bytes), seconds),
+        "compressed_mb": _mb(compressed),
+        "consistency": method,
+    }
+
+
+# ---------- Verify ----------
+
+def load_manifest(backup_dir):
+    try:
+        with open(os.path.join(backup_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return False, f"No {MANIFEST} in {backup_dir} (missing or unfinished backup)."
+    except ValueError as e:
+        return False, f"Unreadable {MANIFEST}: {e}"
+    if manifest.get("format") != FORMAT_VERSION:
+        return False, f"Unsupported backup format {manifest.get('format')}."
+    return True, manifest
+
+
+def verify(backup_dir, workers=DEFAULT_WORKERS):
+    """Check every chunk file against its checksum. Returns (True, summary) or (False, problems)."""
+    success, manifest = load_manifest(backup_dir)
+    if not success:
+        return False, manifest
+
+    chunks = [chunk for table in manifest["tables"] for chunk in table["chunks"]]
+
+    def check(chunk):
+        path = os.path.join(backup_dir, chunk["file"])
+        if not os.path.exists(path):
+            return f"{chunk['file']}: missing"
+        if _file_sha256(path) != chunk["sha256"]:
+            return f"{chunk['file']}: checksum mismatch"
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        problems = [p for p in pool.map(check, chunks) if p]
+    if problems:
+        return False, "\n".join(problems)
+    return True, f"{len(chunks)} chunk files OK ({sum(c['rows'] for c in chunks)} rows)."
+
+
+# ---------- Restore ----------
+
+def split_create_table(create_sql):
+    """
+    Split SHOW CREATE TABLE output into (CREATE TABLE without secondary indexes and
+    foreign keys, list of clauses to add back with ALTER TABLE ... ADD).
+    """
+    lines = create_sql.splitlines()
+    head, body, tail = lines[0], lines[1:-1], lines[-1]
+    kept, deferred = [], []
+    for line in body:
+        clause = line.strip().rstrip(",")
+        (deferred if _DEFERRED_LINE.match(clause) else kept).append(clause)
+    create = head + "\n  " + ",\n  ".join(kept) + "\n" + tail
+    return create, deferred
+
+
+def _prepare_session(conn, database):
+    cursor = conn.cursor()
+    cursor.execute(f"USE {_q(database)}")
+    cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+    cursor.close()
+
+
+def _load_chunk(conn, task, backup_dir):
+    table, chunk = task
+    cols = table["columns"]
+    sql = (f"INSERT INTO {_q(table['name'])} ({', '.join(_q(c) for c in cols)}) "
+           f"VALUES ({', '.join(['%s'] * len(cols))})")
+    cursor = conn.cursor()
+    rows = 0
+    try:
+        with gzip.open(os.path.join(backup_dir, chunk["file"]), "rt", encoding="utf-8") as f:
+            batch = []
+            for line in f:
+                batch.append(json.loads(line))
+                if len(batch) >= INSERT_BATCH_ROWS:
+                    cursor.executemany(sql, batch)  # sent as one multi-row INSERT
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                rows += len(batch)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    if rows != chunk["rows"]:
+        raise RuntimeError(f"{chunk['file']}: loaded {rows} rows, manifest says {chunk['rows']}")
+    return rows
+
+
+def _add_deferred(conn, task):
+    name, clauses = task
+    if clauses:
+        cursor = conn.cursor()
+        cursor.execute(f"ALTER TABLE {_q(name)} ADD " + ", ADD ".join(clauses))
+        cursor.close()
+
+
+def restore(backup_dir, database=None, workers=DEFAULT_WORKERS, replace=False):
+    """
+    Restore a backup into `database` (default: the configured one, created if needed).
+    Refuses to touch existing tables unless replace=True, which drops them first.
+    Returns (True, summary dict) or (False, error message).
+    """
+    success, manifest = load_manifest(backup_dir)
+    if not success:
+        return False, manifest
+    database = database or db_settings.get("database")
+    if not _NAME.match(database or ""):
+        return False, f"Invalid database name: {database}"
+
+    started = time.perf_counter()
+    success, result = verify(backup_dir, workers)
+    if not success:
+        return False, "Backup is damaged, nothing restored:\n" + result
+    verify_seconds = time.perf_counter() - started
+
+    tables = manifest["tables"]
+    names = [table["name"] for table in tables]
+    try:
+        conns = _open_connections(workers)
+    except RuntimeError as e:
+        return False, str(e)
+
+    try:
+        cursor = conns[0].cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {_q(database)}")
+        cursor.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = %s AND table_name IN ("
+            + ", ".join(["%s"] * len(names)) + ");",
+            [database] + names)
+        existing = [row[0] for row in cursor.fetchall()]
+        if existing and not replace:
+            return False, (f"{database} already has {', '.join(existing)}. "
+                           "Restore into another --database, or use --replace to drop them.")
+
+        for conn in conns:
+            _prepare_session(conn, database)
+        deferred = {}
+        for table in tables:
+            create, deferred[table["name"]] = split_create_table(table["create_sql"])
+            if table["name"] in existing:
+                cursor.execute(f"DROP TABLE {_q(table['name'])}")
+            cursor.execute(create)
+        cursor.close()
+
+        # Biggest chunks first so one large table doesn't finish alone at the end
+        load_started = time.perf_counter()
+        tasks = sorted(((table, chunk) for table in tables for chunk in table["chunks"]),
+                       key=lambda task: task[1]["raw_bytes"], reverse=True)
+        rows = sum(_run_parallel(conns, tasks, lambda conn, task: _load_chunk(conn, task, backup_dir)))
+        load_seconds = time.perf_counter() - load_started
+
+        index_started = time.perf_counter()
+        _run_parallel(conns, list(deferred.items()), _add_deferred)
+        index_seconds = time.perf_counter() - index_started
+
+        cursor = conns[0].cursor()
+        wrong = []
+        for table in tables:
+            cursor.execute(f"SELECT COUNT(*) FROM {_q(table['name'])}")
+            (count,) = cursor.fetchone()
+            if count != table["rows"]:
+                wrong.append(f"{table['name']}: {count} rows, backup has {table['rows']}")
+        cursor.close()
+        if wrong:
+            return False, "Row counts don't match after restore:\n" + "\n".join(wrong)
+
+    except Exception as e:
+        return False, f"Restore failed: {e}"
+
+    finally:
+        _close_all(conns)
+
+    seconds = time.perf_counter() - started
+    raw_bytes = sum(chunk["raw_bytes"] for table in tables for chunk in table["chunks"])
+    return True, {
+        "database": database,
+        "tables": len(tables),
+        "rows": rows,
+        "seconds": seconds,
+        "verify_seconds": verify_seconds,
+        "load_seconds": load_seconds,
+        "index_seconds": index_seconds,
+        "rows_per_second": _rate(rows, load_seconds),
+        "mb_per_second": _rate(_mb(raw_bytes), load_seconds),
+    }
+
+
+# ---------- Self test ----------
+
+def _table_checksums(cursor, database, names):
+    cursor.execute("CHECKSUM TABLE " + ", ".join(f"{_q(database)}.{_q(name)}" for name in names))
+    return {table.split(".", 1)[1]: checksum for table, checksum in cursor.fetchall()}
+
+
+def selftest(workers=DEFAULT_WORKERS, chunk_rows=CHUNK_ROWS):
+    """
+    Back up the local database, restore it into <database>_restore_test and compare
+    CHECKSUM TABLE of every table. The scratch database is dropped afterwards.
+    Run it on an idle database (e.g. after python -m app.load_test seed).
+    """
+    database = db_settings.get("database")
+    scratch = f"{database}_restore_test"
+    folder = tempfile.mkdtemp(prefix="backup-selftest-")
+    lines = []
+    try:
+        success, result = backup(os.path.join(folder, "backup"), workers, chunk_rows)
+        if not success:
+            return False, result
+        lines.append(format_summary("backup", result))
+
+        success, result = restore(os.path.join(folder, "backup"), scratch, workers, replace=True)
+        if not success:
+            return False, result
+        lines.append(format_summary("restore", result))
+
+        conn, error = create_connection(lane=None)
+        if conn is None:
+            return False, error
+        cursor = conn.cursor()
+        try:
+            _, manifest = load_manifest(os.path.join(folder, "backup"))
+            names = [table["name"] for table in manifest["tables"]]
+            before = _table_checksums(cursor, database, names)
+            after = _table_checksums(cursor, scratch, names)
+            different = [name for name in names if before.get(name) != after.get(name)]
+            cursor.execute(f"DROP DATABASE {_q(scratch)}")
+        finally:
+            cursor.close()
+            conn.close()
+
+        if different:
+            lines.append("Checksums differ for: " + ", ".join(different))
+            return False, "\n".join(lines)
+        lines.append(f"All {len(names)} tables restored identically.")
+        return True, "\n".join(lines)
+
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def format_summary(action, summary):
+    text = (f"{action}: {summary['rows']} rows in {summary['tables']} tables, "
+            f"{summary['seconds']:.1f}s, {summary['rows_per_second']:.0f} rows/s, "
+            f"{summary['mb_per_second']:.1f} MB/s")
+    if action == "backup":
+        text += (f"\n  {summary['chunks']} chunks, {summary['compressed_mb']:.1f} MB compressed "
+                 f"in {summary['folder']} ({summary['consistency']})")
+    else:
+        text += (f"\n  checksums {summary['verify_seconds']:.1f}s, load {summary['load_seconds']:.1f}s, "
+                 f"indexes {summary['index_seconds']:.1f}s into {summary['database']}")
+    return text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel consistent backup and restore.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_backup = sub.add_parser("backup", help="back up every table")
+    p_backup.add_argument("--out", help=f"folder to create (default {BACKUP_ROOT}/<database>-<time>)")
+    p_backup.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    p_backup.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+
+    p_verify = sub.add_parser("verify", help="check a backup's files against its checksums")
+    p_verify.add_argument("folder")
+
+    p_restore = sub.add_parser("restore", help="restore a backup")
+    p_restore.add_argument("folder")
+    p_restore.add_argument("--database", help="database to restore into (default: the configured one)")
+    p_restore.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    p_restore.add_argument("--replace", action="store_true", help="drop tables that already exist")
+
+    p_test = sub.add_parser("selftest", help="backup + restore + compare (local database only)")
+    p_test.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    p_test.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        success, result = backup(args.out, args.workers, args.chunk_rows)
+    elif args.command == "verify":
+        success, result = verify(args.folder)
+    elif args.command == "restore":
+        success, result = restore(args.folder, args.database, args.workers, args.replace)
+    else:
+        from app.load_test import _check_local
+        success, result = _check_local()
+        if success:
+            success, result = selftest(args.workers, args.chunk_rows)
+
+    if success and isinstance(result, dict):
+        result = format_summary(args.command, result)
+    print(result)
+    sys.exit(0 if success else 1)
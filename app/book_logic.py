@@ -2,9 +2,16 @@
 
 # Connect to DB
 
-from app.db_connect import create_connection
+from app.db_connect import (create_connection, create_connection_for, create_store_connection,
+                            store_names, STORE_TIMEOUT_SECONDS)
 from app.query_loader import load_queries
-from decimal import Decimal
+from app.isbn import canonicalize_isbn, resolve_book_isbns
+from app.catalog_snapshot import AVAILABILITY_LABELS
+from app.credit_ledger import add_credit
+from app.events import publish, BookAdded, CreditChanged
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation
+import time
 
 # Load all SQL queries once
 queries = load_queries("db/queries.sql")
@@ -16,7 +23,14 @@ def add_book_and_credit_customer(book_name, author_name, book_condition, average
                                  customer_id):
     """
     Adds a new book (with purchase + resale price) and updates the customer's credit_total.
+    Either isbn or isbn_13 may be blank, but whatever is given must pass the checksum.
     """
+    # Validate ISBNs before touching the DB, so typos don't create duplicate records
+    success, result = resolve_book_isbns(isbn, isbn_13)
+    if not success:
+        return False, result
+    isbn, isbn_13 = result
+
     conn, error = create_connection()
     if conn is None:
         return False, error  # Pass detailed DB error to GUI
@@ -33,36 +47,28 @@ def add_book_and_credit_customer(book_name, author_name, book_condition, average
 
         cursor.execute(sql_insert_book, (
             book_name, author_name, book_condition, average_ratings,
-            isbn, isbn_13, language, num_pages,
+            isbn, isbn_13, isbn_13, language, num_pages,
             purchase_price, resale_price
         ))
-        conn.commit()
 
         # Get the new Book ID
         book_id = cursor.lastrowid
 
-        # 2. Fetch customer's current credit
-        sql_fetch_credit = queries.get("fetch_credit_by_customer_id")
-        if not sql_fetch_credit:
-            return False, "Query 'fetch_credit_by_customer_id' not found."
-
-        cursor.execute(sql_fetch_credit, (customer_id,))
-        result = cursor.fetchone()
-        if not result:
-            return False, f"Customer ID {customer_id} not found."
-
-        (current_credit,) = result
-
-        # 3. Update customer's credit_total
-        new_credit_total = current_credit + Decimal(str(purchase_price))
-
-        sql_update_credit = queries.get("update_customer_credit_total")
-        if not sql_update_credit:
-            return False, "Query 'update_customer_credit_total' not found."
-
-        cursor.execute(sql_update_credit, (new_credit_total, customer_id))
+        # 2. Credit the customer (in the same transaction, so the book and the
+        # credit are saved together or not at all)
+        success, new_credit_total = add_credit(cursor, customer_id, purchase_price, "book_purchase",
+                                               book_id=book_id)
+        if not success:
+            conn.rollback()
+            return False, new_credit_total
         conn.commit()
 
+        # Tell listeners (caches, other terminals) what changed
+        publish(
+            BookAdded(book_id, isbn_13, book_name, Decimal(str(resale_price)), customer_id),
+            CreditChanged(customer_id, Decimal(str(purchase_price)), new_credit_total, "book_purchase"),
+        )
+
         # Return results to GUI
         return True, {
             "book_id": book_id,
@@ -71,6 +77,7 @@ def add_book_and_credit_customer(book_name, author_name, book_condition, average
         }
 
     except Exception as e:
+        conn.rollback()
         return False, str(e)
 
     finally:
@@ -81,10 +88,14 @@ def add_book_and_credit_customer(book_name, author_name, book_condition, average
 
 def search_book_by_isbn(isbn):
     """
-    Searches for a book by ISBN or ISBN-13.
+    Searches for a book by ISBN or ISBN-13 (hyphens allowed).
     Returns book details if found, otherwise a message that it's unavailable.
     """
-    conn, error = create_connection()
+    success, canonical = canonicalize_isbn(isbn)
+    if not success:
+        return False, canonical
+
+    conn, error = create_connection_for("search_book_by_isbn")
     if conn is None:
         return False, error  # DB connection error
 
@@ -98,8 +109,8 @@ def search_book_by_isbn(isbn):
         if not sql_search_book_by_isbn:
             return False, "Query 'search_book_by_isbn' not found."
 
-        # Execute the query (pass ISBN twice to match either isbn and isbn_13)
-        cursor.execute(sql_search_book_by_isbn, (isbn, isbn))
+        # Execute the query on the single canonical ISBN-13 column
+        cursor.execute(sql_search_book_by_isbn, (canonical,))
         results = cursor.fetchall()
 
         # Return not found message with ISBN # entered.
@@ -107,11 +118,12 @@ def search_book_by_isbn(isbn):
             return False, f"No book found with ISBN: {isbn}"
 
         # Unpack result
-        book_name, author_name, resale_price, book_status = results[0]
-        availability = "Available" if book_status.lower() == "available" else "Sold"
+        book_id, book_name, author_name, resale_price, book_status = results[0]
+        availability = AVAILABILITY_LABELS.get(book_status.lower(), "Sold")
 
         # Return book info to GUI
         return True, {
+            "book_id": book_id,
             "book_name": book_name,
             "author_name": author_name,
             "resale_price": resale_price,
@@ -159,3 +171,262 @@ def validate_book_by_id(book_id):
     finally:
         cursor.close()
         conn.close()
+
+
+# ---------- Browse Books: filters and facet counts ----------
+
+# Filter name -> SQL condition added to the filter_books query
+BOOK_FILTERS = {
+    "condition": "book_Condition = %s",
+    "language": "`language` = %s",
+    "min_price": "resale_price >= %s",
+    "max_price": "resale_price <= %s",
+    "min_rating": "average_Ratings >= %s",
+}
+NUMERIC_FILTERS = ("min_price", "max_price", "min_rating")
+BOOK_STATUSES = ("available", "sold", "missing")
+
+# Facet value for books with no condition/language. As a filter it matches NULL or ''
+# (a "" filter would mean "no filter").
+BLANK = "(blank)"
+BLANK_FILTERS = {
+    "condition": "(book_Condition IS NULL OR book_Condition = '')",
+    "language": "(`language` IS NULL OR `language` = '')",
+}
+
+# Facet counts are shared by every clerk browsing, so a short cache saves a GROUP BY per click.
+# Keyed by the typed price/rating filters, so it's capped: the oldest entry goes first.
+FACET_CACHE_SECONDS = 30
+FACET_CACHE_MAX = 64
+_facet_cache = {}
+
+
+def _clean_book_filters(filters):
+    """
+    Drop blank filters and check the rest.
+    Returns (True, (status, {name: value})) or (False, error message).
+    """
+    status = (filters.get("status") or "available").lower()
+    if status not in BOOK_STATUSES:
+        return False, f"Unknown book status: {status}"
+
+    cleaned = {}
+    for name, value in filters.items():
+        if name == "status" or value is None or str(value).strip() == "":
+            continue
+        if name not in BOOK_FILTERS:
+            return False, f"Unknown filter: {name}"
+        if name in NUMERIC_FILTERS:
+            try:
+                value = Decimal(str(value).strip().lstrip("$"))
+            except InvalidOperation:
+                return False, f"{name.replace('_', ' ').capitalize()} must be a number."
+        else:
+            value = str(value).strip()
+        cleaned[name] = value
+    return True, (status, cleaned)
+
+
+def build_book_filter_query(filters, page=0, page_size=25):
+    """
+    Build the parameterised SQL for any combination of filters.
+    Fetches one extra row so the caller can tell whether there is a next page.
+    Returns (True, (sql, params)) or (False, error message).
+    """
+    success, result = _clean_book_filters(filters)
+    if not success:
+        return False, result
+    status, cleaned = result
+
+    sql_filter_books = queries.get("filter_books")
+    if not sql_filter_books:
+        return False, "Query 'filter_books' not found."
+
+    clauses = [sql_filter_books]
+    params = [status]
+    for name, condition in BOOK_FILTERS.items():
+        if name not in cleaned:
+            continue
+        if name in BLANK_FILTERS and cleaned[name] == BLANK:
+            clauses.append(BLANK_FILTERS[name])
+            continue
+        clauses.append(condition)
+        params.append(cleaned[name])
+
+    sql = " AND ".join(clauses) + " ORDER BY resale_price, book_id LIMIT %s OFFSET %s"
+    params.extend([page_size + 1, page * page_size])
+    return True, (sql, tuple(params))
+
+
+def filter_books(filters, page=0, page_size=25):
+    """
+    Find books matching filters, e.g. {"language": "Spanish", "max_price": 10, "min_rating": 4}.
+    Cheapest first. Returns (True, {"books": [...], "page": n, "has_next": bool}).
+    """
+    success, result = build_book_filter_query(filters, page, page_size)
+    if not success:
+        return False, result
+    sql, params = result
+
+    conn, error = create_connection_for("filter_books")
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+        books = [
+            {
+                "book_id": book_id,
+                "book_name": book_name,
+                "author_name": author_name,
+                "condition": condition,
+                "language": language,
+                "rating": rating,
+                "resale_price": resale_price,
+                "availability": AVAILABILITY_LABELS.get(book_status.lower(), "Sold"),
+            }
+            for book_id, book_name, author_name, condition, language, rating, resale_price, book_status
+            in rows[:page_size]
+        ]
+        return True, {"books": books, "page": page, "has_next": len(rows) > page_size}
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def book_facets(filters):
+    """
+    Counts per condition and per language for the filter panel.
+    Each facet is narrowed by every other filter but not by itself, so the
+    clerk can see what switching e.g. language would give. Books without a
+    condition or language are counted under BLANK.
+    Returns (True, {"condition": {value: count}, "language": {value: count}}).
+    """
+    success, result = _clean_book_filters(filters)
+    if not success:
+        return False, result
+    status, cleaned = result
+
+    min_price = cleaned.get("min_price")
+    max_price = cleaned.get("max_price")
+    min_rating = cleaned.get("min_rating")
+    key = (status, min_price, max_price, min_rating)
+
+    cached = _facet_cache.get(key)
+    if cached and time.monotonic() - cached[0] < FACET_CACHE_SECONDS:
+        rows = cached[1]
+    else:
+        conn, error = create_connection_for("book_facet_counts")
+        if conn is None:
+            return False, error
+
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            sql_facets = queries.get("book_facet_counts")
+            if not sql_facets:
+                return False, "Query 'book_facet_counts' not found."
+            cursor.execute(sql_facets, (status, min_price, min_price, max_price, max_price,
+                                        min_rating, min_rating))
+            rows = cursor.fetchall()
+            _facet_cache.pop(key, None)   # re-added below as the newest
+            while len(_facet_cache) >= FACET_CACHE_MAX:
+                del _facet_cache[next(iter(_facet_cache))]
+            _facet_cache[key] = (time.monotonic(), rows)
+        except Exception as e:
+            return False, str(e)
+        finally:
+            if cursor:
+                cursor.close()
+            conn.close()
+
+    conditions = {}
+    languages = {}
+    for language, condition, count in rows:
+        language = language or BLANK
+        condition = condition or BLANK
+        if "language" not in cleaned or cleaned["language"] == language:
+            conditions[condition] = conditions.get(condition, 0) + count
+        if "condition" not in cleaned or cleaned["condition"] == condition:
+            languages[language] = languages.get(language, 0) + count
+    return True, {"condition": conditions, "language": languages}
+
+
+# ---------- Search all stores ----------
+
+# Shared by all cross-store searches; a store that hangs only ties up its own thread
+_store_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="store-search")
+
+
+def _search_one_store(store_name, sql, params):
+    conn, error = create_store_connection(store_name)
+    if conn is None:
+        raise RuntimeError(error)
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return [
+            {
+                "store": store_name,
+                "book_id": book_id,
+                "book_name": book_name,
+                "author_name": author_name,
+                "isbn": isbn,
+                "resale_price": resale_price,
+                "availability": AVAILABILITY_LABELS.get(book_status.lower(), "Sold"),
+            }
+            for book_id, book_name, author_name, isbn, resale_price, book_status in cursor.fetchall()
+        ]
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def search_all_stores(text, timeout=STORE_TIMEOUT_SECONDS, limit=20):
+    """
+    Look a book up in every shop at once, by ISBN (if text is one) or by the start of the title.
+    Stores that fail or don't answer within `timeout` seconds are left out and listed in "errors".
+    Returns (True, {"results": [book dicts with a "store" key], "errors": {store: message}}).
+    """
+    text = text.strip()
+    if not text:
+        return False, "Please enter an ISBN or the start of a title."
+
+    is_isbn, canonical = canonicalize_isbn(text)
+    if is_isbn:
+        sql, params = queries.get("search_books_by_isbn_all_copies"), (canonical, limit)
+    else:
+        pattern = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        sql, params = queries.get("search_books_by_title"), (pattern, limit)
+    if not sql:
+        return False, "Cross-store search queries not found in db/queries.sql."
+
+    futures = {_store_search_pool.submit(_search_one_store, name, sql, params): name for name in store_names()}
+    done, not_done = wait(futures, timeout=timeout)
+
+    results = []
+    errors = {}
+    for future in done:
+        try:
+            results.extend(future.result())
+        except Exception as e:
+            errors[futures[future]] = str(e)
+    for future in not_done:
+        future.cancel()
+        errors[futures[future]] = f"No answer within {timeout} seconds."
+
+    # Stores in the configured order (this store first), available copies first
+    order = {name: i for i, name in enumerate(store_names())}
+    results.sort(key=lambda book: (order[book["store"]], book["availability"] != "Available", book["book_name"]))
+    return True, {"results": results, "errors": errors}
@@ -0,0 +1,289 @@
+# app/catalog_snapshot.py
+# Offline catalog snapshot for fast "do we have it?" ISBN lookups at the counter.
+#
+# The exporter reads the Book table once and writes a compact binary file:
+#
+#   header  : magic, version, record count, created-at (unix time), blob offset
+#   records : fixed-width rows sorted by canonical ISBN-13 (see RECORD below)
+#   blob    : UTF-8 book names and author names, referenced by offset/length
+#
+# Lookups memory-map the file and binary search the sorted records directly,
+# so no Python objects are built per row and the DB is not touched at all.
+#
+# Export a new snapshot from the project root with:
+#   python -m app.catalog_snapshot export
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from decimal import Decimal
+
+from app.isbn import canonicalize_isbn
+
+SNAPSHOT_PATH = "db/catalog_snapshot.bin"
+
+# Snapshots older than this are only used when the live database is unreachable
+MAX_FRESH_AGE_SECONDS = 24 * 60 * 60
+
+MAGIC = b"BKSNAP01"
+VERSION = 2
+KEY_WIDTH = 13
+
+# magic, version, record_count, created_at, blob_offset
+HEADER = struct.Struct("<8sHIdQ")
+# isbn key, book_id, price (cents), status, name offset, name len, author offset, author len
+RECORD = struct.Struct("<13sIiBIHIH")
+
+STATUS_CODES = {"available": 0, "sold": 1, "missing": 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+# What the clerk sees; 'missing' = not found at the last stocktake (app/stocktake.py)
+AVAILABILITY_LABELS = {"available": "Available", "missing": "Missing"}
+STATUS_UNKNOWN = 255
+
+
+def _snapshot_key(isbn):
+    """
+    Turn an ISBN string into the 13 byte key used in the snapshot
+    (the canonical ISBN-13). Returns None if the ISBN isn't valid.
+    """
+    success, canonical = canonicalize_isbn(isbn)
+    if not success:
+        return None
+    return canonical.encode("ascii")
+
+
+# ---------- Exporter ----------
+
+def export_snapshot(path=SNAPSHOT_PATH):
+    """
+    Read every book from the database and write a new snapshot file.
+    The file is written next to the old one and swapped in atomically,
+    so readers never see a half written snapshot.
+    """
+    from app.db_connect import create_connection_for
+    from app.query_loader import load_queries
+
+    queries = load_queries("db/queries.sql")
+
+    conn, error = create_connection_for("export_catalog_snapshot")
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        sql = queries.get("export_catalog_snapshot")
+        if not sql:
+            return False, "Query 'export_catalog_snapshot' not found."
+
+        cursor.execute(sql)
+
+        blob = bytearray()
+        blob_index = {}  # de-duplicate repeated author names
+        rows = []
+
+        def add_text(text):
+            data = (text or "").encode("utf-8")[:0xFFFF]
+            if data not in blob_index:
+                blob_index[data] = len(blob)
+                blob.extend(data)
+            return blob_index[data], len(data)
+
+        while True:
+            batch = cursor.fetchmany(1000)
+            if not batch:
+                break
+            for book_id, book_name, author_name, isbn_canonical, resale_price, book_status in batch:
+                name_off, name_len = add_text(book_name)
+                author_off, author_len = add_text(author_name)
+                price_cents = int(Decimal(str(resale_price or 0)) * 100)
+                status = STATUS_CODES.get((book_status or "").lower(), STATUS_UNKNOWN)
+                rows.append((isbn_canonical.encode("ascii"), book_id, price_cents, status,
+                             name_off, name_len, author_off, author_len))
+
+        # Several copies can share an ISBN; put available copies first so lookups find them
+        rows.sort(key=lambda r: (r[0], r[3] != STATUS_CODES["available"], r[1]))
+
+        blob_offset = HEADER.size + RECORD.size * len(rows)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(rows), time.time(), blob_offset))
+            for row in rows:
+                f.write(RECORD.pack(*row))
+            f.write(blob)
+        os.replace(tmp_path, path)
+
+        return True, {"records": len(rows), "path": path}
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+# ---------- Reader ----------
+
+class CatalogSnapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self._file.close()
+            raise ValueError(f"Snapshot file is empty: {path}")
+
+        magic, version, count, created_at, blob_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not a catalog snapshot (or wrong version): {path}")
+
+        self.record_count = count
+        self.created_at = created_at
+        self._blob_offset = blob_offset
+        self.mtime = os.fstat(self._file.fileno()).st_mtime
+
+    def age_seconds(self):
+        return max(0.0, time.time() - self.created_at)
+
+    def _key_at(self, index):
+        start = HEADER.size + index * RECORD.size
+        return self._mm[start:start + KEY_WIDTH]
+
+    def _text(self, offset, length):
+        start = self._blob_offset + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def lookup(self, isbn):
+        """
+        Binary search for an ISBN (10 or 13, hyphens allowed). Returns a dict
+        for the matching book or None if the ISBN isn't in the snapshot.
+        """
+        key = _snapshot_key(isbn)
+        if key is None:
+            return None
+
+        lo, hi = 0, self.record_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo >= self.record_count or self._key_at(lo) != key:
+            return None
+
+        (_, book_id, price_cents, status,
+         name_off, name_len, author_off, author_len) = RECORD.unpack_from(
+            self._mm, HEADER.size + lo * RECORD.size)
+
+        return {
+            "book_id": book_id,
+            "book_name": self._text(name_off, name_len),
+            "author_name": self._text(author_off, author_len),
+            "resale_price": Decimal(price_cents) / 100,
+            "book_status": STATUS_NAMES.get(status, "unknown"),
+        }
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+_open_snapshot = None
+
+
+def get_snapshot(path=SNAPSHOT_PATH):
+    """
+    Return a shared reader for the snapshot file, reopening it if a newer
+    export has replaced the file. Returns None if there is no snapshot.
+    """
+    global _open_snapshot
+
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    if _open_snapshot is not None:
+        if _open_snapshot.path == path and _open_snapshot.mtime == mtime:
+            return _open_snapshot
+        _open_snapshot.close()
+        _open_snapshot = None
+
+    try:
+        _open_snapshot = CatalogSnapshot(path)
+    except (OSError, ValueError):
+        return None
+    return _open_snapshot
+
+
+def describe_age(seconds):
+    """Short human readable age for the freshness indicator, e.g. '3h old'."""
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m old"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h old"
+    return f"{int(seconds // 86400)}d old"
+
+
+def lookup_book_by_isbn(isbn, path=SNAPSHOT_PATH):
+    """
+    Look up a book in the offline snapshot.
+    Returns (True, dict) in the same shape as book_logic.search_book_by_isbn,
+    plus 'snapshot_age' in seconds, or (False, message).
+    """
+    snapshot = get_snapshot(path)
+    if snapshot is None:
+        return False, "No catalog snapshot available."
+
+    book = snapshot.lookup(isbn)
+    if book is None:
+        return False, f"No book found with ISBN: {isbn}"
+
+    availability = AVAILABILITY_LABELS.get(book["book_status"], "Sold")
+    return True, {
+        "book_id": book["book_id"],
+        "book_name": book["book_name"],
+        "author_name": book["author_name"],
+        "resale_price": book["resale_price"],
+        "availability": availability,
+        "snapshot_age": snapshot.age_seconds(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline catalog snapshot for ISBN lookups.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="write a new snapshot from the Book table")
+    p_export.add_argument("path", nargs="?", default=SNAPSHOT_PATH)
+    p_lookup = sub.add_parser("lookup", help="look up one ISBN in the snapshot")
+    p_lookup.add_argument("isbn")
+    p_lookup.add_argument("path", nargs="?", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        success, result = export_snapshot(args.path)
+        if success:
+            print(f"Wrote {result['records']} records to {result['path']}")
+        else:
+            print(f"Export failed: {result}")
+            sys.exit(1)
+    else:
+        start = time.perf_counter()
+        success, result = lookup_book_by_isbn(args.isbn, args.path)
+        elapsed_us = (time.perf_counter() - start) * 1_000_000
+        print(result)
+        print(f"Lookup took {elapsed_us:.0f} µs")
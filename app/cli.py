@@ -0,0 +1,286 @@
+# app/cli.py
+# Command line access to the book, customer, employee and order functions, without
+# loading Tk or the dashboard.
+#
+# One operation:
+#   python -m app.cli search-book 9780441013593
+#   python -m app.cli add-customer Ada Lovelace ada@example.com
+#   python -m app.cli complete-order 12 3 '[{"book_id": 40, "price": "6.50"}]' --credit-used 2
+#
+# Batch: JSON Lines operations on stdin, JSON Lines results on stdout, in order:
+#   {"op": "add-customer", "args": {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com"}, "id": 1}
+#   -> {"id": 1, "op": "add-customer", "ok": true, "result": 2041}
+#
+#   python -m app.cli batch [--batch-size 500] < operations.jsonl > results.jsonl
+#
+# The whole batch runs over one connection, committed every --batch-size operations
+# (results are written once their batch is committed). An operation that fails is
+# rolled back on its own; the rest of its batch still commits. If a commit itself
+# fails, every operation in that batch is reported as failed. Change events (app/events.py)
+# are only published once their batch has been committed.
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from app.db_connect import create_connection, shared_connection, SHARED_SAVEPOINT
+from app import query_capture
+from app.events import hold_events, publish
+from app.book_logic import (add_book_and_credit_customer, search_book_by_isbn, filter_books,
+                            search_all_stores)
+from app.customer_logic import (add_new_customer, mark_customer_as_inactive,
+                                lookup_customer_credit_by_email, search_customers)
+from app.employee_logic import add_new_employee, mark_employee_as_terminated
+from app.order_logic import (lookup_customer_credit_by_id, search_book_by_isbn_for_order,
+                             fetch_customer_by_id, complete_order)
+from app.report_logic import sales_summary_by_day, customer_order_history
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _complete_order(customer_id, employee_id, order_items, credit_used=0):
+    # complete_order checks credit against the live balance, the screen's copy isn't needed
+    return complete_order(customer_id, employee_id, order_items, credit_used, None)
+
+
+def _date(value):
+    # "2024-01-31" from the command line or a batch line; None = open-ended
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _sales_by_day(start_date=None, end_date=None):
+    """Order totals per day."""
+    try:
+        start_date, end_date = _date(start_date), _date(end_date)
+    except ValueError as e:
+        return False, f"Bad date: {e}"
+    return sales_summary_by_day(start_date, end_date)
+
+
+def _customer_orders(customer_id, start_date=None, end_date=None):
+    """A customer's orders, newest first, archived ones included."""
+    try:
+        start_date, end_date = _date(start_date), _date(end_date)
+    except ValueError as e:
+        return False, f"Bad date: {e}"
+    return customer_order_history(customer_id, start_date, end_date)
+
+
+# name: (function, [(argument, type, default)]). Arguments without a default are
+# positional on the command line; the rest are --options. Batch "args" use the same names.
+REQUIRED = object()
+OPERATIONS = {
+    # Books
+    "search-book": (search_book_by_isbn, [("isbn", str, REQUIRED)]),
+    "add-book": (add_book_and_credit_customer, [
+        ("book_name", str, REQUIRED), ("author_name", str, REQUIRED),
+        ("purchase_price", Decimal, REQUIRED), ("resale_price", Decimal, REQUIRED),
+        ("customer_id", int, REQUIRED),
+        ("isbn", str, ""), ("isbn_13", str, ""), ("book_condition", str, None),
+        ("average_ratings", Decimal, None), ("language", str, None), ("num_pages", int, None),
+    ]),
+    "filter-books": (filter_books, [("filters", json.loads, {}), ("page", int, 0), ("page_size", int, 25)]),
+    "search-stores": (search_all_stores, [("text", str, REQUIRED)]),
+    # Customers
+    "add-customer": (add_new_customer, [("first_name", str, REQUIRED), ("last_name", str, REQUIRED),
+                                        ("email", str, REQUIRED)]),
+    "deactivate-customer": (mark_customer_as_inactive, [("customer_id", int, REQUIRED)]),
+    "customer-credit": (lookup_customer_credit_by_email, [("email", str, REQUIRED)]),
+    "search-customers": (search_customers, [("prefix", str, REQUIRED), ("limit", int, 20)]),
+    # Employees
+    "add-employee": (add_new_employee, [("first_name", str, REQUIRED), ("last_name", str, REQUIRED),
+                                        ("phone_number", str, REQUIRED), ("access_level", str, REQUIRED)]),
+    "terminate-employee": (mark_employee_as_terminated, [("employee_id", int, REQUIRED)]),
+    # Orders
+    "customer": (fetch_customer_by_id, [("customer_id", int, REQUIRED)]),
+    "customer-credit-by-id": (lookup_customer_credit_by_id, [("customer_id", int, REQUIRED)]),
+    "find-book-for-order": (search_book_by_isbn_for_order, [("isbn", str, REQUIRED)]),
+    "complete-order": (_complete_order, [("customer_id", int, REQUIRED), ("employee_id", int, REQUIRED),
+                                         ("order_items", json.loads, REQUIRED),
+                                         ("credit_used", Decimal, Decimal("0"))]),
+    # Reports (dates as YYYY-MM-DD, end date not included)
+    "sales-by-day": (_sales_by_day, [("start_date", str, None), ("end_date", str, None)]),
+    "customer-orders": (_customer_orders, [("customer_id", int, REQUIRED),
+                                           ("start_date", str, None), ("end_date", str, None)]),
+}
+
+
+def run_operation(name, args):
+    """Call one operation with a dict of arguments. Returns (success, result)."""
+    if name not in OPERATIONS:
+        return False, f"Unknown operation: {name}"
+    function, spec = OPERATIONS[name]
+    names = [arg for arg, _, _ in spec]
+
+    unknown = set(args) - set(names)
+    if unknown:
+        return False, f"Unknown argument(s) for {name}: {', '.join(sorted(unknown))}"
+    missing = [arg for arg, _, default in spec if default is REQUIRED and arg not in args]
+    if missing:
+        return False, f"Missing argument(s) for {name}: {', '.join(missing)}"
+
+    values = {arg: args.get(arg, default) for arg, _, default in spec}
+    return function(**values)
+
+
+def _json_line(record):
+    # Decimal and datetime as strings, so money keeps its exact value
+    return json.dumps(record, default=str, separators=(",", ":")) + "\n"
+
+
+# ---------- Batch mode ----------
+
+def _parse_line(line, line_number):
+    """(id, op, args) from one input line. Raises ValueError for bad input."""
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Bad input line {line_number}: {e}")
+    if not isinstance(request, dict) or "op" not in request:
+        raise ValueError(f'Bad input line {line_number}: expected an object with "op"')
+    args = request.get("args", {})
+    if not isinstance(args, dict):
+        raise ValueError(f'Bad input line {line_number}: "args" must be an object')
+    return request.get("id", line_number), request["op"], args
+
+
+def _run_batch(cursor, batch, held_events):
+    """
+    Run one batch of input lines inside the open transaction. Returns result records.
+    Events of operations that failed are removed from held_events.
+    """
+    records = []
+    for line_number, line in batch:
+        try:
+            op_id, name, args = _parse_line(line, line_number)
+        except ValueError as e:
+            records.append({"id": line_number, "op": None, "ok": False, "error": str(e)})
+            continue
+
+        cursor.execute(f"SAVEPOINT {SHARED_SAVEPOINT}")
+        events_before = len(held_events)
+        try:
+            success, result = run_operation(name, args)
+        except Exception as e:
+            success, result = False, str(e)
+        if not success:
+            # Most functions roll back their own work, but not all: make sure
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {SHARED_SAVEPOINT}")
+            del held_events[events_before:]
+        records.append({"id": op_id, "op": name, "ok": success, ("result" if success else "error"): result})
+    return records
+
+
+def run_batch(lines, out, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Run JSON Lines operations from `lines`, writing JSON Lines results to `out`.
+    Returns (True, summary dict) or (False, error message) if the database can't be reached.
+    """
+    conn, error = create_connection()
+    if conn is None:
+        return False, error
+
+    started = time.perf_counter()
+    totals = {"operations": 0, "failed": 0, "batches": 0}
+    cursor = None
+
+    def commit_batch(batch):
+        # The functions publish right after their (no-op) commits: hold those events
+        # until the batch itself is committed, and drop them if it isn't
+        events = []
+        try:
+            with hold_events() as held:
+                conn.start_transaction()
+                records = _run_batch(cursor, batch, held)
+                conn.commit()
+                events = list(held)
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            records = [{"id": line_number, "op": None, "ok": False, "error": f"Batch not saved: {e}"}
+                       for line_number, _ in batch]
+        publish(*events)
+        out.write("".join(_json_line(record) for record in records))
+        out.flush()
+        totals["operations"] += len(records)
+        totals["failed"] += sum(1 for record in records if not record["ok"])
+        totals["batches"] += 1
+
+    try:
+        cursor = conn.cursor()
+        with shared_connection(conn):
+            batch = []
+            for line_number, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                batch.append((line_number, line))
+                if len(batch) >= batch_size:
+                    commit_batch(batch)
+                    batch = []
+            if batch:
+                commit_batch(batch)
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+    seconds = time.perf_counter() - started
+    totals["seconds"] = seconds
+    totals["operations_per_second"] = totals["operations"] / seconds if seconds > 0 else 0.0
+    return True, totals
+
+
+# ---------- Command line ----------
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m app.cli",
+                                     description="Bookstore operations without the dashboard.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, (function, spec) in OPERATIONS.items():
+        p = sub.add_parser(name, help=(function.__doc__ or "").strip().split("\n")[0] or None)
+        for arg, arg_type, default in spec:
+            if default is REQUIRED:
+                p.add_argument(arg, type=arg_type)
+            else:
+                p.add_argument("--" + arg.replace("_", "-"), dest=arg, type=arg_type, default=default)
+
+    p_batch = sub.add_parser("batch", help="run JSON Lines operations from stdin")
+    p_batch.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                         help="operations per transaction (default %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if query_capture.ENABLED:
+        success, result = query_capture.enable_capture()
+        if not success:
+            print(result, file=sys.stderr)
+            return 1
+
+    if args.command == "batch":
+        success, result = run_batch(sys.stdin, sys.stdout, args.batch_size)
+        if success:
+            print(f"{result['operations']} operations ({result['failed']} failed) in {result['batches']} "
+                  f"batches, {result['seconds']:.1f}s, {result['operations_per_second']:.0f} ops/s",
+                  file=sys.stderr)
+        else:
+            print(result, file=sys.stderr)
+        return 0 if success else 1
+
+    values = {arg: getattr(args, arg) for arg, _, _ in OPERATIONS[args.command][1]}
+    success, result = run_operation(args.command, values)
+    sys.stdout.write(_json_line({"op": args.command, "ok": success, ("result" if success else "error"): result}))
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
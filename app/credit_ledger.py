@@ -0,0 +1,178 @@
+# app/credit_ledger.py
+# Store credit changes and the ledger that backs them.
+#
+# Customer.credit_total is a cached balance. It is only ever changed by
+# add_credit()/spend_credit() below, which add a delta in SQL
+# ("credit_total = credit_total + %s") and append a Credit_Ledger row in the caller's
+# transaction. Two tills crediting the same customer at once therefore both count.
+#
+# The reconciliation job checks that every balance equals the sum of its ledger,
+# working through customer_id ranges on several connections at once (one per
+# background lane slot unless --workers says fewer):
+#   python -m app.credit_ledger reconcile [--workers N] [--chunk-size 5000]
+#   python -m app.credit_ledger history CUSTOMER_ID
+
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from app.db_connect import create_connection_for, create_read_connection
+from app.lanes import lane_workers, BACKGROUND
+from app.query_loader import load_queries
+
+queries = load_queries("db/queries.sql")
+
+
+def _current_balance(cursor, customer_id):
+    cursor.execute(queries.get("fetch_credit_by_customer_id"), (customer_id,))
+    (credit_total,) = cursor.fetchone()
+    return credit_total
+
+
+def add_credit(cursor, customer_id, amount, reason, order_id=None, book_id=None):
+    """
+    Add amount (may be negative) to a customer's credit and record it in the ledger.
+    Runs on the caller's cursor; the caller commits. The customer row stays locked
+    until then. Returns (True, new balance) or (False, error message).
+    """
+    amount = Decimal(str(amount))
+    cursor.execute(queries.get("update_customer_credit_total"), (amount, customer_id))
+    if cursor.rowcount == 0:
+        return False, f"Customer ID {customer_id} not found."
+    cursor.execute(queries.get("insert_credit_ledger_entry"), (customer_id, amount, reason, order_id, book_id))
+    return True, _current_balance(cursor, customer_id)
+
+
+def spend_credit(cursor, customer_id, amount, order_id):
+    """
+    Take amount off a customer's credit for an order, only if they still have that much
+    (another till may have used it a moment ago). Same transaction rules as add_credit().
+    Returns (True, new balance) or (False, error message).
+    """
+    amount = Decimal(str(amount))
+    cursor.execute(queries.get("update_customer_credit_after_order"), (amount, customer_id, amount))
+    if cursor.rowcount == 0:
+        return False, f"Customer {customer_id} no longer has ${amount:.2f} of store credit."
+    cursor.execute(queries.get("insert_credit_ledger_entry"), (customer_id, -amount, "order", order_id, None))
+    return True, _current_balance(cursor, customer_id)
+
+
+# ---------- Reconciliation ----------
+
+def _reconcile_range(lo, hi):
+    """Mismatches in one customer_id range, on its own connection."""
+    conn, error = create_read_connection(lane=BACKGROUND)
+    if conn is None:
+        raise RuntimeError(error)
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(queries.get("credit_reconcile_chunk"), (lo, hi, lo, hi))
+        return [
+            {"customer_id": customer_id, "credit_total": credit_total,
+             "ledger_total": Decimal(ledger_total), "entries": int(entries)}
+            for customer_id, credit_total, ledger_total, entries in cursor.fetchall()
+        ]
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def reconcile(workers=None, chunk_size=5000):
+    """
+    Compare every customer's credit_total with the sum of their ledger entries.
+    workers defaults to (and is capped at) the background lane's slots.
+    Returns (True, {"customers_checked": range size, "mismatches": [...]}) or (False, error).
+    """
+    workers = lane_workers(BACKGROUND, workers)
+    for name in ("credit_customer_id_range", "credit_reconcile_chunk"):
+        if not queries.get(name):
+            return False, f"Query '{name}' not found."
+
+    conn, error = create_read_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(queries.get("credit_customer_id_range"))
+        first_id, last_id = cursor.fetchone()
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+    if first_id is None:
+        return True, {"customers_checked": 0, "mismatches": []}
+
+    ranges = [(lo, min(lo + chunk_size - 1, last_id)) for lo in range(first_id, last_id + 1, chunk_size)]
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(lambda r: _reconcile_range(*r), ranges))
+    except Exception as e:
+        return False, str(e)
+
+    mismatches = [row for chunk in chunks for row in chunk]
+    return True, {"customers_checked": last_id - first_id + 1, "mismatches": mismatches}
+
+
+def credit_history(customer_id):
+    """Returns (True, [(created_at, amount, reason, order_id, book_id)]) or (False, error)."""
+    sql_history = queries.get("fetch_credit_ledger")
+    if not sql_history:
+        return False, "Query 'fetch_credit_ledger' not found."
+
+    conn, error = create_connection_for("fetch_credit_ledger")
+    if conn is None:
+        return False, error
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql_history, (customer_id,))
+        return True, cursor.fetchall()
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store credit ledger tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_reconcile = sub.add_parser("reconcile", help="check every balance against its ledger")
+    p_reconcile.add_argument("--workers", type=int, default=None, help="default: background lane slots")
+    p_reconcile.add_argument("--chunk-size", type=int, default=5000, help="customer ids per query")
+    p_history = sub.add_parser("history", help="list a customer's credit changes")
+    p_history.add_argument("customer_id", type=int)
+    args = parser.parse_args()
+
+    if args.command == "history":
+        success, result = credit_history(args.customer_id)
+        if not success:
+            print(f"Failed: {result}")
+            sys.exit(1)
+        balance = Decimal("0.00")
+        for created_at, amount, reason, order_id, book_id in result:
+            balance += amount
+            ref = f"order {order_id}" if order_id else (f"book {book_id}" if book_id else "")
+            print(f"{created_at:%Y-%m-%d %H:%M}  {amount:>+9.2f}  {balance:>9.2f}  {reason:<16} {ref}")
+        if not result:
+            print("No credit changes for this customer.")
+        sys.exit(0)
+
+    success, result = reconcile(args.workers, args.chunk_size)
+    if not success:
+        print(f"Reconciliation failed: {result}")
+        sys.exit(1)
+    print(f"Checked customer ids over a range of {result['customers_checked']}: "
+          f"{len(result['mismatches'])} balances don't match the ledger.")
+    for row in result["mismatches"]:
+        print(f"  customer {row['customer_id']}: balance ${row['credit_total']:.2f}, "
+              f"ledger ${row['ledger_total']:.2f} ({row['entries']} entries)")
+    sys.exit(0 if not result["mismatches"] else 1)
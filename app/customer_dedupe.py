@@ -0,0 +1,295 @@
+# app/customer_dedupe.py
+# Finds customers who signed up more than once and merges their accounts.
+#
+# Comparing every customer with every other one is O(n^2), so customers are first
+# put into "blocks" that duplicates are very likely to share:
+#   - the Soundex code of the last name plus the first initial ("Smith, John" and
+#     "Smyth, Jon" both give S530J)
+#   - the local part of the email, without dots or a +tag ("j.smith+books@x.com"
+#     and "jsmith@y.com" both give jsmith)
+# Only customers in the same block are compared and scored. Likely duplicates are
+# written to a CSV for a person to check, then merged one pair at a time:
+#
+#   python -m app.customer_dedupe propose [--threshold 0.85] [--out logs/dedupe_proposals.csv]
+#   python -m app.customer_dedupe merge KEEP_ID DROP_ID
+#
+# A merge moves the dropped customer's orders (including archived ones) and store
+# credit to the kept customer and marks the dropped one 'merged', in one transaction.
+
+import argparse
+import csv
+import os
+import sys
+from decimal import Decimal
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from app.db_connect import create_connection
+from app.lanes import BACKGROUND
+from app.query_loader import load_queries
+from app.events import publish, CreditChanged, CustomerDeactivated
+from app.credit_ledger import add_credit
+
+queries = load_queries("db/queries.sql")
+
+PROPOSALS_PATH = "logs/dedupe_proposals.csv"
+DEFAULT_THRESHOLD = 0.85
+# Blocks bigger than this (a very common name) are split no further and skipped;
+# they are reported so someone can look at them by hand
+MAX_BLOCK_SIZE = 200
+
+_SOUNDEX_CODES = {}
+for letters, code in (("BFPV", "1"), ("CGJKQSXZ", "2"), ("DT", "3"), ("L", "4"), ("MN", "5"), ("R", "6")):
+    for letter in letters:
+        _SOUNDEX_CODES[letter] = code
+
+
+def soundex(name):
+    """American Soundex code of a name, e.g. Robert -> R163. '' for no letters."""
+    letters = [ch for ch in name.upper() if "A" <= ch <= "Z"]
+    if not letters:
+        return ""
+
+    result = letters[0]
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for ch in letters[1:]:
+        code = _SOUNDEX_CODES.get(ch, "")
+        if code and code != previous:
+            result += code
+            if len(result) == 4:
+                break
+        # H and W don't separate letters with the same code; vowels do
+        if ch not in "HW":
+            previous = code
+    return result.ljust(4, "0")
+
+
+def email_local_part(email):
+    """Lower-case local part of an email with dots and any +tag removed."""
+    local = (email or "").lower().split("@", 1)[0]
+    return local.split("+", 1)[0].replace(".", "")
+
+
+def blocking_keys(customer):
+    keys = []
+    last_code = soundex(customer["last_name"])
+    first_initial = (customer["first_name"] or "").strip()[:1].upper()
+    if last_code and first_initial:
+        keys.append(f"name:{last_code}{first_initial}")
+    local = email_local_part(customer["email"])
+    if len(local) >= 3:  # "jd@..." matches far too many people
+        keys.append(f"email:{local}")
+    return keys
+
+
+def _similarity(a, b):
+    a = (a or "").strip().lower()
+    b = (b or "").strip().lower()
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def score_pair(a, b):
+    """How likely two customers are the same person, from 0 to 1."""
+    score = (0.35 * _similarity(a["last_name"], b["last_name"])
+             + 0.25 * _similarity(a["first_name"], b["first_name"])
+             + 0.40 * _similarity(email_local_part(a["email"]), email_local_part(b["email"])))
+    # Same normalized email local part *and* similar name is about as sure as it gets
+    if email_local_part(a["email"]) == email_local_part(b["email"]) and \
+            _similarity(a["last_name"], b["last_name"]) >= 0.8:
+        score = max(score, 0.95)
+    return round(score, 3)
+
+
+def find_duplicates(customers, threshold=DEFAULT_THRESHOLD, max_block_size=MAX_BLOCK_SIZE):
+    """
+    Compare customers only within their blocks.
+    Returns (proposals sorted best first, list of (block key, size) that were too big).
+    Each proposal is (score, keep customer, drop customer); the older account is kept.
+    """
+    blocks = {}
+    for customer in customers:
+        for key in blocking_keys(customer):
+            blocks.setdefault(key, []).append(customer)
+
+    oversized = []
+    best = {}
+    for key, members in blocks.items():
+        if len(members) < 2:
+            continue
+        if len(members) > max_block_size:
+            oversized.append((key, len(members)))
+            continue
+        for a, b in combinations(members, 2):
+            pair = (min(a["customer_id"], b["customer_id"]), max(a["customer_id"], b["customer_id"]))
+            if pair in best:
+                continue  # already scored in another block
+            best[pair] = (score_pair(a, b), a, b)
+
+    proposals = []
+    for score, a, b in best.values():
+        if score >= threshold:
+            keep, drop = (a, b) if a["customer_id"] < b["customer_id"] else (b, a)
+            proposals.append((score, keep, drop))
+    proposals.sort(key=lambda p: (-p[0], p[1]["customer_id"], p[2]["customer_id"]))
+    return proposals, oversized
+
+
+def load_active_customers(chunk_size=5000):
+    """All active customers as dicts. Returns (True, list) or (False, error)."""
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        sql_select = queries.get("select_active_customers_after")
+        if not sql_select:
+            return False, "Query 'select_active_customers_after' not found."
+
+        customers = []
+        last_id = 0
+        while True:
+            cursor.execute(sql_select, (last_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for customer_id, first_name, last_name, email in rows:
+                customers.append({"customer_id": customer_id, "first_name": first_name,
+                                  "last_name": last_name, "email": email})
+            last_id = rows[-1][0]
+        return True, customers
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def propose_merges(threshold=DEFAULT_THRESHOLD, path=PROPOSALS_PATH):
+    """
+    Find likely duplicates and write them to a CSV for review.
+    Returns (True, {"customers": n, "proposals": n, "oversized": [...], "path": path}).
+    """
+    success, customers = load_active_customers()
+    if not success:
+        return False, customers
+
+    proposals, oversized = find_duplicates(customers, threshold)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["score", "keep_id", "keep_name", "keep_email", "drop_id", "drop_name", "drop_email"])
+        for score, keep, drop in proposals:
+            writer.writerow([score,
+                             keep["customer_id"], f"{keep['first_name']} {keep['last_name']}", keep["email"],
+                             drop["customer_id"], f"{drop['first_name']} {drop['last_name']}", drop["email"]])
+
+    return True, {"customers": len(customers), "proposals": len(proposals), "oversized": oversized, "path": path}
+
+
+def merge_customers(keep_id, drop_id):
+    """
+    Merge customer drop_id into keep_id: move their orders (hot and archived),
+    add their store credit to keep_id, and mark drop_id as 'merged'.
+    Everything happens in one transaction, so it either all happens or none of it does.
+    Returns (True, {"orders_moved": n, "credit_moved": Decimal, "credit_total": Decimal}).
+    """
+    keep_id, drop_id = int(keep_id), int(drop_id)
+    if keep_id == drop_id:
+        return False, "Can't merge a customer into itself."
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        names = ["dedupe_lock_customers", "dedupe_move_orders", "dedupe_move_archived_orders",
+                 "dedupe_retire_customer"]
+        sql = {name: queries.get(name) for name in names}
+        missing = [name for name, text in sql.items() if not text]
+        if missing:
+            return False, f"Query '{missing[0]}' not found."
+
+        conn.start_transaction()
+        cursor = conn.cursor()
+
+        # Lock both rows (in id order, so two merges can't deadlock each other)
+        cursor.execute(sql["dedupe_lock_customers"], (keep_id, drop_id))
+        rows = {customer_id: (credit_total, status) for customer_id, credit_total, status in cursor.fetchall()}
+        for customer_id in (keep_id, drop_id):
+            if customer_id not in rows:
+                conn.rollback()
+                return False, f"No customer found with ID: {customer_id}"
+            if rows[customer_id][1] != "active":
+                conn.rollback()
+                return False, f"Customer {customer_id} is not active ({rows[customer_id][1]})."
+
+        credit_moved = rows[drop_id][0]
+
+        cursor.execute(sql["dedupe_move_orders"], (keep_id, drop_id))
+        orders_moved = cursor.rowcount
+        cursor.execute(sql["dedupe_move_archived_orders"], (keep_id, drop_id))
+        orders_moved += cursor.rowcount
+        credit_total = rows[keep_id][0]
+        if credit_moved:
+            # Both sides go through the ledger, so the move shows up in both histories
+            add_credit(cursor, drop_id, -credit_moved, "merge")
+            _, credit_total = add_credit(cursor, keep_id, credit_moved, "merge")
+        cursor.execute(sql["dedupe_retire_customer"], (drop_id,))
+        conn.commit()
+
+        publish(
+            CreditChanged(keep_id, credit_moved, credit_total, "merge"),
+            CreditChanged(drop_id, -credit_moved, Decimal("0.00"), "merge"),
+            CustomerDeactivated(drop_id),
+        )
+        return True, {"orders_moved": orders_moved, "credit_moved": credit_moved, "credit_total": credit_total}
+
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find and merge duplicate customers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_propose = sub.add_parser("propose", help="write likely duplicates to a CSV for review")
+    p_propose.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    p_propose.add_argument("--out", default=PROPOSALS_PATH)
+
+    p_merge = sub.add_parser("merge", help="merge one customer into another")
+    p_merge.add_argument("keep_id", type=int)
+    p_merge.add_argument("drop_id", type=int)
+
+    args = parser.parse_args()
+
+    if args.command == "propose":
+        success, result = propose_merges(args.threshold, args.out)
+        if not success:
+            print(f"Dedupe failed: {result}")
+            sys.exit(1)
+        print(f"Checked {result['customers']} customers: {result['proposals']} likely duplicates "
+              f"written to {result['path']}.")
+        for key, size in result["oversized"]:
+            print(f"  Skipped block {key} ({size} customers) - too common to compare automatically.")
+    else:
+        success, result = merge_customers(args.keep_id, args.drop_id)
+        if not success:
+            print(f"Merge failed: {result}")
+            sys.exit(1)
+        print(f"Merged customer {args.drop_id} into {args.keep_id}: moved {result['orders_moved']} orders "
+              f"and ${result['credit_moved']:.2f} credit (new total ${result['credit_total']:.2f}).")
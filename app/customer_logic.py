@@ -1,8 +1,9 @@
 # Functions for adding or looking up customers
 
 # Connect to DB
-from app.db_connect import create_connection
+from app.db_connect import create_connection, create_connection_for
 from app.query_loader import load_queries
+from app.events import publish, CustomerAdded, CustomerDeactivated
 
 queries = load_queries("db/queries.sql")
 
@@ -41,6 +42,7 @@ def add_new_customer(first_name, last_name, email):
         conn.commit()
 
         customer_id = cursor.lastrowid
+        publish(CustomerAdded(customer_id, email))
 
         # Return new customer_id to GUI
         return True, customer_id
@@ -79,6 +81,7 @@ def mark_customer_as_inactive(customer_id):
         if cursor.rowcount == 0:
             return False, f"No customer found with ID: {customer_id}"
 
+        publish(CustomerDeactivated(int(customer_id)))
         return True, "Customer marked as inactive."
 
     except Exception as e:
@@ -94,7 +97,7 @@ def lookup_customer_credit_by_email(email):
     """
     Looks up a customer's credit balance by email address.
     """
-    conn, error = create_connection()
+    conn, error = create_connection_for("lookup_customer_credit_by_email")
     if conn is None:
         return False, error  # Pass detailed DB error to GUI
 
@@ -130,3 +133,46 @@ def lookup_customer_credit_by_email(email):
         if cursor:
             cursor.close()
         conn.close()
+
+
+def _like_prefix(text):
+    """Turn typed text into a LIKE 'prefix%' pattern, escaping LIKE wildcards."""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def search_customers(prefix, limit=20):
+    """
+    Find active customers whose first name, last name or email starts with prefix.
+    Returns (True, [{"customer_id", "first_name", "last_name", "email"}, ...]).
+    """
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return False, "Please type part of a name or email."
+
+    conn, error = create_connection_for("search_customers_by_prefix")
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        sql_search_customers = queries.get("search_customers_by_prefix")
+        if not sql_search_customers:
+            return False, "Query 'search_customers_by_prefix' not found."
+
+        pattern = _like_prefix(prefix)
+        cursor.execute(sql_search_customers, (pattern, limit, pattern, limit, pattern, limit, limit))
+        customers = [
+            {"customer_id": customer_id, "first_name": first_name, "last_name": last_name, "email": email}
+            for customer_id, first_name, last_name, email in cursor.fetchall()
+        ]
+        return True, customers
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
@@ -0,0 +1,216 @@
+# app/customer_search.py
+# In-memory prefix index of active customers for the customer autocomplete boxes.
+#
+# Every active customer is stored under a few lower-case keys (last name, first name,
+# "first last" and email) in one sorted list of (key, customer_id). A prefix lookup is
+# a binary search to the first key >= prefix and a short walk forward, so typing
+# into the box answers in well under a millisecond even with 100k customers.
+#
+# The index is loaded once in the background (in chunks, by customer_id) and then
+# kept current from change events: CustomerAdded pulls in any customers newer than
+# the ones already loaded, CustomerDeactivated removes the customer. Updates are
+# idempotent, so it doesn't matter if an event arrives twice (locally and from
+# another till). Until the first load finishes, lookups go to the database instead.
+#
+# Events are handled on the Tk thread, so the loading after a CustomerAdded runs on
+# a background thread. Two tills can commit new customers out of id order (101
+# visible before 100), so each load also re-reads the last RESCAN_IDS ids below the
+# highest one loaded, and from just below the new customer's own id.
+
+import bisect
+import threading
+
+from app.db_connect import create_read_connection
+from app.lanes import BACKGROUND
+from app.query_loader import load_queries
+from app.customer_logic import search_customers
+from app.events import CustomerAdded, CustomerDeactivated
+
+queries = load_queries("db/queries.sql")
+
+LOAD_CHUNK_SIZE = 5000
+RESCAN_IDS = 200   # ids below the highest loaded one that are read again on every load
+
+
+def _keys_for(first_name, last_name, email):
+    first = (first_name or "").strip().lower()
+    last = (last_name or "").strip().lower()
+    keys = {first, last, f"{first} {last}", (email or "").strip().lower()}
+    keys.discard("")
+    return keys
+
+
+class CustomerPrefixIndex:
+    """Sorted (key, customer_id) pairs plus the customer rows they point to."""
+
+    def __init__(self):
+        self._entries = []      # sorted list of (key, customer_id)
+        self._customers = {}    # customer_id -> dict with first_name, last_name, email
+        self._last_id = 0       # highest customer_id loaded so far
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_after = None   # lowest id the next background load must start from
+        self._refreshing = False
+        self.ready = False
+
+    def __len__(self):
+        return len(self._customers)
+
+    def add(self, customer_id, first_name, last_name, email):
+        self.add_many([(customer_id, first_name, last_name, email)])
+
+    def add_many(self, rows):
+        """Add (customer_id, first_name, last_name, email) rows, skipping ones already indexed."""
+        with self._lock:
+            new_entries = []
+            for customer_id, first_name, last_name, email in rows:
+                if customer_id in self._customers:
+                    continue
+                self._customers[customer_id] = {
+                    "customer_id": customer_id,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "email": email,
+                }
+                new_entries.extend((key, customer_id) for key in _keys_for(first_name, last_name, email))
+                self._last_id = max(self._last_id, customer_id)
+
+            if len(new_entries) < 10:
+                for entry in new_entries:
+                    bisect.insort(self._entries, entry)
+            elif new_entries:
+                # Bulk load: one sort is much cheaper than thousands of inserts into the middle
+                self._entries.extend(new_entries)
+                self._entries.sort()
+
+    def remove(self, customer_id):
+        with self._lock:
+            customer = self._customers.pop(customer_id, None)
+            if customer is None:
+                return
+            for key in _keys_for(customer["first_name"], customer["last_name"], customer["email"]):
+                i = bisect.bisect_left(self._entries, (key, customer_id))
+                if i < len(self._entries) and self._entries[i] == (key, customer_id):
+                    del self._entries[i]
+
+    def search(self, prefix, limit=20):
+        """Customers with any key starting with prefix, sorted by last then first name."""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        found = {}
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(found) < limit:
+                key, customer_id = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                found[customer_id] = self._customers[customer_id]
+                i += 1
+
+        return sorted(found.values(), key=lambda c: (c["last_name"].lower(), c["first_name"].lower(),
+                                                     c["customer_id"]))
+
+    def load_new(self, chunk_size=LOAD_CHUNK_SIZE, after_id=None):
+        """
+        Load active customers with an ID above after_id (default: RESCAN_IDS below the
+        highest one already indexed). The first call loads everyone.
+        Returns (True, number added) or (False, error).
+        """
+        conn, error = create_read_connection(lane=BACKGROUND)
+        if conn is None:
+            return False, error
+
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            sql_select = queries.get("select_active_customers_after")
+            if not sql_select:
+                return False, "Query 'select_active_customers_after' not found."
+
+            added = 0
+            last_id = max(0, self._last_id - RESCAN_IDS)
+            if after_id is not None:
+                last_id = min(last_id, after_id)
+            while True:
+                cursor.execute(sql_select, (last_id, chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                before = len(self._customers)
+                self.add_many(rows)
+                last_id = rows[-1][0]
+                added += len(self._customers) - before
+
+            self.ready = True
+            return True, added
+
+        except Exception as e:
+            return False, str(e)
+
+        finally:
+            if cursor:
+                cursor.close()
+            conn.close()
+
+    def refresh(self, after_id):
+        """
+        load_new(after_id=...) on a background thread. Calls made while one is running
+        are folded into one more load when it finishes, so a burst of events costs two.
+        """
+        with self._refresh_lock:
+            pending = self._refresh_after
+            self._refresh_after = after_id if pending is None else min(pending, after_id)
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._run_refreshes, name="customer-index-refresh", daemon=True).start()
+
+    def _run_refreshes(self):
+        while True:
+            with self._refresh_lock:
+                if self._refresh_after is None:
+                    self._refreshing = False
+                    return
+                after_id, self._refresh_after = self._refresh_after, None
+            self.load_new(after_id=after_id)
+
+    def apply_event(self, event):
+        """
+        Keep the index current from change events (safe to call more than once).
+        Never touches the database on the calling thread.
+        """
+        if not self.ready:
+            return
+        if isinstance(event, CustomerAdded):
+            self.refresh(event.customer_id - 1)
+        elif isinstance(event, CustomerDeactivated):
+            self.remove(event.customer_id)
+
+
+_index = CustomerPrefixIndex()
+_loading = None
+
+
+def preload_customer_index():
+    """Start loading the shared index in the background (again, if the last try failed)."""
+    global _loading
+    if _loading is None or (not _loading.is_alive() and not _index.ready):
+        _loading = threading.Thread(target=_index.load_new, name="customer-index-load", daemon=True)
+        _loading.start()
+
+
+def apply_customer_event(event):
+    _index.apply_event(event)
+
+
+def find_customers(prefix, limit=20):
+    """
+    Autocomplete lookup: the in-memory index once it's loaded, otherwise the
+    database. Returns (True, list of customer dicts) or (False, error message).
+    """
+    if _index.ready:
+        return True, _index.search(prefix, limit)
+    preload_customer_index()
+    return search_customers(prefix, limit)
@@ -9,5 +9,27 @@ db_settings = {
     "host": "localhost",
     "user": "root",         # or whatever your MySQL username is
     "password": "CHANGEME",      # your password here
-    "database": "used_bookstore_db"
+    "database": "used_bookstore_db",
+
+    # Optional: this shop's name, and the other shops for "Search All Stores".
+    # Each other shop needs its own MySQL login (read-only is enough).
+    # "store_name": "Main Street",
+    # "stores": {
+    #     "Harbor Road": {"host": "10.0.2.10", "user": "reader", "password": "CHANGEME",
+    #                     "database": "used_bookstore_db"},
+    # },
+
+    # Optional: read replicas of this database. Searches, reports and exports go
+    # to a replica unless it is down or more than max_replica_lag_seconds behind.
+    # "replicas": [
+    #     {"host": "10.0.1.20", "user": "reader", "password": "CHANGEME", "database": "used_bookstore_db"},
+    # ],
+    # "max_replica_lag_seconds": 5,
+
+    # Optional: connection slots for interactive work (checkout, lookups) and for
+    # background work (reports, exports, jobs); see app/lanes.py for the defaults.
+    # "lanes": {"background": {"slots": 2, "max_queue": 8, "wait_seconds": 30}},
+    # To cap background connections across every till and job (not just per process),
+    # give the background lane its own account created WITH MAX_USER_CONNECTIONS:
+    # "lanes": {"background": {"account": {"user": "bookstore_bg", "password": "..."}}},
 }
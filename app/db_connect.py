@@ -1,8 +1,19 @@
 # App logic for connecting the database
 
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
 # Load the Connector/Python library
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error, errorcode
+from mysql.connector.errors import PoolError, ReadTimeoutError, WriteTimeoutError
+
+from app.query_loader import load_query_info
+from app.lanes import INTERACTIVE, LaneBusy, configure_lanes, lane_for_class, acquire as acquire_lane
 
 # Try to load local credentials first (security for users)
 try:
@@ -12,16 +23,528 @@ except ImportError:
     from app.db_config import db_settings
 
 
+# Optional wrappers applied to every new connection (e.g. app/profiling.py).
+# Each is called as wrapper(connection, connect_seconds) and returns the
+# connection to hand out (usually a thin proxy around it).
+connection_wrappers = []
+
+
+def add_connection_wrapper(wrapper):
+    """Register a wrapper for every connection created from now on."""
+    if wrapper not in connection_wrappers:
+        connection_wrappers.append(wrapper)
+
+
+# ---------- Time budgets ----------
+#
+# Named queries carry a class and a time budget (see app/query_loader.py); SELECTs
+# get a MAX_EXECUTION_TIME hint so MySQL stops them when the budget runs out.
+# create_connection_for(query_name) also sets a client-side read/write timeout per
+# class (the driver's read_timeout/write_timeout, Connector/Python 9.0+), as a
+# backstop for a server that stops answering at all. connection_timeout alone
+# wouldn't do: it only covers connecting. Either way the logic
+# functions see a QueryTimeout, whose message is fit to show on screen.
+
+query_info = load_query_info("db/queries.sql")
+
+# Client-side read timeout per query class, in seconds (None = wait as long as it takes)
+CLIENT_TIMEOUT_SECONDS = {"interactive": 5, "report": 60, "batch": None}
+
+# MySQL: 3024 = MAX_EXECUTION_TIME exceeded; client: 2013 = lost connection (the C
+# extension's read timeout; the pure-Python driver raises ReadTimeoutError instead)
+ER_QUERY_TIMEOUT = 3024
+CR_SERVER_LOST = 2013
+# MySQL: the account's MAX_USER_CONNECTIONS are all in use (see "Lanes" below)
+ER_USER_LIMIT_REACHED = 1226
+
+_BUDGET_HINT = re.compile(r"MAX_EXECUTION_TIME\((\d+)\)")
+
+
+class QueryTimeout(Exception):
+    """A query ran past its time budget and was stopped."""
+
+
+def _timeout_error(error, operation, client_timeout=False):
+    """QueryTimeout for a timeout error, None for anything else."""
+    # Checked first: the pure-Python driver gives these errno 3024 as well
+    if isinstance(error, (ReadTimeoutError, WriteTimeoutError)):
+        return QueryTimeout("The database didn't answer in time. Please try again.")
+    if error.errno == ER_QUERY_TIMEOUT:
+        match = _BUDGET_HINT.search(operation or "")
+        limit = f" (limit {match.group(1)} ms)" if match else ""
+        return QueryTimeout(f"The database took too long{limit}, so the query was stopped. "
+                            "Please try again, or narrow it down.")
+    if error.errno == CR_SERVER_LOST and (client_timeout or "timed out" in str(error)):
+        return QueryTimeout("The database didn't answer in time. Please try again.")
+    return None
+
+
+class _BudgetCursor:
+    """Cursor proxy that turns timeout errors into QueryTimeout."""
+
+    def __init__(self, cursor, client_timeout=False):
+        self._cursor = cursor
+        self._client_timeout = client_timeout   # connection has a read timeout
+        self._operation = None
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except Error as e:
+            timeout = _timeout_error(e, self._operation, self._client_timeout)
+            if timeout is None:
+                raise
+            raise timeout from e
+
+    def execute(self, operation, *args, **kwargs):
+        self._operation = operation
+        return self._call(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        self._operation = operation
+        return self._call(self._cursor.executemany, operation, *args, **kwargs)
+
+    def fetchone(self):
+        return self._call(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._call(self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._call(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _BudgetConnection:
+    def __init__(self, connection, client_timeout=False):
+        self._connection = connection
+        self._client_timeout = client_timeout
+
+    def cursor(self, *args, **kwargs):
+        return _BudgetCursor(self._connection.cursor(*args, **kwargs), self._client_timeout)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+# Keys in db_settings that are ours, not mysql.connector.connect() arguments
+APP_SETTINGS = ("store_name", "stores", "replicas", "max_replica_lag_seconds", "lanes")
+
+LOCAL_STORE_NAME = db_settings.get("store_name", "This store")
+
+# Connections per store for cross-store searches, and how long (seconds) one
+# store may take to connect or answer before it is left out
+STORE_POOL_SIZE = 3
+STORE_TIMEOUT_SECONDS = 3
+
+# A shop that can't be reached is skipped (not retried) for this long
+STORE_DOWN_SECONDS = 30
+
+_store_pools = {}
+_store_locks = {}        # one lock per store: building a pool connects, which can take a while
+_store_down = {}         # store -> (monotonic time to retry, error message)
+_store_pools_lock = threading.Lock()   # only guards the dicts above, never held while connecting
+
+
+def connect_args(settings):
+    """The mysql.connector arguments from a settings dict."""
+    return {key: value for key, value in settings.items() if key not in APP_SETTINGS}
+
+
+def store_names():
+    """This store first, then the other shops configured in db_settings["stores"]."""
+    return [LOCAL_STORE_NAME] + [name for name in db_settings.get("stores", {}) if name != LOCAL_STORE_NAME]
+
+
+def _store_settings(store_name):
+    if store_name == LOCAL_STORE_NAME:
+        return connect_args(db_settings)
+    return connect_args(db_settings["stores"][store_name])
+
+
+def create_store_connection(store_name):
+    """
+    Connection to one of the shops, from that shop's own pool, so one slow or dead
+    shop can't use up the connections of the others. Close it to return it to the pool.
+    Returns (connection, None) or (None, error message), like create_connection().
+    """
+    with _store_pools_lock:
+        down = _store_down.get(store_name)
+        if down is not None and time.monotonic() < down[0]:
+            return None, down[1]
+        pool = _store_pools.get(store_name)
+        store_lock = _store_locks.setdefault(store_name, threading.Lock())
 
-def create_connection():
     try:
-        connection = mysql.connector.connect(**db_settings)
+        if pool is None:
+            # Only callers for this same store wait here; the others carry on
+            with store_lock:
+                pool = _store_pools.get(store_name)
+                if pool is None:
+                    settings = {**_with_timeout(STORE_TIMEOUT_SECONDS), **_store_settings(store_name)}
+                    pool = mysql.connector.pooling.MySQLConnectionPool(
+                        pool_name=f"store_{store_names().index(store_name)}", pool_size=STORE_POOL_SIZE,
+                        **settings)
+                    with _store_pools_lock:
+                        _store_pools[store_name] = pool
+                        _store_down.pop(store_name, None)
+
+        started = time.perf_counter()
+        connection = _BudgetConnection(pool.get_connection(), client_timeout=True)
+        connect_seconds = time.perf_counter() - started
+        for wrapper in connection_wrappers:
+            connection = wrapper(connection, connect_seconds)
+        return connection, None
+    except (KeyError, ValueError):
+        return None, f"Unknown store: {store_name}"
+    except PoolError as e:
+        return None, f"{store_name} is busy: {e}"  # all its connections in use, not down
+    except Error as e:
+        message = f"Error while connecting to {store_name}: {e}"
+        with _store_pools_lock:
+            _store_down[store_name] = (time.monotonic() + STORE_DOWN_SECONDS, message)
+        return None, message
+
+
+def _with_timeout(client_timeout):
+    """
+    Connect arguments that give up on connecting, and on any one read or write, after
+    client_timeout seconds. The driver wants whole seconds.
+    """
+    if client_timeout is None:
+        return {}
+    seconds = max(1, math.ceil(client_timeout))
+    return {"connection_timeout": seconds, "read_timeout": seconds, "write_timeout": seconds}
+
+
+def _open(settings):
+    """Connect with mysql.connector and apply the connection wrappers."""
+    try:
+        started = time.perf_counter()
+        connection = mysql.connector.connect(**settings)
         if connection.is_connected():
+            connect_seconds = time.perf_counter() - started
+            connection = _BudgetConnection(connection, settings.get("read_timeout") is not None)
+            for wrapper in connection_wrappers:
+                connection = wrapper(connection, connect_seconds)
             return connection, None  # Return connection and no error
     except Error as e:
         if e.errno == errorcode.ER_ACCESS_DENIED_ERROR:
             return None, "Invalid credentials – check your username or password."
         elif e.errno == errorcode.ER_BAD_DB_ERROR:
             return None, "Database not found – check your database name."
+        elif e.errno == ER_USER_LIMIT_REACHED:
+            return None, ("The database is busy with other background work (connection limit "
+                          "reached). Please try again later.")
         else:
             return None, f"Error while connecting to MySQL: {e}"
+    return None, "Could not connect to MySQL."
+
+
+def _open_primary(client_timeout=None, account=None):
+    settings = {**connect_args(db_settings), **(account or {}), **_with_timeout(client_timeout)}
+    connection, error = _open(settings)
+    if connection is not None and REPLICAS:
+        connection = _PrimaryConnection(connection)
+    return connection, error
+
+
+def create_connection(client_timeout=None, lane=INTERACTIVE):
+    """
+    Connection to the primary database (all writes, and reads that must be current).
+    client_timeout: seconds to wait for any one answer from MySQL (None = no limit).
+    lane: INTERACTIVE, BACKGROUND (see app/lanes.py) or None for tools that manage
+    their own connections. Close the connection to give its lane slot back.
+    """
+    return _in_lane(lane, _open_primary, client_timeout)
+
+
+# ---------- Lanes ----------
+#
+# Interactive and background work get separate connection slots (app/lanes.py), so
+# reports and jobs can't take the connections a checkout needs. The connection
+# handed out gives its slot back when it's closed.
+#
+# Slots only count connections inside one process. Jobs started with python -m
+# (exports, stocktake, repricing, integrity...) and every till are separate
+# processes; to cap background connections across all of them, give the
+# background lane its own MySQL account with MAX_USER_CONNECTIONS (lane
+# "account" setting). MySQL then refuses extra background connections
+# (ER_USER_LIMIT_REACHED), whichever process asks.
+
+configure_lanes(db_settings.get("lanes"))
+
+
+class _LaneConnection:
+    """Connection proxy that gives the lane slot back on close()."""
+
+    def __init__(self, connection, lane):
+        self._connection = connection
+        self._lane = lane
+
+    def close(self):
+        try:
+            return self._connection.close()
+        finally:
+            if self._lane is not None:
+                self._lane.release()
+                self._lane = None
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def _set_resource_group(connection, lane):
+    """Put a background session in its MySQL resource group (lower CPU priority), if set up."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SET RESOURCE GROUP `{lane.resource_group}`")
+    except Error:
+        lane.resource_group = None  # not set up, or no privilege: don't try again
+    finally:
+        cursor.close()
+
+
+def _in_lane(lane_name, opener, client_timeout):
+    """
+    Take a slot in the lane, then open a connection with opener(client_timeout, account),
+    as the lane's own MySQL account if it has one.
+    """
+    shared = getattr(_shared, "connection", None)
+    if shared is not None:
+        return shared, None
+    if lane_name is None:
+        return opener(client_timeout)
+
+    try:
+        lane = acquire_lane(lane_name)
+    except LaneBusy as e:
+        return None, str(e)
+
+    connection, error = opener(client_timeout, lane.account)
+    if connection is None:
+        lane.release()
+        return None, error
+    if lane.resource_group:
+        _set_resource_group(connection, lane)
+    return _LaneConnection(connection, lane), None
+
+
+# ---------- Read replicas ----------
+#
+# With "replicas" in db_settings, read-only lookups (search_*, lookup_*, fetch_*,
+# report_*, ...) can use create_connection_for(query_name) / create_read_connection()
+# to go to a replica, so reports and browsing don't compete with checkouts on the
+# primary. A replica is skipped while it is down (tried again after
+# REPLICA_DOWN_SECONDS) or more than max_replica_lag_seconds behind. For a little while after this app commits a
+# write, reads go to the primary too, so a clerk always sees what they just saved.
+# Checkout (order_logic) always uses the primary.
+
+REPLICAS = db_settings.get("replicas", [])
+MAX_REPLICA_LAG_SECONDS = db_settings.get("max_replica_lag_seconds", 5)
+# How long a replica's measured lag is trusted before measuring again
+LAG_CHECK_SECONDS = 2
+# A replica that can't be reached (or isn't replicating) is skipped for this long
+REPLICA_DOWN_SECONDS = 30
+# Longest wait for a replica to accept a connection, so a dead host can't stall a
+# read (background reads have no client timeout at all); the primary is next anyway
+REPLICA_CONNECT_TIMEOUT_SECONDS = 2
+# After a write, how long reads stay on the primary
+READ_YOUR_WRITES_SECONDS = MAX_REPLICA_LAG_SECONDS + LAG_CHECK_SECONDS
+
+READ_ONLY_QUERY_PREFIXES = ("search_", "lookup_", "fetch_", "report_", "export_", "filter_", "book_facet")
+
+_replica_health = {}   # replica index -> (checked_at, lag seconds or None if unusable)
+_replica_turn = 0
+_replica_lock = threading.Lock()
+_last_write_at = float("-inf")
+
+
+def note_write():
+    """
+    Send reads to the primary for a while: the replicas may not have this write yet.
+    Called on every commit here, and by the GUI when another till reports a change.
+    """
+    global _last_write_at
+    _last_write_at = time.monotonic()
+
+
+class _PrimaryConnection:
+    """Primary connection proxy that notes every commit for read-your-writes."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def commit(self):
+        result = self._connection.commit()
+        note_write()
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def replica_lag(connection):
+    """Seconds this replica is behind its source, or None if replication isn't running."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL before 8.0.22
+        status = cursor.fetchone()
+        cursor.fetchall()
+    finally:
+        cursor.close()
+    if not status:
+        return None
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else int(lag)
+
+
+def create_read_connection(client_timeout=None, lane=INTERACTIVE):
+    """
+    Connection for a read-only query: a replica that is up and not lagging (taking
+    turns between replicas), otherwise the primary. Returns (connection, None) or
+    (None, error message), like create_connection().
+    """
+    return _in_lane(lane, _open_read, client_timeout)
+
+
+def _open_read(client_timeout=None, account=None):
+    if not REPLICAS or time.monotonic() - _last_write_at < READ_YOUR_WRITES_SECONDS:
+        return _open_primary(client_timeout, account)
+
+    global _replica_turn
+    with _replica_lock:
+        first = _replica_turn
+        _replica_turn = (_replica_turn + 1) % len(REPLICAS)
+
+    for i in range(len(REPLICAS)):
+        index = (first + i) % len(REPLICAS)
+        now = time.monotonic()
+        checked = _replica_health.get(index)
+        trusted_for = REPLICA_DOWN_SECONDS if checked is not None and checked[1] is None else LAG_CHECK_SECONDS
+        fresh = checked is not None and now - checked[0] < trusted_for
+        if fresh and (checked[1] is None or checked[1] > MAX_REPLICA_LAG_SECONDS):
+            continue  # known to be down or behind, don't even connect
+
+        settings = {**connect_args(REPLICAS[index]), **(account or {}), **_with_timeout(client_timeout)}
+        settings["connection_timeout"] = min(settings.get("connection_timeout", REPLICA_CONNECT_TIMEOUT_SECONDS),
+                                             REPLICA_CONNECT_TIMEOUT_SECONDS)
+        connection, _ = _open(settings)
+        if connection is None:
+            _replica_health[index] = (now, None)
+            continue
+
+        if not fresh:
+            try:
+                lag = replica_lag(connection)
+            except Error:
+                lag = None
+            _replica_health[index] = (now, lag)
+            if lag is None or lag > MAX_REPLICA_LAG_SECONDS:
+                connection.close()
+                continue
+        return connection, None
+
+    return _open_primary(client_timeout, account)
+
+
+def is_read_only_query(query_name):
+    return query_name.startswith(READ_ONLY_QUERY_PREFIXES)
+
+
+def create_connection_for(query_name):
+    """
+    Replica for read-only named queries (see READ_ONLY_QUERY_PREFIXES), primary for
+    the rest, in the lane and with the client-side read timeout of the query's class.
+    """
+    info = query_info.get(query_name)
+    query_class = info.query_class if info else "interactive"
+    client_timeout = CLIENT_TIMEOUT_SECONDS.get(query_class)
+    lane = lane_for_class(query_class)
+    if is_read_only_query(query_name):
+        return create_read_connection(client_timeout, lane)
+    return create_connection(client_timeout, lane)
+
+
+# ---------- Shared connection (batch jobs) ----------
+#
+# The logic functions each open, commit and close their own connection. A batch job
+# (app/cli.py batch) runs thousands of them, so inside shared_connection(conn) every
+# create_connection() in that thread hands out the same connection instead. Commits
+# are left to the batch, which commits every N operations, and a function's rollback
+# only undoes its own work: the batch sets SHARED_SAVEPOINT before each operation.
+
+SHARED_SAVEPOINT = "batch_op"
+
+_shared = threading.local()
+
+
+class _SharedConnection:
+    """A borrowed connection: close() and commit() are left to the owner of the batch."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def start_transaction(self, *args, **kwargs):
+        pass  # the batch's transaction is already open
+
+    def rollback(self):
+        cursor = self._connection.cursor()
+        try:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {SHARED_SAVEPOINT}")
+        finally:
+            cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+@contextmanager
+def shared_connection(connection):
+    """Make create_connection() (and read connections) in this thread return `connection`."""
+    _shared.connection = _SharedConnection(connection)
+    try:
+        yield connection
+    finally:
+        _shared.connection = None
+
+
+def replica_report():
+    """Lag of each configured replica, for a quick health check."""
+    lines = []
+    for index, settings in enumerate(REPLICAS):
+        connection, error = _open(connect_args(settings))
+        if connection is None:
+            lines.append(f"{settings.get('host')}: DOWN ({error})")
+            continue
+        try:
+            lag = replica_lag(connection)
+        except Error as e:
+            lag, error = None, str(e)
+        finally:
+            connection.close()
+        if lag is None:
+            lines.append(f"{settings.get('host')}: replication not running")
+        else:
+            state = "ok" if lag <= MAX_REPLICA_LAG_SECONDS else "TOO FAR BEHIND (reads go to the primary)"
+            lines.append(f"{settings.get('host')}: {lag}s behind - {state}")
+    return "\n".join(lines) or "No replicas configured."
+
+
+if __name__ == "__main__":
+    # python -m app.db_connect   -> replica lag report
+    print(replica_report())
@@ -2,6 +2,7 @@
 
 from app.db_connect import create_connection
 from app.query_loader import load_queries
+from app.events import publish, EmployeeAdded, EmployeeTerminated
 
 queries = load_queries("db/queries.sql")  # path from root
 
@@ -31,6 +32,7 @@ def add_new_employee(first_name, last_name, phone_number, access_level):
 
         # Get the new employee ID
         employee_id = cursor.lastrowid
+        publish(EmployeeAdded(employee_id))
         return True, employee_id
 
     except Exception as e:
@@ -60,6 +62,7 @@ def mark_employee_as_terminated(employee_id):
 
         cursor.execute(sql_mark_employee_as_terminated, (employee_id,))
         conn.commit()
+        publish(EmployeeTerminated(int(employee_id)))
         return True, "Employee marked as terminated."
 
     except Exception as e:
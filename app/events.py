@@ -0,0 +1,267 @@
+# app/events.py
+# Change events for everything the logic layer writes.
+#
+# Each write function publishes a typed event right after its commit
+# (e.g. complete_order -> OrderCompleted, BookSold, CreditChanged).
+# Two ways to listen:
+#
+#   1. In-process: subscribe(BookSold, handler) or subscribe(None, handler) for all events.
+#      Handlers run in the publishing thread and must be quick; errors are
+#      printed and swallowed so a bad handler can never undo a committed write.
+#
+#   2. Durable log: every event is also appended (as one JSON line) to
+#      logs/events.log. Writes are batched and flushed every FLUSH_INTERVAL
+#      seconds or FLUSH_BATCH_SIZE events. Other programs can read_events()
+#      from a byte offset, or follow() the log, without querying MySQL.
+#
+#   python -m app.events tail [offset]     (print events, then keep following)
+#
+# A batch job that commits many operations at once (app/cli.py batch) wraps its
+# transaction in hold_events(): events published meanwhile are kept back, and the
+# batch publishes them after its commit, or drops them if it rolls back.
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, fields
+from decimal import Decimal
+
+EVENT_LOG_PATH = "logs/events.log"
+FLUSH_INTERVAL = 0.5     # seconds
+FLUSH_BATCH_SIZE = 100   # events
+
+
+# ---------- Event types ----------
+
+@dataclass(frozen=True)
+class BookAdded:
+    book_id: int
+    isbn: str
+    book_name: str
+    resale_price: Decimal
+    customer_id: int
+
+
+@dataclass(frozen=True)
+class BookSold:
+    book_id: int
+    order_id: int
+    final_price: Decimal
+
+
+@dataclass(frozen=True)
+class OrderCompleted:
+    order_id: int
+    customer_id: int
+    employee_id: int
+    total_amount: Decimal
+    store_credit_used: Decimal
+
+
+@dataclass(frozen=True)
+class CreditChanged:
+    customer_id: int
+    amount: Decimal          # positive = credit added, negative = credit spent
+    credit_total: Decimal    # balance after the change
+    reason: str
+
+
+@dataclass(frozen=True)
+class CustomerAdded:
+    customer_id: int
+    email: str
+
+
+@dataclass(frozen=True)
+class CustomerDeactivated:
+    customer_id: int
+
+
+@dataclass(frozen=True)
+class EmployeeAdded:
+    employee_id: int
+
+
+@dataclass(frozen=True)
+class EmployeeTerminated:
+    employee_id: int
+
+
+EVENT_TYPES = {cls.__name__: cls for cls in (
+    BookAdded, BookSold, OrderCompleted, CreditChanged,
+    CustomerAdded, CustomerDeactivated, EmployeeAdded, EmployeeTerminated,
+)}
+
+
+def event_to_dict(event):
+    """{"type": "BookSold", "ts": 1700000000.0, "data": {...}} - Decimals become strings."""
+    data = {k: (str(v) if isinstance(v, Decimal) else v) for k, v in asdict(event).items()}
+    return {"type": type(event).__name__, "ts": time.time(), "data": data}
+
+
+def event_from_dict(record):
+    """Rebuild a typed event from a log record. Returns None for unknown types."""
+    cls = EVENT_TYPES.get(record.get("type"))
+    if cls is None:
+        return None
+    data = dict(record["data"])
+    for f in fields(cls):
+        if f.type is Decimal and data.get(f.name) is not None:
+            data[f.name] = Decimal(data[f.name])
+    return cls(**data)
+
+
+# ---------- In-process bus ----------
+
+_subscribers = {}   # event class (or None for all) -> list of handlers
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(event_type, handler):
+    """Call handler(event) for every event of event_type (None = every event)."""
+    with _subscribers_lock:
+        _subscribers.setdefault(event_type, []).append(handler)
+
+
+def unsubscribe(event_type, handler):
+    with _subscribers_lock:
+        handlers = _subscribers.get(event_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+
+_held = threading.local()
+
+
+@contextmanager
+def hold_events():
+    """
+    Keep back events published in this thread; yields the list they are collected in.
+    The caller publishes (or drops) them once it knows whether its transaction committed.
+    """
+    _held.events = []
+    try:
+        yield _held.events
+    finally:
+        _held.events = None
+
+
+def publish(*events):
+    """
+    Deliver events to subscribers and the durable log. Call only AFTER commit.
+    Never raises: the DB change already happened, so a failing listener is just reported.
+    """
+    held = getattr(_held, "events", None)
+    if held is not None:
+        held.extend(events)
+        return
+    for event in events:
+        with _subscribers_lock:
+            handlers = _subscribers.get(type(event), []) + _subscribers.get(None, [])
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception:
+                print(f"Event handler {handler!r} failed for {event!r}:", file=sys.stderr)
+                traceback.print_exc()
+
+
+# ---------- Durable append-only log ----------
+
+class EventLog:
+    """Batches events in memory and appends them to the log file as JSON lines."""
+
+    def __init__(self, path=EVENT_LOG_PATH):
+        self.path = path
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def append(self, event):
+        line = json.dumps(event_to_dict(event), separators=(",", ":")) + "\n"
+        with self._lock:
+            self._pending.append(line)
+            if len(self._pending) >= FLUSH_BATCH_SIZE:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # One write per batch; O_APPEND keeps lines whole even with several writers
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(self._pending))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending = []
+        except OSError:
+            print(f"Could not write event log {self.path}:", file=sys.stderr)
+            traceback.print_exc()
+
+
+_event_log = EventLog()
+subscribe(None, _event_log.append)
+atexit.register(_event_log.flush)
+
+
+def flush_event_log():
+    """Write any batched events now (e.g. before a program exits)."""
+    _event_log.flush()
+
+
+def read_events(offset=0, path=EVENT_LOG_PATH):
+    """
+    Yield (next_offset, event) for every complete event in the log after `offset`
+    (a byte position). Save next_offset to resume later from the same place.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return  # a batch is still being written; pick it up next time
+            offset += len(line)
+            event = event_from_dict(json.loads(line))
+            if event is not None:
+                yield offset, event
+
+
+def follow(offset=0, path=EVENT_LOG_PATH, poll_seconds=0.5):
+    """Like read_events, but keeps waiting for new events (tail -f)."""
+    while True:
+        for offset, event in read_events(offset, path):
+            yield offset, event
+        time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "tail":
+        print("Usage: python -m app.events tail [offset]")
+        sys.exit(1)
+
+    start = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    try:
+        for next_offset, event in follow(start):
+            print(f"{next_offset}\t{event}")
+    except KeyboardInterrupt:
+        pass
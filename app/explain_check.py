@@ -0,0 +1,233 @@
+# app/explain_check.py
+# Query plan regression check for every named query in db/queries.sql.
+#
+# Loads the queries the same way the app does, fills in representative values for
+# the %s placeholders, and runs EXPLAIN FORMAT=JSON against a seeded LOCAL database
+# (python -m app.load_test seed gives it realistic table sizes). A query fails when it
+#   - full-scans a table (access_type ALL) that has more than --max-rows rows, or
+#   - needs a filesort or a temporary table over more than --max-rows rows,
+# unless it is listed in db/explain_allowlist.txt (e.g. exports are meant to scan).
+#
+#   python -m app.explain_check [--max-rows 1000] [--only name,name]
+#
+# Exits with status 1 if any query fails, so it can run before merging changes.
+
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app.db_connect import create_connection
+from app.lanes import BACKGROUND
+from app.query_loader import load_queries
+
+ALLOWLIST_PATH = "db/explain_allowlist.txt"
+DEFAULT_MAX_ROWS = 1000
+
+PROBLEMS = ("full_scan", "filesort", "temporary")
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# Values for placeholders the guesser gets wrong: {query name: (params...)}
+PARAM_OVERRIDES = {}
+
+_COLUMN_BEFORE = re.compile(r"([\w`.]+)\s*(=|>=|<=|<>|<|>|LIKE)\s*$", re.IGNORECASE)
+
+
+def _value_for_column(column):
+    """A plausible value for a placeholder compared with `column`."""
+    column = column.strip("`").split(".")[-1].lower()
+    if "date" in column:
+        return datetime(2024, 1, 1)
+    if "email" in column:
+        return "someone@example.com"
+    if "isbn" in column:
+        return "9780441013593"
+    if "status" in column:
+        return "available"
+    if "name" in column:
+        return "Smith"
+    if any(word in column for word in ("price", "amount", "credit", "total", "rating")):
+        return Decimal("10.00")
+    return 1
+
+
+def representative_params(sql):
+    """Guess one value per %s from the text in front of it."""
+    params = []
+    for match in re.finditer(r"%s", sql):
+        before = sql[:match.start()]
+        after = sql[match.end():match.end() + 12].upper()
+        tail = before[-60:]
+
+        if re.search(r"LIMIT\s*$", tail, re.IGNORECASE):
+            params.append(100)
+        elif after.lstrip().startswith("IS NULL"):
+            params.append(None)  # optional filter left open, e.g. (%s IS NULL OR col = %s)
+        elif re.search(r"BETWEEN\s+%s\s+AND\s*$", tail, re.IGNORECASE):
+            params.append(params[-1] + 1000 if isinstance(params[-1], int) else params[-1])
+        else:
+            column = _COLUMN_BEFORE.search(tail)
+            if column is None:
+                column = re.search(r"([\w`.]+)\s+BETWEEN\s*$", tail, re.IGNORECASE)
+            value = _value_for_column(column.group(1)) if column else 1
+            if (isinstance(value, datetime) and params and isinstance(params[-1], datetime)
+                    and column.group(column.lastindex) in ("<", "<=")):
+                value = params[-1] + timedelta(days=30)  # end of a date range: a month, like a report
+            params.append(value)
+    return tuple(params)
+
+
+def load_allowlist(path=ALLOWLIST_PATH):
+    """
+    {query name: set of allowed problems}. One query per line, optionally followed
+    by the problems it is allowed to have; no problems listed = all allowed.
+    """
+    allowed = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                name, *problems = line.split()
+                allowed[name] = set(problems) or set(PROBLEMS)
+    except FileNotFoundError:
+        pass
+    return allowed
+
+
+# ---------- Plan analysis ----------
+
+def _max_rows(node):
+    """Largest rows_examined_per_scan anywhere under this plan node."""
+    best = 0
+    if isinstance(node, dict):
+        best = int(node.get("rows_examined_per_scan", 0) or 0)
+        for value in node.values():
+            best = max(best, _max_rows(value))
+    elif isinstance(node, list):
+        for value in node:
+            best = max(best, _max_rows(value))
+    return best
+
+
+def analyze_plan(plan, max_rows):
+    """
+    Walk an EXPLAIN FORMAT=JSON tree.
+    Returns (list of table access summaries, list of (problem, detail)).
+    """
+    tables = []
+    problems = []
+
+    def walk(node):
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+            return
+        if not isinstance(node, dict):
+            return
+
+        if "table_name" in node:
+            rows = int(node.get("rows_examined_per_scan", 0) or 0)
+            access = node.get("access_type", "?")
+            key = node.get("key", "-")
+            tables.append(f"{node['table_name']}:{access}({key}) rows={rows}")
+            if access == "ALL" and rows > max_rows:
+                problems.append(("full_scan", f"{node['table_name']} ({rows} rows)"))
+
+        if node.get("using_filesort"):
+            rows = _max_rows(node)
+            if rows > max_rows:
+                problems.append(("filesort", f"{rows} rows"))
+        if node.get("using_temporary_table"):
+            rows = _max_rows(node)
+            if rows > max_rows:
+                problems.append(("temporary", f"{rows} rows"))
+
+        for value in node.values():
+            walk(value)
+
+    walk(plan)
+    return tables, problems
+
+
+def check_queries(max_rows=DEFAULT_MAX_ROWS, only=None, allowlist_path=ALLOWLIST_PATH):
+    """
+    EXPLAIN every named query. Returns (True, report lines) if every query is fine
+    (or allowlisted), otherwise (False, report lines).
+    """
+    queries = load_queries("db/queries.sql")
+    allowed = load_allowlist(allowlist_path)
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, [error]
+
+    cursor = None
+    lines = []
+    failed = 0
+    try:
+        cursor = conn.cursor()
+        for name, sql in queries.items():
+            if only and name not in only:
+                continue
+            if not sql.lstrip().upper().startswith(EXPLAINABLE):
+                lines.append(f"SKIP  {name} (not explainable)")
+                continue
+
+            params = PARAM_OVERRIDES.get(name) or representative_params(sql)
+            try:
+                cursor.execute("EXPLAIN FORMAT=JSON " + sql.rstrip().rstrip(";"), params)
+                (plan_json,) = cursor.fetchone()
+            except Exception as e:
+                lines.append(f"ERROR {name}: {e}")
+                failed += 1
+                continue
+
+            tables, problems = analyze_plan(json.loads(plan_json), max_rows)
+            blocking = [(p, d) for p, d in problems if p not in allowed.get(name, set())]
+
+            if blocking:
+                status = "FAIL "
+                failed += 1
+            elif problems:
+                status = "ALLOW"
+            else:
+                status = "OK   "
+            lines.append(f"{status} {name}: {'; '.join(tables) or 'no table access'}")
+            for problem, detail in problems:
+                lines.append(f"        {problem}: {detail}")
+
+        lines.append(f"{failed} failing queries." if failed else "All query plans OK.")
+        return failed == 0, lines
+
+    except Exception as e:
+        return False, lines + [str(e)]
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN every named query and flag bad plans.")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS,
+                        help="row count above which a scan/filesort/temp table fails")
+    parser.add_argument("--only", help="comma separated query names to check")
+    parser.add_argument("--allowlist", default=ALLOWLIST_PATH)
+    args = parser.parse_args()
+
+    from app.load_test import _check_local
+    ok, error = _check_local()
+    if not ok:
+        print(error)
+        sys.exit(1)
+
+    success, report = check_queries(args.max_rows, set(args.only.split(",")) if args.only else None,
+                                    args.allowlist)
+    print("\n".join(report))
+    sys.exit(0 if success else 1)
@@ -0,0 +1,203 @@
+# app/export.py
+# Streams orders or the full inventory to CSV / JSON Lines, optionally gzipped.
+#
+# Rows are never all held in memory: the cursor is unbuffered (rows come off the
+# MySQL socket as they are read) and each row flows through a chain of generators
+# straight into the output file. Memory use is the same for 100 rows or 50 million.
+#
+# Examples (from the project root):
+#   python -m app.export orders --from 2025-09-01 --to 2025-10-01 -o orders-2025-09.csv.gz
+#   python -m app.export inventory --format jsonl --status available -o inventory.jsonl
+
+import argparse
+import csv
+import gzip
+import json
+import sys
+import time
+from datetime import datetime
+
+from app.db_connect import create_read_connection
+from app.lanes import BACKGROUND
+from app.query_loader import load_queries
+from app.archive_logic import needs_archive
+from app.report_logic import EARLIEST_DATE, LATEST_DATE
+
+queries = load_queries("db/queries.sql")
+
+FETCH_SIZE = 2000
+PROGRESS_EVERY_SECONDS = 5
+
+ORDER_COLUMNS = ["order_id", "order_date", "customer_id", "employee_id",
+                 "total_amount", "store_credit_used", "final_amount_paid",
+                 "book_id", "isbn", "book_name", "author_name",
+                 "purchase_price", "final_price"]
+
+INVENTORY_COLUMNS = ["book_id", "isbn", "isbn_10", "book_name", "author_name", "book_condition",
+                     "language", "num_pages", "average_ratings", "purchase_price", "resale_price",
+                     "book_status"]
+
+
+# ---------- Pipeline stages ----------
+
+def stream_rows(cursor, sql, params):
+    """Run a query and yield its rows one at a time, fetching in small batches."""
+    cursor.execute(sql, params)
+    while True:
+        batch = cursor.fetchmany(FETCH_SIZE)
+        if not batch:
+            return
+        yield from batch
+
+
+def count_progress(rows, stats, out=sys.stderr):
+    """Pass rows through unchanged while counting them and reporting rows/s."""
+    last_report = stats["started"]
+    for row in rows:
+        stats["rows"] += 1
+        yield row
+        if stats["rows"] % FETCH_SIZE == 0:
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_EVERY_SECONDS:
+                rate = stats["rows"] / (now - stats["started"])
+                print(f"  {stats['rows']:,} rows ({rate:,.0f} rows/s)", file=out)
+                last_report = now
+
+
+def write_csv(rows, columns, out):
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_jsonl(rows, columns, out):
+    for row in rows:
+        # default=str handles Decimal and datetime values
+        out.write(json.dumps(dict(zip(columns, row)), default=str))
+        out.write("\n")
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+
+def open_output(path, use_gzip):
+    """Open the output as text; gzip if asked or the name ends in .gz. '-' is stdout."""
+    if path in (None, "-"):
+        if use_gzip:
+            return gzip.open(sys.stdout.buffer, "wt", newline="", encoding="utf-8")
+        return sys.stdout
+    if use_gzip or path.endswith(".gz"):
+        return gzip.open(path, "wt", newline="", encoding="utf-8")
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+# ---------- Exports ----------
+
+def _export(sources, columns, path, fmt, use_gzip):
+    """
+    Shared driver: `sources(cursor)` returns a list of (query name, params),
+    which are streamed one after another into a single output.
+    Returns (True, {"rows": n, "seconds": s, "rows_per_second": r}) or (False, message).
+    """
+    if fmt not in WRITERS:
+        return False, f"Unknown format '{fmt}' (use csv or jsonl)."
+
+    # Every export query is read-only, so a replica takes the long scan if there is one
+    conn, error = create_read_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    out = None
+    try:
+        # Small lookups (e.g. the archive cutoff) use a normal buffered cursor
+        lookup_cursor = conn.cursor(buffered=True)
+        try:
+            source_list = sources(lookup_cursor)
+        finally:
+            lookup_cursor.close()
+
+        sql_sources = []
+        for name, params in source_list:
+            sql = queries.get(name)
+            if not sql:
+                return False, f"Query '{name}' not found."
+            sql_sources.append((sql, params))
+
+        # Unbuffered: rows stay on the server until fetched, so memory stays flat
+        cursor = conn.cursor(buffered=False)
+
+        def all_rows():
+            for sql, params in sql_sources:
+                yield from stream_rows(cursor, sql, params)
+
+        stats = {"rows": 0, "started": time.perf_counter()}
+        out = open_output(path, use_gzip)
+        WRITERS[fmt](count_progress(all_rows(), stats), columns, out)
+
+        elapsed = time.perf_counter() - stats["started"]
+        return True, {
+            "rows": stats["rows"],
+            "seconds": elapsed,
+            "rows_per_second": stats["rows"] / elapsed if elapsed > 0 else 0.0,
+        }
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def export_orders(path, fmt="csv", start_date=None, end_date=None, use_gzip=False):
+    """Export one row per sold book (Order + Order_Detail + Book) for the date range."""
+    params = (start_date or EARLIEST_DATE, end_date or LATEST_DATE)
+
+    def sources(cursor):
+        # Archived orders are older, so stream them first to keep date order
+        names = ["export_orders"]
+        if needs_archive(cursor, start_date):
+            names.insert(0, "export_orders_archive")
+        return [(name, params) for name in names]
+
+    return _export(sources, ORDER_COLUMNS, path, fmt, use_gzip)
+
+
+def export_inventory(path, fmt="csv", status=None, use_gzip=False):
+    """Export every book, or only those with the given book_status."""
+    def sources(cursor):
+        return [("export_inventory", (status, status))]
+
+    return _export(sources, INVENTORY_COLUMNS, path, fmt, use_gzip)
+
+
+def _parse_date(text):
+    return datetime.strptime(text, "%Y-%m-%d")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream orders or inventory to CSV/JSONL.")
+    parser.add_argument("what", choices=["orders", "inventory"])
+    parser.add_argument("-o", "--output", default="-", help="output file (default stdout)")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output (automatic for .gz names)")
+    parser.add_argument("--from", dest="start", type=_parse_date, help="orders: first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", type=_parse_date, help="orders: day after the last, YYYY-MM-DD")
+    parser.add_argument("--status", help="inventory: only books with this status (e.g. available)")
+    args = parser.parse_args()
+
+    if args.what == "orders":
+        success, result = export_orders(args.output, args.format, args.start, args.end, args.gzip)
+    else:
+        success, result = export_inventory(args.output, args.format, args.status, args.gzip)
+
+    if not success:
+        print(f"Export failed: {result}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Exported {result['rows']:,} rows in {result['seconds']:.1f}s "
+          f"({result['rows_per_second']:,.0f} rows/s)", file=sys.stderr)
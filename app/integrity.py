@@ -0,0 +1,247 @@
+# app/integrity.py
+# Nightly data integrity scan for inventory, orders and store credit.
+#
+# Writes aren't all guarded (manual order lines, fixes made by hand), so now and then
+# the tables disagree. The scan looks for:
+#   sold_without_detail     - book marked sold, but on no order (hot or archived)
+#   detail_book_available   - book on an order, but still marked available
+#   order_total_mismatch    - order total isn't the sum of its lines' final_price
+#   order_paid_mismatch     - final_amount_paid isn't total - credit used
+#   credit_mismatch         - credit_total isn't the sum of the customer's ledger
+#
+# Each table is walked by key range (book_id, order_id, customer_id) in small chunks,
+# a few chunks at a time in parallel (background lane, so never in the tills' way),
+# with a pause after each one. The checks are set-based queries over one chunk.
+#
+# It's incremental: for every chunk the checkpoint file keeps a fingerprint (row
+# counts and a checksum of the columns the checks read) and the chunk's findings.
+# Next run, a chunk whose fingerprint hasn't changed keeps its old findings and is
+# not checked again, so a nightly run only checks the ranges that changed.
+#
+#   python -m app.integrity [--full] [--workers N] [--chunk-size 5000] [--csv logs/integrity.csv]
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.db_connect import create_read_connection
+from app.lanes import lane_workers, BACKGROUND
+from app.query_loader import load_queries
+
+queries = load_queries("db/queries.sql")
+
+CHECKPOINT_PATH = "logs/integrity_checkpoint.json"
+REPORT_PATH = "logs/integrity.csv"
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_SLEEP = 0.05     # seconds each worker pauses after a chunk
+
+# scan: (id range query, fingerprint query, {check name: query})
+SCANS = {
+    "books": ("integrity_book_id_range", "integrity_book_fingerprint", {
+        "sold_without_detail": "integrity_sold_without_detail",
+        "detail_book_available": "integrity_detail_book_available",
+    }),
+    "orders": ("integrity_order_id_range", "integrity_order_fingerprint", {
+        "order_total_mismatch": "integrity_order_total_mismatch",
+        "order_paid_mismatch": "integrity_order_paid_mismatch",
+    }),
+    "credit": ("credit_customer_id_range", "integrity_customer_fingerprint", {
+        "credit_mismatch": "credit_reconcile_chunk",
+    }),
+}
+
+
+def _range_params(sql, lo, hi):
+    # Every query takes (lo, hi) once per BETWEEN
+    return (lo, hi) * (sql.count("%s") // 2)
+
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(checkpoint, path=CHECKPOINT_PATH):
+    # Write and rename, so a crash never leaves half a checkpoint behind
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, default=str)
+    os.replace(path + ".tmp", path)
+
+
+def plan_chunks(chunk_size):
+    """[(scan, lo, hi)] covering every id in every scanned table."""
+    conn, error = create_read_connection(lane=BACKGROUND)
+    if conn is None:
+        raise RuntimeError(error)
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        chunks = []
+        for scan, (range_query, _, _) in SCANS.items():
+            cursor.execute(queries.get(range_query))
+            first_id, last_id = cursor.fetchone()
+            if first_id is None:
+                continue
+            # Chunks sit on fixed multiples of chunk_size, so they line up between runs
+            start = first_id // chunk_size * chunk_size
+            chunks.extend((scan, lo, lo + chunk_size - 1) for lo in range(start, last_id + 1, chunk_size))
+        return chunks
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def scan_chunk(scan, lo, hi, previous=None, sleep_seconds=DEFAULT_SLEEP):
+    """
+    Fingerprint one chunk and, if it changed since `previous`, run its checks.
+    Fingerprint and checks read the same snapshot, so they always agree.
+    Returns {"fingerprint": [...], "findings": [...], "checked": bool}.
+    """
+    _, fingerprint_query, checks = SCANS[scan]
+
+    conn, error = create_read_connection(lane=BACKGROUND)
+    if conn is None:
+        raise RuntimeError(error)
+    cursor = None
+    try:
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        cursor = conn.cursor()
+
+        sql = queries.get(fingerprint_query)
+        cursor.execute(sql, _range_params(sql, lo, hi))
+        fingerprint = [str(value) for value in cursor.fetchone()]
+        if previous and previous.get("fingerprint") == fingerprint:
+            return {"fingerprint": fingerprint, "findings": previous["findings"], "checked": False}
+
+        findings = []
+        for check, query_name in checks.items():
+            sql = queries.get(query_name)
+            cursor.execute(sql, _range_params(sql, lo, hi))
+            columns = cursor.column_names
+            for row in cursor.fetchall():
+                findings.append({"check": check, **{column: str(value) for column, value in zip(columns, row)}})
+        return {"fingerprint": fingerprint, "findings": findings, "checked": True}
+
+    finally:
+        if cursor:
+            cursor.close()
+        try:
+            conn.rollback()  # only read, just end the snapshot
+        finally:
+            conn.close()
+        if sleep_seconds:
+            time.sleep(sleep_seconds)
+
+
+def run_scan(full=False, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+             sleep_seconds=DEFAULT_SLEEP, checkpoint_path=CHECKPOINT_PATH):
+    """
+    Scan every chunk, checking only those changed since the last checkpoint (all of them
+    with full=True), then save the new checkpoint. workers defaults to (and is capped
+    at) the background lane's slots.
+    Returns (True, {"chunks", "checked", "failed", "findings", "seconds"}) or (False, error).
+    """
+    names = {SCANS[scan][0] for scan in SCANS} | {SCANS[scan][1] for scan in SCANS}
+    names |= {query_name for scan in SCANS for query_name in SCANS[scan][2].values()}
+    missing = sorted(name for name in names if not queries.get(name))
+    if missing:
+        return False, f"Query '{missing[0]}' not found."
+
+    workers = lane_workers(BACKGROUND, workers)
+    checkpoint = {} if full else load_checkpoint(checkpoint_path)
+    if checkpoint.get("chunk_size") != chunk_size:
+        checkpoint = {}  # different chunk boundaries, nothing to compare with
+    previous = checkpoint.get("chunks", {})
+
+    started = time.perf_counter()
+    try:
+        chunks = plan_chunks(chunk_size)
+    except Exception as e:
+        return False, str(e)
+
+    def run(chunk):
+        scan, lo, hi = chunk
+        try:
+            return scan_chunk(scan, lo, hi, previous.get(f"{scan}:{lo}"), sleep_seconds)
+        except Exception as e:
+            return {"error": f"{scan} {lo}-{hi}: {e}"}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, chunks))
+
+    saved = {}
+    findings = []
+    failed = []
+    for (scan, lo, _), result in zip(chunks, results):
+        if "error" in result:
+            failed.append(result["error"])  # not saved: checked again next run
+            continue
+        saved[f"{scan}:{lo}"] = {"fingerprint": result["fingerprint"], "findings": result["findings"]}
+        findings.extend({"scan": scan, **finding} for finding in result["findings"])
+
+    try:
+        save_checkpoint({"chunk_size": chunk_size, "scanned_at": datetime.now().isoformat(timespec="seconds"),
+                         "chunks": saved}, checkpoint_path)
+    except OSError as e:
+        return False, f"Could not save the checkpoint: {e}"
+
+    return True, {
+        "chunks": len(chunks),
+        "checked": sum(1 for result in results if result.get("checked")),
+        "failed": failed,
+        "findings": findings,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def write_report_csv(findings, path=REPORT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["check", "id", "detail"])
+        for finding in findings:
+            values = [(key, value) for key, value in finding.items() if key not in ("scan", "check")]
+            writer.writerow([finding["check"], values[0][1],
+                             " ".join(f"{key}={value}" for key, value in values[1:])])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check books, orders and store credit for inconsistencies.")
+    parser.add_argument("--full", action="store_true", help="ignore the checkpoint and check every chunk")
+    parser.add_argument("--workers", type=int, default=None, help="chunks checked at once (default: background lane slots)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="ids per chunk")
+    parser.add_argument("--sleep", type=float, default=DEFAULT_SLEEP, help="seconds to pause after each chunk")
+    parser.add_argument("--csv", default=REPORT_PATH, help="where to write the findings")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    args = parser.parse_args()
+
+    success, result = run_scan(args.full, args.workers, args.chunk_size, args.sleep, args.checkpoint)
+    if not success:
+        print(f"Integrity scan failed: {result}")
+        sys.exit(1)
+
+    write_report_csv(result["findings"], args.csv)
+    print(f"{result['chunks']} chunks, {result['checked']} checked (the rest unchanged), "
+          f"{result['seconds']:.1f}s")
+    counts = {}
+    for finding in result["findings"]:
+        counts[finding["check"]] = counts.get(finding["check"], 0) + 1
+    for check, count in sorted(counts.items()):
+        print(f"  {check:<24}{count:>8}")
+    if not counts:
+        print("  No problems found.")
+    else:
+        print(f"Details in {args.csv}")
+    for error in result["failed"]:
+        print(f"  Not checked (will retry next run): {error}")
+    sys.exit(1 if result["failed"] else 0)
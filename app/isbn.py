@@ -0,0 +1,208 @@
+# app/isbn.py
+# ISBN helpers: clean up input, check the checksum, and convert to ISBN-13.
+#
+# Every book is stored and searched by one canonical value (Book.isbn_canonical),
+# which is always the 13 digit ISBN with no hyphens. Run the checks here on
+# anything typed or scanned before it reaches a query.
+
+import re
+import sys
+
+# ASCII digits only: str.isdigit() also accepts e.g. '²' and fullwidth digits
+ISBN10_PATTERN = re.compile(r"[0-9]{9}[0-9X]")
+ISBN13_PATTERN = re.compile(r"[0-9]{13}")
+
+
+def normalize_isbn(value):
+    """
+    Strip hyphens, spaces and a leading 'ISBN' label, and upper-case the
+    ISBN-10 'X' check digit. Does not check the checksum.
+    """
+    if value is None:
+        return ""
+    cleaned = str(value).strip().upper()
+    if cleaned.startswith("ISBN"):
+        cleaned = cleaned[4:].lstrip(":- ")
+    return cleaned.replace("-", "").replace(" ", "")
+
+
+def is_valid_isbn10(value):
+    """True if value is a 10 character ISBN with a correct check digit."""
+    if not ISBN10_PATTERN.fullmatch(value):
+        return False
+
+    total = 0
+    for i, ch in enumerate(value):
+        digit = 10 if ch == "X" else int(ch)
+        total += (10 - i) * digit
+    return total % 11 == 0
+
+
+def is_valid_isbn13(value):
+    """True if value is a 13 digit ISBN with a correct check digit."""
+    if not ISBN13_PATTERN.fullmatch(value):
+        return False
+
+    total = sum(int(ch) * (1 if i % 2 == 0 else 3) for i, ch in enumerate(value))
+    return total % 10 == 0
+
+
+def isbn13_check_digit(first_12):
+    """Check digit for the first 12 digits of an ISBN-13."""
+    total = sum(int(ch) * (1 if i % 2 == 0 else 3) for i, ch in enumerate(first_12))
+    return str((10 - total % 10) % 10)
+
+
+def isbn10_check_digit(first_9):
+    """Check digit ('0'-'9' or 'X') for the first 9 digits of an ISBN-10."""
+    total = sum((10 - i) * int(ch) for i, ch in enumerate(first_9))
+    check = (11 - total % 11) % 11
+    return "X" if check == 10 else str(check)
+
+
+def isbn10_to_isbn13(isbn10):
+    """Convert a valid, normalized ISBN-10 to its ISBN-13 (978 prefix)."""
+    first_12 = "978" + isbn10[:9]
+    return first_12 + isbn13_check_digit(first_12)
+
+
+def isbn13_to_isbn10(isbn13):
+    """
+    Convert a valid, normalized ISBN-13 to ISBN-10.
+    Returns None for 979 prefixes, which have no ISBN-10 form.
+    """
+    if not isbn13.startswith("978"):
+        return None
+    first_9 = isbn13[3:12]
+    return first_9 + isbn10_check_digit(first_9)
+
+
+def canonicalize_isbn(value):
+    """
+    Validate an ISBN-10 or ISBN-13 (hyphens allowed) and return it as ISBN-13.
+    Returns (True, isbn13) or (False, error message); never raises. The ISBN-13
+    is always plain ASCII digits.
+    """
+    isbn = normalize_isbn(value)
+    if not isbn:
+        return False, "Please enter an ISBN."
+
+    if len(isbn) == 10:
+        if not ISBN10_PATTERN.fullmatch(isbn):
+            return False, f"An ISBN-10 is 9 digits (0-9) and a check digit or X: {value}"
+        if not is_valid_isbn10(isbn):
+            return False, f"Invalid ISBN-10 (check digit does not match): {value}"
+        return True, isbn10_to_isbn13(isbn)
+
+    if len(isbn) == 13:
+        if not ISBN13_PATTERN.fullmatch(isbn):
+            return False, f"An ISBN-13 is 13 digits (0-9): {value}"
+        if not is_valid_isbn13(isbn):
+            return False, f"Invalid ISBN-13 (check digit does not match): {value}"
+        return True, isbn
+
+    return False, f"An ISBN must have 10 or 13 digits: {value}"
+
+
+def resolve_book_isbns(isbn, isbn_13):
+    """
+    Used at intake, where the clerk may type an ISBN-10, an ISBN-13 or both.
+    Validates whatever was entered and checks both refer to the same book.
+    Returns (True, (isbn10_or_None, isbn13)) or (False, error message).
+    """
+    canonical = None
+
+    for label, value in (("ISBN", isbn), ("ISBN-13", isbn_13)):
+        if not normalize_isbn(value):
+            continue
+        success, result = canonicalize_isbn(value)
+        if not success:
+            return False, f"{label}: {result}"
+        if canonical and canonical != result:
+            return False, "ISBN and ISBN-13 are for different books."
+        canonical = result
+
+    if canonical is None:
+        return False, "Please enter an ISBN or ISBN-13."
+
+    return True, (isbn13_to_isbn10(canonical), canonical)
+
+
+# ---------- Migration backfill ----------
+
+def backfill_canonical_isbns(chunk_size=1000):
+    """
+    Fill Book.isbn_canonical for rows added before the column existed.
+    Run db/migrations/001_add_isbn_canonical.sql first.
+    Works through the table by book_id in small chunks so it doesn't hold
+    long locks. Returns (True, {"updated": n, "invalid": [book_ids]}).
+    """
+    from app.db_connect import create_connection
+    from app.lanes import BACKGROUND
+    from app.query_loader import load_queries
+
+    queries = load_queries("db/queries.sql")
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        sql_select = queries.get("select_books_missing_canonical_isbn")
+        sql_update = queries.get("set_book_canonical_isbn")
+        if not sql_select or not sql_update:
+            return False, "Backfill queries not found in db/queries.sql."
+
+        updated = 0
+        invalid = []
+        last_id = 0
+
+        while True:
+            cursor.execute(sql_select, (last_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            changes = []
+            for book_id, isbn, isbn_13 in rows:
+                last_id = book_id
+                success, result = resolve_book_isbns(isbn, isbn_13)
+                if success:
+                    changes.append((result[1], book_id))
+                else:
+                    invalid.append(book_id)
+
+            if changes:
+                cursor.executemany(sql_update, changes)
+                conn.commit()
+                updated += len(changes)
+
+        return True, {"updated": updated, "invalid": invalid}
+
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "backfill":
+        success, result = backfill_canonical_isbns()
+        if not success:
+            print(f"Backfill failed: {result}")
+            sys.exit(1)
+        print(f"Updated {result['updated']} books.")
+        if result["invalid"]:
+            print(f"Books with no valid ISBN (fix by hand): {result['invalid']}")
+    elif len(sys.argv) == 2:
+        print(canonicalize_isbn(sys.argv[1]))
+    else:
+        print("Usage: python -m app.isbn backfill")
+        print("       python -m app.isbn <isbn>")
+        sys.exit(1)
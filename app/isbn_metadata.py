@@ -0,0 +1,443 @@
+# app/isbn_metadata.py
+# Offline ISBN metadata index, so "Buy Book" can fill in title, author, language,
+# pages and rating as soon as a trade-in is scanned.
+#
+# The importer streams a bibliographic dump (e.g. Open Library's editions dump,
+# one JSON record per line, plain or .gz) into a compact file keyed by canonical
+# ISBN-13, laid out like the catalog snapshot (app/catalog_snapshot.py):
+#
+#   header  : magic, version, key width, record count, created-at, blob offset
+#   records : fixed-width rows sorted by key (see _record_struct)
+#   blob    : UTF-8 "title \x1f author \x1f language" per book
+#
+# Lookups memory-map the file and binary search the records: no DB, no parsing.
+#
+# Tens of millions of records don't fit in memory, so the import is an external
+# sort: records are collected in runs of RUN_RECORDS, each run is sorted and
+# written to a temp file, and the runs are merged into the final file. Text goes
+# straight to a temp blob file as it's read. Memory stays at about one run.
+#
+# Open Library editions only name their authors by key ("/authors/OL23919A");
+# pass the authors dump too and the names are resolved through a temporary index
+# built the same way.
+#
+#   python -m app.isbn_metadata import ol_dump_editions.txt.gz [--authors ol_dump_authors.txt.gz]
+#   python -m app.isbn_metadata lookup 9780441013593
+
+import argparse
+import gzip
+import heapq
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from app.isbn import canonicalize_isbn, isbn13_to_isbn10
+
+INDEX_PATH = "db/isbn_metadata.bin"
+
+MAGIC = b"BKMETA01"
+VERSION = 1
+KEY_WIDTH = 13           # canonical ISBN-13
+AUTHOR_KEY_WIDTH = 16    # Open Library author key, e.g. OL23919A, zero padded
+RUN_RECORDS = 500_000    # records sorted in memory at a time (about 35 MB)
+
+# magic, version, key width, record_count, created_at, blob_offset
+HEADER = struct.Struct("<8sHBQdQ")
+
+# Fitted to the Book columns they fill (book_Name, author_Name, `language`)
+MAX_TITLE, MAX_AUTHOR, MAX_LANGUAGE = 100, 20, 30
+FIELD_SEP = "\x1f"
+NO_RATING = 0xFFFF       # ratings are stored in hundredths (0-500)
+
+# Open Library / MARC language codes -> what we store in Book.language
+LANGUAGE_NAMES = {
+    "eng": "English", "spa": "Spanish", "fre": "French", "ger": "German", "ita": "Italian",
+    "por": "Portuguese", "dut": "Dutch", "rus": "Russian", "jpn": "Japanese", "chi": "Chinese",
+    "kor": "Korean", "ara": "Arabic", "lat": "Latin", "swe": "Swedish", "dan": "Danish",
+    "nor": "Norwegian", "fin": "Finnish", "pol": "Polish", "gre": "Greek", "heb": "Hebrew",
+    "hin": "Hindi", "tur": "Turkish", "cze": "Czech", "hun": "Hungarian",
+}
+
+
+def _record_struct(key_width):
+    # key, text offset in the blob, text length, pages (0 = unknown), rating (NO_RATING = unknown)
+    return struct.Struct(f"<{key_width}sQHHH")
+
+
+# ---------- Reading the dump ----------
+
+def _open_dump(path):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def _parse_line(line):
+    """The JSON record on one dump line, or None."""
+    line = line.strip()
+    if not line:
+        return None
+    if not line.startswith("{"):
+        # Open Library's own dumps: type, key, revision, last_modified, JSON (tab separated)
+        line = line.rsplit("\t", 1)[-1]
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _first(values):
+    if isinstance(values, list):
+        return values[0] if values else None
+    return values
+
+
+def _author_key(ref):
+    """'/authors/OL23919A' (or {"key": ...}) -> padded index key, or None."""
+    if isinstance(ref, dict):
+        ref = ref.get("key") or (ref.get("author") or {}).get("key")
+    if not isinstance(ref, str):
+        return None
+    key = ref.rsplit("/", 1)[-1].encode("ascii", "ignore")
+    if not key or len(key) > AUTHOR_KEY_WIDTH:
+        return None
+    return key.ljust(AUTHOR_KEY_WIDTH, b"\0")
+
+
+def _author_name(record, authors):
+    for ref in record.get("authors") or []:
+        if isinstance(ref, dict) and ref.get("name"):
+            return ref["name"]
+        if isinstance(ref, str) and not ref.startswith("/"):
+            return ref
+        key = _author_key(ref)
+        if key and authors is not None:
+            found = authors.get(key)
+            if found:
+                return found["text"]
+    return _first(record.get("author_name")) or record.get("by_statement") or ""
+
+
+def _language(record):
+    code = _first(record.get("languages")) or _first(record.get("language"))
+    if isinstance(code, dict):
+        code = code.get("key")
+    if not isinstance(code, str):
+        return ""
+    code = code.rsplit("/", 1)[-1]
+    return LANGUAGE_NAMES.get(code, code)
+
+
+def _pages(record):
+    pages = record.get("number_of_pages") or record.get("number_of_pages_median")
+    try:
+        return max(0, min(int(pages), 0xFFFF))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _rating(record):
+    rating = record.get("ratings_average", record.get("average_rating"))
+    try:
+        rating = float(rating)
+    except (TypeError, ValueError):
+        return NO_RATING
+    return int(round(rating * 100)) if 0 <= rating <= 5 else NO_RATING
+
+
+def _isbn_keys(record):
+    """Every distinct canonical ISBN-13 in a record, as index keys."""
+    keys = set()
+    for field in ("isbn_13", "isbn_10", "isbn"):
+        values = record.get(field) or []
+        for value in values if isinstance(values, list) else [values]:
+            success, canonical = canonicalize_isbn(value)
+            if success:
+                keys.add(canonical.encode("ascii"))
+    return keys
+
+
+def _edition_entries(dump_path, authors, counts):
+    """(key, text, pages, rating) for every ISBN of every usable record in the dump."""
+    with _open_dump(dump_path) as f:
+        for line in f:
+            counts["lines"] += 1
+            if counts["lines"] % 1_000_000 == 0:
+                print(f"  {counts['lines']:,} lines, {counts['isbns']:,} ISBNs", file=sys.stderr)
+
+            record = _parse_line(line)
+            keys = _isbn_keys(record) if record else None
+            if not keys or not record.get("title"):
+                counts["skipped"] += 1
+                continue
+
+            text = FIELD_SEP.join([
+                " ".join(str(record["title"]).split())[:MAX_TITLE],
+                " ".join(str(_author_name(record, authors)).split())[:MAX_AUTHOR],
+                _language(record)[:MAX_LANGUAGE],
+            ])
+            pages, rating = _pages(record), _rating(record)
+            for key in keys:
+                counts["isbns"] += 1
+                yield key, text, pages, rating
+
+
+def _author_entries(authors_path):
+    with _open_dump(authors_path) as f:
+        for line in f:
+            record = _parse_line(line)
+            if not record or not record.get("name"):
+                continue
+            key = _author_key(record.get("key"))
+            if key:
+                yield key, " ".join(str(record["name"]).split())[:MAX_AUTHOR], 0, NO_RATING
+
+
+# ---------- Writing an index (external sort) ----------
+
+def _read_run(path, record_size):
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(record_size * 4096)
+            if not data:
+                return
+            for start in range(0, len(data), record_size):
+                yield data[start:start + record_size]
+
+
+def write_index(entries, path, key_width, tmp_dir, run_records=RUN_RECORDS):
+    """
+    Write (key, text, pages, rating) entries to an index file, in bounded memory.
+    The first entry for a key wins. The file is swapped in atomically.
+    Returns the number of records written.
+    """
+    record = _record_struct(key_width)
+    run_paths = []
+    run = []
+
+    def by_key(packed):
+        return packed[:key_width]
+
+    # Both sorts compare the key only, never the rest of the record: sort() is stable
+    # and merge() takes equal keys from earlier runs first, so equal keys stay in
+    # input order and the first entry for a key is the one kept
+    def flush_run():
+        run.sort(key=by_key)
+        run_path = os.path.join(tmp_dir, f"run-{key_width}-{len(run_paths)}.bin")
+        with open(run_path, "wb") as f:
+            f.write(b"".join(run))
+        run_paths.append(run_path)
+        run.clear()
+
+    blob_path = os.path.join(tmp_dir, f"blob-{key_width}.bin")
+    with open(blob_path, "w+b") as blob:
+        blob_size = 0
+        last_text, last_ref = None, None  # all ISBNs of one record share its text
+        for key, text, pages, rating in entries:
+            if text != last_text:
+                data = text.encode("utf-8")[:0xFFFF]
+                last_text, last_ref = text, (blob_size, len(data))
+                blob.write(data)
+                blob_size += len(data)
+            run.append(record.pack(key, *last_ref, pages, rating))
+            if len(run) >= run_records:
+                flush_run()
+        if run:
+            flush_run()
+
+        tmp_path = path + ".tmp"
+        count = 0
+        with open(tmp_path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, VERSION, key_width, 0, 0.0, 0))  # filled in below
+            last_key = None
+            for packed in heapq.merge(*(_read_run(run_path, record.size) for run_path in run_paths), key=by_key):
+                if packed[:key_width] == last_key:
+                    continue
+                last_key = packed[:key_width]
+                out.write(packed)
+                count += 1
+
+            blob_offset = out.tell()
+            blob.seek(0)
+            shutil.copyfileobj(blob, out, 1 << 20)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, VERSION, key_width, count, time.time(), blob_offset))
+        os.replace(tmp_path, path)
+
+    for run_path in run_paths:
+        os.remove(run_path)
+    return count
+
+
+def import_dump(dump_path, path=INDEX_PATH, authors_path=None, run_records=RUN_RECORDS):
+    """
+    Build the ISBN index from a dump file (and optionally an authors dump).
+    Returns (True, {"lines", "skipped", "isbns", "records", "seconds", "path"}) or (False, error).
+    """
+    started = time.perf_counter()
+    counts = {"lines": 0, "skipped": 0, "isbns": 0}
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Temp files next to the index: /tmp is often too small for a full dump
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(path) or ".") as tmp_dir:
+            authors = None
+            if authors_path:
+                author_index = os.path.join(tmp_dir, "authors.bin")
+                write_index(_author_entries(authors_path), author_index, AUTHOR_KEY_WIDTH, tmp_dir, run_records)
+                authors = MetadataIndex(author_index)
+            try:
+                records = write_index(_edition_entries(dump_path, authors, counts), path, KEY_WIDTH,
+                                      tmp_dir, run_records)
+            finally:
+                if authors:
+                    authors.close()
+    except (OSError, ValueError) as e:
+        return False, str(e)
+
+    return True, {**counts, "records": records, "seconds": time.perf_counter() - started, "path": path}
+
+
+# ---------- Reader ----------
+
+class MetadataIndex:
+    """Read-only, memory-mapped view of an index file."""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Index file is empty: {path}")
+
+        magic, version, key_width, count, created_at, blob_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not an ISBN metadata index (or wrong version): {path}")
+
+        self.key_width = key_width
+        self.record_count = count
+        self.created_at = created_at
+        self._record = _record_struct(key_width)
+        self._blob_offset = blob_offset
+        self.mtime = os.fstat(self._file.fileno()).st_mtime
+
+    def _key_at(self, index):
+        start = HEADER.size + index * self._record.size
+        return self._mm[start:start + self.key_width]
+
+    def get(self, key):
+        """Binary search for a key (bytes). Returns {"text", "pages", "rating"} or None."""
+        lo, hi = 0, self.record_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo >= self.record_count or self._key_at(lo) != key:
+            return None
+
+        _, offset, length, pages, rating = self._record.unpack_from(self._mm, HEADER.size + lo * self._record.size)
+        start = self._blob_offset + offset
+        return {"text": self._mm[start:start + length].decode("utf-8"), "pages": pages, "rating": rating}
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+_open_index = None
+
+
+def get_index(path=INDEX_PATH):
+    """
+    Shared reader for the index file, reopened if a new import replaced it.
+    Returns None if there is no index.
+    """
+    global _open_index
+
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    if _open_index is not None:
+        if _open_index.path == path and _open_index.mtime == mtime:
+            return _open_index
+        _open_index.close()
+        _open_index = None
+
+    try:
+        _open_index = MetadataIndex(path)
+    except (OSError, ValueError):
+        return None
+    return _open_index
+
+
+def lookup_isbn_metadata(isbn, path=INDEX_PATH):
+    """
+    Book details for an ISBN (10 or 13, hyphens allowed) from the offline index.
+    Returns (True, {"isbn", "isbn_13", "book_name", "author_name", "language",
+    "num_pages", "average_ratings"}) with None for anything the dump didn't have,
+    or (False, message).
+    """
+    success, canonical = canonicalize_isbn(isbn)
+    if not success:
+        return False, canonical
+
+    index = get_index(path)
+    if index is None:
+        return False, "No ISBN index available."
+
+    found = index.get(canonical.encode("ascii"))
+    if found is None:
+        return False, f"ISBN {canonical} is not in the ISBN index."
+
+    book_name, author_name, language = found["text"].split(FIELD_SEP)
+    return True, {
+        "isbn": isbn13_to_isbn10(canonical),
+        "isbn_13": canonical,
+        "book_name": book_name,
+        "author_name": author_name or None,
+        "language": language or None,
+        "num_pages": found["pages"] or None,
+        "average_ratings": found["rating"] / 100 if found["rating"] != NO_RATING else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline ISBN metadata index for book intake.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="build the index from a dump file (.gz is fine, - = stdin)")
+    p_import.add_argument("dump")
+    p_import.add_argument("--authors", help="Open Library authors dump, to resolve author keys to names")
+    p_import.add_argument("--run-records", type=int, default=RUN_RECORDS,
+                          help="records sorted in memory at a time (default %(default)s)")
+    p_lookup = sub.add_parser("lookup", help="look up one ISBN")
+    p_lookup.add_argument("isbn")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        success, result = import_dump(args.dump, authors_path=args.authors, run_records=args.run_records)
+        if not success:
+            print(f"Import failed: {result}")
+            sys.exit(1)
+        print(f"{result['records']:,} ISBNs indexed from {result['lines']:,} lines "
+              f"({result['skipped']:,} skipped) in {result['seconds']:.0f}s -> {result['path']}")
+    else:
+        started = time.perf_counter()
+        success, result = lookup_isbn_metadata(args.isbn)
+        print(result)
+        print(f"({(time.perf_counter() - started) * 1000:.2f} ms)")
+        sys.exit(0 if success else 1)
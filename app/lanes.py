@@ -0,0 +1,211 @@
+# app/lanes.py
+# Priority lanes for database connections: interactive vs background.
+#
+# Every connection from db_connect is taken from a lane:
+#   interactive - checkout, ISBN and credit lookups, anything a clerk waits for
+#   background  - reports, exports, stocktake, repricing, reconciliation, preloads
+# Each lane has its own number of slots (connections open at once), so a burst of
+# background work can use up its own slots but never the interactive ones.
+# The background lane also has admission control: when all its slots are busy,
+# callers queue, but only up to max_queue of them and for at most wait_seconds;
+# beyond that the work is refused straight away ("busy, try again later") instead
+# of piling up threads. Interactive callers queue too, but are never refused early.
+#
+# Slots are counted per process: they keep one till's (or one job's) background
+# work off its own interactive connections, but can't see other processes. Jobs
+# run with python -m and the other tills are separate processes, so to limit
+# background connections across all of them, give the lane its own MySQL account
+# created WITH MAX_USER_CONNECTIONS (README, "Interactive and Background Work").
+# MySQL then refuses connections past that limit, whichever process asks. A
+# resource group (optional) also gives background sessions lower CPU priority,
+# but reserves no connections or threads.
+#
+# Settings (optional, in db_settings["lanes"]), e.g.:
+#   "lanes": {"background": {"slots": 2, "max_queue": 8, "wait_seconds": 30,
+#                            "account": {"user": "bookstore_bg", "password": "..."},
+#                            "resource_group": "bookstore_background"}}
+#
+# Wait times per lane are kept (lane_stats()), and any interactive wait longer than
+# STARVED_WAIT_MS is logged to logs/lanes.log with both lanes' state.
+
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+DEFAULT_LANES = {
+    INTERACTIVE: {"slots": 10, "max_queue": None, "wait_seconds": 10},
+    BACKGROUND: {"slots": 2, "max_queue": 8, "wait_seconds": 30},
+}
+
+# Query class (app/query_loader.py) -> lane
+CLASS_LANES = {"interactive": INTERACTIVE, "report": BACKGROUND, "batch": BACKGROUND}
+
+LANE_LOG_PATH = "logs/lanes.log"
+STARVED_WAIT_MS = 100
+RECENT_WAITS = 1000   # waits kept per lane for the percentiles
+
+_logger = None
+
+
+class LaneBusy(Exception):
+    """No slot free in time, or too much work already queued for the lane."""
+
+
+class Lane:
+    """A fixed number of slots with a bounded, timed queue in front of them."""
+
+    def __init__(self, name, slots, max_queue=None, wait_seconds=None, resource_group=None, account=None):
+        self.name = name
+        self.slots = slots
+        self.max_queue = max_queue
+        self.wait_seconds = wait_seconds
+        self.resource_group = resource_group
+        self.account = account   # connect arguments (user, password) for this lane's connections
+
+        self._cond = threading.Condition()
+        self.in_use = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.acquired = 0
+        self.waited = 0       # acquisitions that had to queue
+        self.rejected = 0     # refused because the queue was full
+        self.timed_out = 0    # gave up after wait_seconds
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent = deque(maxlen=RECENT_WAITS)
+
+    def acquire(self):
+        """Take a slot, queueing if needed. Returns seconds waited; raises LaneBusy."""
+        started = time.perf_counter()
+        with self._cond:
+            if self.in_use >= self.slots:
+                if self.max_queue is not None and self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise LaneBusy(f"The database is busy with other {self.name} work "
+                                   f"({self.queued} jobs waiting). Please try again later.")
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+                try:
+                    free = self._cond.wait_for(lambda: self.in_use < self.slots, timeout=self.wait_seconds)
+                finally:
+                    self.queued -= 1
+                if not free:
+                    self.timed_out += 1
+                    raise LaneBusy(f"No database connection free for {self.name} work "
+                                   f"after {self.wait_seconds} seconds. Please try again.")
+                self.waited += 1
+
+            self.in_use += 1
+            self.acquired += 1
+            wait = time.perf_counter() - started
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._recent.append(wait)
+        return wait
+
+    def release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify()
+
+    def set_slots(self, slots):
+        with self._cond:
+            self.slots = slots
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            recent = sorted(self._recent)
+            p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+            return {
+                "slots": self.slots,
+                "in_use": self.in_use,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": self._wait_total / self.acquired * 1000 if self.acquired else 0.0,
+                "p95_wait_ms": p95 * 1000,
+                "max_wait_ms": self._wait_max * 1000,
+            }
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(LANE_LOG_PATH), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(LANE_LOG_PATH, maxBytes=5_000_000, backupCount=5)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        _logger = logging.getLogger("bookstore.lanes")
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    return _logger
+
+
+_lanes = {}
+
+
+def configure_lanes(settings=None):
+    """(Re)create the lanes from DEFAULT_LANES overridden by settings {lane: {key: value}}."""
+    settings = settings or {}
+    for name, defaults in DEFAULT_LANES.items():
+        _lanes[name] = Lane(name, **{**defaults, **settings.get(name, {})})
+
+
+def get_lane(name):
+    return _lanes[name]
+
+
+def lane_for_class(query_class):
+    return CLASS_LANES.get(query_class, INTERACTIVE)
+
+
+def acquire(name):
+    """Take a slot in a lane. Returns the Lane; raises LaneBusy."""
+    lane = _lanes[name]
+    wait = lane.acquire()
+    if name == INTERACTIVE and wait * 1000 > STARVED_WAIT_MS:
+        _get_logger().warning("interactive lane waited %.0f ms: %s", wait * 1000,
+                              {lane_name: l.stats() for lane_name, l in _lanes.items()})
+    return lane
+
+
+def lane_workers(name, requested=None):
+    """
+    Worker threads for a job whose connections all come from one lane: `requested`,
+    or the lane's slot count if None. More workers than slots would only queue, so
+    the count is capped, with a note saying how to allow more.
+    """
+    slots = _lanes[name].slots
+    if requested is None:
+        return slots
+    if requested > slots:
+        print(f"Only {slots} of {requested} workers can run at once: the {name} lane has {slots} slots "
+              f'(raise "lanes": {{"{name}": {{"slots": ...}}}} in db_settings for more).', file=sys.stderr)
+        return slots
+    return requested
+
+
+def lane_stats():
+    """{lane name: stats dict} for every lane."""
+    return {name: lane.stats() for name, lane in _lanes.items()}
+
+
+def format_lane_stats(stats=None):
+    stats = stats or lane_stats()
+    lines = [f"  {'lane':<12}{'slots':>6}{'conns':>8}{'waited':>8}{'refused':>9}{'timeout':>9}"
+             f"{'avg ms':>9}{'p95 ms':>9}{'max ms':>9}"]
+    for name, s in stats.items():
+        lines.append(f"  {name:<12}{s['slots']:>6}{s['acquired']:>8}{s['waited']:>8}{s['rejected']:>9}"
+                     f"{s['timed_out']:>9}{s['avg_wait_ms']:>9.1f}{s['p95_wait_ms']:>9.1f}{s['max_wait_ms']:>9.1f}")
+    return "\n".join(lines)
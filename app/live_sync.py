@@ -0,0 +1,215 @@
+# app/live_sync.py
+# Live change notifications between tills over UDP multicast on the store LAN.
+#
+# Every event published by the logic layer (see app/events.py) is also sent as a
+# small JSON datagram to a multicast group. Every dashboard listens on that group,
+# so when till 1 sells a book, till 2's open views can refresh just that book
+# instead of showing "Available" until someone searches again.
+#
+# UDP can drop packets, so views treat these messages as hints to refresh from the
+# database, never as the data itself.
+#
+# Settings can be changed with environment variables:
+#   BOOKSTORE_SYNC_GROUP      multicast group (default 239.255.42.99)
+#   BOOKSTORE_SYNC_PORT       UDP port (default 50042)
+#   BOOKSTORE_SYNC_INTERFACE  local interface IP to use (default: all / OS choice)
+#   BOOKSTORE_LIVE_SYNC=0     turn live sync off
+#
+# Loopback test harness, several simulated tills on one machine:
+#   python -m app.live_sync selftest --clients 5 --events 200
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+
+from app.events import subscribe, unsubscribe, event_to_dict, event_from_dict
+
+GROUP = os.environ.get("BOOKSTORE_SYNC_GROUP", "239.255.42.99")
+PORT = int(os.environ.get("BOOKSTORE_SYNC_PORT", "50042"))
+INTERFACE = os.environ.get("BOOKSTORE_SYNC_INTERFACE", "0.0.0.0")
+ENABLED = os.environ.get("BOOKSTORE_LIVE_SYNC", "1") != "0"
+
+MAX_DATAGRAM = 8192
+
+
+class Broadcaster:
+    """Sends events to the multicast group."""
+
+    def __init__(self, group=GROUP, port=PORT, interface=INTERFACE, origin=None):
+        self.address = (group, port)
+        self.origin = origin or uuid.uuid4().hex
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        # TTL 1: stay on the store LAN. Loop: other dashboards on this machine hear it too.
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if interface != "0.0.0.0":
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+    def send(self, event):
+        message = {"origin": self.origin, "event": event_to_dict(event)}
+        try:
+            self.sock.sendto(json.dumps(message, separators=(",", ":")).encode("utf-8"), self.address)
+        except OSError:
+            pass  # network hiccup: other tills will just refresh on their next search
+
+    def close(self):
+        self.sock.close()
+
+
+class Listener:
+    """Receives events from the multicast group on a background thread."""
+
+    def __init__(self, callback, group=GROUP, port=PORT, interface=INTERFACE, ignore_origin=None):
+        self.callback = callback
+        self.ignore_origin = ignore_origin
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind(("", port))
+        membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface))
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.sock.settimeout(0.5)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="live-sync-listener", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                data, _ = self.sock.recvfrom(MAX_DATAGRAM)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                message = json.loads(data)
+                if message.get("origin") == self.ignore_origin:
+                    continue
+                event = event_from_dict(message["event"])
+            except (ValueError, KeyError, TypeError):
+                continue  # not one of ours
+            if event is not None:
+                self.callback(event, message["event"].get("ts"))
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(timeout=2)
+        self.sock.close()
+
+
+class LiveSync:
+    """
+    Connects the local event bus to the LAN: local events are broadcast, and
+    events from other tills are passed to on_remote_event(event).
+    """
+
+    def __init__(self, on_remote_event, group=GROUP, port=PORT, interface=INTERFACE):
+        self.broadcaster = Broadcaster(group, port, interface)
+        self.listener = Listener(lambda event, ts: on_remote_event(event), group, port, interface,
+                                 ignore_origin=self.broadcaster.origin)
+        subscribe(None, self.broadcaster.send)
+        self.listener.start()
+
+    def stop(self):
+        unsubscribe(None, self.broadcaster.send)
+        self.listener.stop()
+        self.broadcaster.close()
+
+
+def start_live_sync(on_remote_event):
+    """Start live sync if enabled. Returns a LiveSync (call .stop()) or None."""
+    if not ENABLED:
+        return None
+    try:
+        return LiveSync(on_remote_event)
+    except OSError as e:
+        # No network / multicast not allowed: the app still works, just without live refresh
+        print(f"Live sync disabled: {e}", file=sys.stderr)
+        return None
+
+
+# ---------- Loopback test harness ----------
+
+def _client(client_id, port, to_parent, stay_up):
+    received = []
+
+    def on_event(event, sent_ts):
+        received.append((type(event).__name__, time.time() - (sent_ts or time.time())))
+
+    listener = Listener(on_event, GROUP, port, "127.0.0.1").start()
+    to_parent.put(client_id)
+    # Stay up until the parent is done sending, then report what we saw
+    time.sleep(stay_up.get())
+    listener.stop()
+    to_parent.put((client_id, received))
+
+
+def selftest(clients=3, events=100, port=PORT + 1, settle_seconds=1.0):
+    """
+    Start `clients` listener processes on 127.0.0.1, broadcast `events` events,
+    and check every client received all of them.
+    Returns (True, report) or (False, report).
+    """
+    from decimal import Decimal
+    from app.events import BookSold, CreditChanged
+
+    ctx = multiprocessing.get_context("spawn")
+    to_parent = ctx.Queue()
+    stay_up = ctx.Queue()
+    procs = [ctx.Process(target=_client, args=(i, port, to_parent, stay_up)) for i in range(clients)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        to_parent.get(timeout=30)  # wait until every client has joined the group
+
+    broadcaster = Broadcaster(GROUP, port, "127.0.0.1")
+    started = time.perf_counter()
+    for i in range(events):
+        if i % 2:
+            broadcaster.send(BookSold(i, 1000 + i, Decimal("9.99")))
+        else:
+            broadcaster.send(CreditChanged(i, Decimal("-1.00"), Decimal("10.00"), "selftest"))
+    send_seconds = time.perf_counter() - started
+    broadcaster.close()
+
+    for _ in procs:
+        stay_up.put(settle_seconds)
+    reports = dict(to_parent.get(timeout=30) for _ in procs)
+    for p in procs:
+        p.join()
+
+    lines = [f"Sent {events} events in {send_seconds * 1000:.1f} ms to {clients} clients"]
+    ok = True
+    for client_id in sorted(reports):
+        received = reports[client_id]
+        latencies = sorted(lat for _, lat in received) or [0.0]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        lines.append(f"  client {client_id}: {len(received)}/{events} received, "
+                     f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms")
+        if len(received) != events:
+            ok = False
+    return ok, "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live sync tools.")
+    parser.add_argument("command", choices=["selftest"])
+    parser.add_argument("--clients", type=int, default=3)
+    parser.add_argument("--events", type=int, default=100)
+    args = parser.parse_args()
+
+    success, report = selftest(args.clients, args.events)
+    print(report)
+    print("PASS" if success else "FAIL (some datagrams were lost)")
+    sys.exit(0 if success else 1)
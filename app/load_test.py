@@ -0,0 +1,382 @@
+# app/load_test.py
+# Multi-register load test: how many tills can one MySQL server handle?
+#
+# Each simulated register loops over a realistic mix of the real logic functions
+# (look up a customer, scan a book, buy a book in, ring up an order) against a
+# LOCAL test database. The seed data is deliberately contention-heavy: a handful of
+# "regular" customers get most of the credit changes and every register sells from
+# the same shelf, so registers really do fight over rows.
+#
+# Never point this at the live store database - it writes thousands of rows.
+#
+#   python -m app.load_test seed --books 20000 --customers 50
+#   python -m app.load_test run --registers 8 --seconds 30
+#   python -m app.load_test sweep --registers 1,2,4,8,16,32 --seconds 20 [--processes]
+
+import argparse
+import multiprocessing
+import random
+import re
+import sys
+import threading
+import time
+
+from app.db_connect import create_connection, db_settings
+from app.lanes import BACKGROUND, INTERACTIVE, configure_lanes, get_lane, lane_stats, format_lane_stats
+from app.isbn import isbn13_check_digit
+from app.book_logic import add_book_and_credit_customer
+from app.order_logic import fetch_customer_by_id, search_book_by_isbn_for_order, complete_order
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+# Operation mix: (name, weight)
+OPERATION_MIX = [
+    ("fetch_customer_by_id", 40),
+    ("search_book_by_isbn_for_order", 30),
+    ("add_book_and_credit_customer", 15),
+    ("complete_order", 15),
+]
+
+# Share of customers that are "regulars" and get most of the traffic (hot rows)
+HOT_CUSTOMER_SHARE = 0.1
+HOT_TRAFFIC_SHARE = 0.8
+
+DEADLOCK_ERRORS = re.compile(r"\b(1213|1205)\b|Deadlock|Lock wait timeout")
+CONFLICT_ERRORS = re.compile(r"\b1062\b|Duplicate entry|is not available|already sold|no longer has")
+
+
+def seed_isbn(n):
+    """Deterministic, checksum-valid ISBN-13 for seeded book number n."""
+    first_12 = f"97899{n:07d}"
+    return first_12 + isbn13_check_digit(first_12)
+
+
+def _check_local():
+    host = db_settings.get("host", "localhost")
+    if host not in LOCAL_HOSTS:
+        return False, f"Refusing to load test a non-local database ({host})."
+    return True, None
+
+
+# ---------- Seeding ----------
+
+def seed(books=20000, customers=50, employees=10, batch_size=1000):
+    """Insert test employees, customers (with credit) and available books."""
+    ok, error = _check_local()
+    if not ok:
+        return False, error
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+
+        cursor.executemany(
+            "INSERT INTO Employee (first_name, last_name, phone_number, access_level) VALUES (%s, %s, %s, %s);",
+            [("Load", f"Till{i}", "0000000000", "1") for i in range(employees)])
+        cursor.execute("SELECT MAX(employee_id) FROM Employee;")
+        (last_employee,) = cursor.fetchone()
+
+        cursor.executemany(
+            "INSERT INTO Customer (first_name, last_name, email, credit_total) VALUES (%s, %s, %s, %s);",
+            [("Load", f"Cust{i}", f"loadtest{i}.{int(time.time())}@example.com", 500)
+             for i in range(customers)])
+        cursor.execute("SELECT MAX(customer_id) FROM Customer;")
+        (last_customer,) = cursor.fetchone()
+        # Opening balances, so the credit ledger reconciles for seeded customers too
+        cursor.execute("INSERT INTO Credit_Ledger (customer_id, amount, reason) "
+                       "SELECT customer_id, credit_total, 'opening_balance' FROM Customer "
+                       "WHERE customer_id > %s;", (last_customer - customers,))
+        conn.commit()
+
+        cursor.execute("SELECT COUNT(DISTINCT isbn_canonical) FROM Book WHERE isbn_canonical LIKE '97899%';")
+        (existing,) = cursor.fetchone()
+
+        sql_book = ("INSERT INTO Book (book_Name, author_Name, book_Condition, average_Ratings, "
+                    "isbn_13, isbn_canonical, `language`, num_pages, purchase_price, resale_price) "
+                    "VALUES (%s, 'Load Test', 'Good', 4.00, %s, %s, 'English', 300, 2.00, %s);")
+        for start in range(existing, existing + books, batch_size):
+            rows = []
+            for n in range(start, min(start + batch_size, existing + books)):
+                isbn = seed_isbn(n)
+                rows.append((f"Load Test Book {n}", isbn, isbn, round(random.uniform(3, 20), 2)))
+            cursor.executemany(sql_book, rows)
+            conn.commit()
+
+        return True, {
+            "employee_ids": list(range(last_employee - employees + 1, last_employee + 1)),
+            "customer_ids": list(range(last_customer - customers + 1, last_customer + 1)),
+            "books": existing + books,
+        }
+
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def _load_seed_info():
+    """Find the seeded ids again, so 'run' can be used without re-seeding."""
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT employee_id FROM Employee WHERE first_name = 'Load' AND last_name LIKE 'Till%';")
+        employee_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT customer_id FROM Customer WHERE email LIKE 'loadtest%@example.com';")
+        customer_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT COUNT(DISTINCT isbn_canonical) FROM Book WHERE isbn_canonical LIKE '97899%';")
+        (books,) = cursor.fetchone()
+        if not employee_ids or not customer_ids or not books:
+            return False, "No seed data found - run 'python -m app.load_test seed' first."
+        return True, {"employee_ids": employee_ids, "customer_ids": customer_ids, "books": books}
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+# ---------- One register ----------
+
+def _pick_customer(rng, customer_ids):
+    hot_count = max(1, int(len(customer_ids) * HOT_CUSTOMER_SHARE))
+    if rng.random() < HOT_TRAFFIC_SHARE:
+        return rng.choice(customer_ids[:hot_count])
+    return rng.choice(customer_ids)
+
+
+def _classify(success, result):
+    if success:
+        return "ok"
+    if DEADLOCK_ERRORS.search(result):
+        return "deadlock"
+    if CONFLICT_ERRORS.search(result):
+        return "conflict"
+    return "error"
+
+
+def run_register(register_id, seed_info, seconds, stop_at=None, start_at=None):
+    """
+    Run one register for `seconds`, or from start_at until stop_at (time.time() values,
+    so several registers share one measured window). Returns {op: {"latencies": [...],
+    "ok": n, "conflict": n, "deadlock": n, "error": n}}.
+    """
+    rng = random.Random(register_id)
+    ops = [name for name, _ in OPERATION_MIX]
+    weights = [weight for _, weight in OPERATION_MIX]
+    stats = {op: {"latencies": [], "ok": 0, "conflict": 0, "deadlock": 0, "error": 0} for op in ops}
+    employee_id = seed_info["employee_ids"][register_id % len(seed_info["employee_ids"])]
+    if start_at is not None:
+        time.sleep(max(0.0, start_at - time.time()))
+    end = stop_at or (time.time() + seconds)
+
+    while time.time() < end:
+        op = rng.choices(ops, weights)[0]
+        customer_id = _pick_customer(rng, seed_info["customer_ids"])
+        isbn = seed_isbn(rng.randrange(seed_info["books"]))
+
+        started = time.perf_counter()
+        if op == "fetch_customer_by_id":
+            success, result = fetch_customer_by_id(customer_id)
+        elif op == "search_book_by_isbn_for_order":
+            success, result = search_book_by_isbn_for_order(isbn)
+            if not success and ("No book found" in result or "is not available" in result):
+                success = True  # a miss or a sold copy is a normal answer, not a failure
+        elif op == "add_book_and_credit_customer":
+            success, result = add_book_and_credit_customer(
+                "Load Test Trade-in", "Load Test", "Good", 4.0, "", isbn, "English", 250,
+                1.50, 6.00, customer_id)
+        else:
+            # The real checkout flow: load customer, scan 1-3 books, pay partly with credit
+            items = []
+            success, customer = fetch_customer_by_id(customer_id)
+            if success:
+                for _ in range(rng.randint(1, 3)):
+                    found, book = search_book_by_isbn_for_order(seed_isbn(rng.randrange(seed_info["books"])))
+                    if found and all(item["book_id"] != book["book_id"] for item in items):
+                        items.append({"book_id": book["book_id"], "price": book["resale_price"]})
+            if success and items:
+                credit_used = min(customer["credit_total"], rng.choice([0, 0, 5]))
+                success, result = complete_order(customer_id, employee_id, items, credit_used,
+                                                 customer["credit_total"])
+            elif success:
+                result = "is not available"  # every scanned book was already sold
+                success = False
+            else:
+                result = customer
+        elapsed = time.perf_counter() - started
+
+        outcome = _classify(success, result)
+        stats[op][outcome] += 1
+        stats[op]["latencies"].append(elapsed)
+
+    return stats
+
+
+def _register_process(register_id, seed_info, start_at, stop_at, results):
+    results.put(run_register(register_id, seed_info, 0, stop_at, start_at))
+
+
+# ---------- Running and reporting ----------
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_load(registers, seconds, seed_info, use_processes=False):
+    """Run N registers at once and merge their stats."""
+    # Every register waits for start_at, so none starts before the clock runs
+    # (spawned processes need longer to get going than threads)
+    start_at = time.time() + (3 if use_processes else 1)
+    stop_at = start_at + seconds
+    all_stats = []
+
+    if use_processes:
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_register_process, args=(i, seed_info, start_at, stop_at, results))
+                 for i in range(registers)]
+        for p in procs:
+            p.start()
+        all_stats = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    else:
+        # In the shop every till is its own process with its own lanes; here they share
+        # one process, so give the interactive lane a slot per register (and fresh stats)
+        configure_lanes(db_settings.get("lanes"))
+        lane = get_lane(INTERACTIVE)
+        lane.set_slots(max(lane.slots, registers))
+        lock = threading.Lock()
+
+        def worker(i):
+            stats = run_register(i, seed_info, 0, stop_at, start_at)
+            with lock:
+                all_stats.append(stats)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(registers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    # The last operations finish a little after stop_at: count the time they took too
+    measured = time.time() - start_at
+
+    merged = {}
+    for stats in all_stats:
+        for op, s in stats.items():
+            m = merged.setdefault(op, {"latencies": [], "ok": 0, "conflict": 0, "deadlock": 0, "error": 0})
+            m["latencies"].extend(s["latencies"])
+            for key in ("ok", "conflict", "deadlock", "error"):
+                m[key] += s[key]
+
+    total_ops = sum(len(m["latencies"]) for m in merged.values())
+    report = {"registers": registers, "seconds": seconds, "measured_seconds": measured,
+              "throughput": total_ops / measured, "ops": {},
+              "lanes": None if use_processes else lane_stats()}
+    for op, m in merged.items():
+        lat = sorted(m["latencies"])
+        n = len(lat)
+        report["ops"][op] = {
+            "count": n,
+            "per_second": n / measured,
+            "p50_ms": _percentile(lat, 0.50) * 1000,
+            "p99_ms": _percentile(lat, 0.99) * 1000,
+            "deadlocks": m["deadlock"],
+            "conflict_rate": m["conflict"] / n if n else 0.0,
+            "errors": m["error"],
+        }
+    return report
+
+
+def format_report(report):
+    lines = [f"{report['registers']} registers, {report['measured_seconds']:.1f}s: "
+             f"{report['throughput']:.1f} ops/s total",
+             f"  {'operation':<32}{'ops/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'deadlk':>8}{'conflict':>10}{'errors':>8}"]
+    for op, r in sorted(report["ops"].items()):
+        lines.append(f"  {op:<32}{r['per_second']:>8.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+                     f"{r['deadlocks']:>8}{r['conflict_rate']:>9.1%}{r['errors']:>8}")
+    if report.get("lanes"):
+        lines.append("  connection lanes (waits for a free slot):")
+        lines.append(format_lane_stats(report["lanes"]))
+    return "\n".join(lines)
+
+
+def find_knee(reports, checkout_op="complete_order", min_gain=0.10, max_p99_growth=2.0):
+    """
+    The knee is the first register count where adding tills stops paying off:
+    throughput grows by less than min_gain, or checkout p99 is more than
+    max_p99_growth times what it was with the fewest registers.
+    """
+    if not reports:
+        return None
+    base_p99 = reports[0]["ops"].get(checkout_op, {}).get("p99_ms", 0.0)
+    for previous, current in zip(reports, reports[1:]):
+        gain = (current["throughput"] - previous["throughput"]) / max(previous["throughput"], 1e-9)
+        p99 = current["ops"].get(checkout_op, {}).get("p99_ms", 0.0)
+        if gain < min_gain or (base_p99 and p99 > base_p99 * max_p99_growth):
+            return current["registers"]
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-register load test (local database only).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="insert contention-heavy test data")
+    p_seed.add_argument("--books", type=int, default=20000)
+    p_seed.add_argument("--customers", type=int, default=50)
+    p_seed.add_argument("--employees", type=int, default=10)
+
+    for name in ("run", "sweep"):
+        p = sub.add_parser(name)
+        p.add_argument("--registers", default="4" if name == "run" else "1,2,4,8,16,32",
+                       help="number of registers (sweep: comma separated list)")
+        p.add_argument("--seconds", type=int, default=30)
+        p.add_argument("--processes", action="store_true", help="one process per register instead of threads")
+
+    args = parser.parse_args()
+
+    ok, error = _check_local()
+    if not ok:
+        print(error)
+        sys.exit(1)
+
+    if args.command == "seed":
+        success, result = seed(args.books, args.customers, args.employees)
+        print(f"Seeded: {result['books']} test books" if success else f"Seed failed: {result}")
+        sys.exit(0 if success else 1)
+
+    success, seed_info = _load_seed_info()
+    if not success:
+        print(seed_info)
+        sys.exit(1)
+
+    counts = [int(n) for n in args.registers.split(",")]
+    reports = []
+    for n in counts:
+        report = run_load(n, args.seconds, seed_info, args.processes)
+        reports.append(report)
+        print(format_report(report))
+        print()
+
+    if args.command == "sweep":
+        knee = find_knee(reports)
+        if knee:
+            print(f"Knee: throughput or checkout latency stops scaling at about {knee} registers.")
+        else:
+            print("No knee found in this range - try more registers.")
@@ -0,0 +1,423 @@
+# app/online_migration.py
+# Online (no long downtime) migration that widens the id and money columns.
+#
+# book_id, customer_id and employee_id were SMALLINT UNSIGNED (max 65,535) and
+# the order/credit money columns were DECIMAL(6,2) (max 9,999.99).
+# A plain ALTER TABLE would rebuild every table while blocking writes, so this
+# tool does it the shadow-table way instead:
+#
+#   1. prepare  - create <table>_new copies with the wider columns (no FKs yet)
+#                 and triggers that mirror every insert/update/delete into them
+#   2. copy     - copy existing rows into the shadows in small primary key chunks,
+#                 sleeping between chunks so the tills keep running
+#   3. verify   - compare row counts and per-chunk checksums of old vs new
+#   4. cutover  - add the foreign keys to the shadows and swap all tables in
+#                 one atomic RENAME TABLE; the old tables are kept as <table>_old
+#   5. cleanup  - drop the <table>_old tables once you're happy
+#
+# The foreign keys are read from information_schema at cut-over, so keys added by
+# later migrations are handled too. Keys from other tables (e.g. Credit_Ledger ->
+# Customer) are moved over to the new tables in the same step.
+#
+# The mirror triggers don't fire for rows changed by a foreign key action
+# (ON DELETE CASCADE / SET NULL): MySQL never runs triggers for those. Don't delete
+# customers or orders while the migration runs (the archive job deletes order
+# details itself, so it's fine). 'verify' reports any difference this causes.
+#
+# Run from the project root:
+#   python -m app.online_migration run          (prepare + copy + verify + cutover)
+#   python -m app.online_migration <step>       (one step at a time)
+#   python -m app.online_migration abort        (drop triggers and shadows)
+
+import sys
+import time
+
+from app.db_connect import create_connection
+from app.lanes import BACKGROUND
+
+SHADOW_SUFFIX = "_new"
+OLD_SUFFIX = "_old"
+
+# Tables in copy order (parents before children), with their primary key column
+# and the column changes to apply to the shadow table.
+WIDEN_PLAN = [
+    ("Employee", "employee_id", [
+        "MODIFY employee_id INT UNSIGNED NOT NULL AUTO_INCREMENT",
+    ]),
+    ("Customer", "customer_id", [
+        "MODIFY customer_id INT UNSIGNED NOT NULL AUTO_INCREMENT",
+        "MODIFY credit_total DECIMAL(10,2) NOT NULL DEFAULT 0.00",
+    ]),
+    ("Book", "book_id", [
+        "MODIFY book_id INT UNSIGNED NOT NULL AUTO_INCREMENT",
+    ]),
+    ("Order", "order_id", [
+        "MODIFY customer_id INT UNSIGNED",
+        "MODIFY employee_id INT UNSIGNED NOT NULL",
+        "MODIFY total_amount DECIMAL(10,2) NOT NULL",
+        "MODIFY store_credit_used DECIMAL(10,2) DEFAULT 0.00",
+        "MODIFY final_amount_paid DECIMAL(10,2) NOT NULL",
+    ]),
+    ("Order_Detail", "book_id", [
+        "MODIFY book_id INT UNSIGNED NOT NULL",
+        "MODIFY final_price DECIMAL(10,2) NOT NULL",
+    ]),
+]
+
+PLAN_TABLES = {table for table, _, _ in WIDEN_PLAN}
+
+
+def _q(name):
+    """Backtick-quote a table or column name (needed for `Order`)."""
+    return f"`{name}`"
+
+
+def _trigger_name(table, action):
+    return f"osm_{table.lower()}_{action}"
+
+
+def _columns(cursor, table):
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s ORDER BY ordinal_position;",
+        (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _table_exists(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s;",
+        (table,))
+    return cursor.fetchone() is not None
+
+
+def _base_table(table):
+    for suffix in (SHADOW_SUFFIX, OLD_SUFFIX):
+        if table.endswith(suffix) and table[:-len(suffix)] in PLAN_TABLES:
+            return table[:-len(suffix)]
+    return table
+
+
+def _foreign_keys(cursor):
+    """
+    Every foreign key from or to a table in WIDEN_PLAN (or its shadow / old copy), as
+    dicts with name, child, columns, parent, parent_columns and actions.
+    """
+    cursor.execute(
+        "SELECT rc.constraint_name, rc.table_name, rc.referenced_table_name, rc.delete_rule, rc.update_rule, "
+        "GROUP_CONCAT(k.column_name ORDER BY k.ordinal_position), "
+        "GROUP_CONCAT(k.referenced_column_name ORDER BY k.ordinal_position) "
+        "FROM information_schema.referential_constraints rc "
+        "JOIN information_schema.key_column_usage k ON k.constraint_schema = rc.constraint_schema "
+        "AND k.constraint_name = rc.constraint_name AND k.table_name = rc.table_name "
+        "WHERE rc.constraint_schema = DATABASE() "
+        "GROUP BY rc.constraint_name, rc.table_name, rc.referenced_table_name, rc.delete_rule, rc.update_rule;")
+    keys = []
+    for name, child, parent, delete_rule, update_rule, columns, parent_columns in cursor.fetchall():
+        if _base_table(child) not in PLAN_TABLES and _base_table(parent) not in PLAN_TABLES:
+            continue
+        keys.append({"name": name, "child": child, "columns": columns.split(","), "parent": parent,
+                     "parent_columns": parent_columns.split(","),
+                     "actions": f"ON DELETE {delete_rule} ON UPDATE {update_rule}"})
+    return keys
+
+
+def _column_type(cursor, table, column):
+    cursor.execute(
+        "SELECT column_type FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s;",
+        (table, column))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _run_step(step, *args):
+    """Open a connection, run one migration step, and always clean up."""
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        return step(conn, cursor, *args)
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+# ---------- 1. prepare ----------
+
+def _prepare(conn, cursor):
+    for table, pk, changes in WIDEN_PLAN:
+        shadow = table + SHADOW_SUFFIX
+        if _table_exists(cursor, shadow):
+            return False, f"{shadow} already exists - run 'abort' first or continue with 'copy'."
+
+        # LIKE copies columns, indexes and CHECK constraints but not foreign keys,
+        # which is what we want: FKs would make trigger writes fail mid-copy.
+        cursor.execute(f"CREATE TABLE {_q(shadow)} LIKE {_q(table)};")
+        # The shadow is empty, so this ALTER is instant
+        cursor.execute(f"ALTER TABLE {_q(shadow)} {', '.join(changes)};")
+
+        cols = _columns(cursor, table)
+        col_list = ", ".join(_q(c) for c in cols)
+        new_values = ", ".join(f"NEW.{_q(c)}" for c in cols)
+
+        cursor.execute(f"""
+            CREATE TRIGGER {_trigger_name(table, 'ins')} AFTER INSERT ON {_q(table)} FOR EACH ROW
+            REPLACE INTO {_q(shadow)} ({col_list}) VALUES ({new_values});""")
+        cursor.execute(f"""
+            CREATE TRIGGER {_trigger_name(table, 'upd')} AFTER UPDATE ON {_q(table)} FOR EACH ROW
+            BEGIN
+                DELETE FROM {_q(shadow)} WHERE {_q(pk)} = OLD.{_q(pk)};
+                REPLACE INTO {_q(shadow)} ({col_list}) VALUES ({new_values});
+            END""")
+        cursor.execute(f"""
+            CREATE TRIGGER {_trigger_name(table, 'del')} AFTER DELETE ON {_q(table)} FOR EACH ROW
+            DELETE FROM {_q(shadow)} WHERE {_q(pk)} = OLD.{_q(pk)};""")
+
+    return True, "Shadow tables and triggers created."
+
+
+def prepare():
+    return _run_step(_prepare)
+
+
+# ---------- 2. copy ----------
+
+def _pk_range(cursor, table, pk):
+    cursor.execute(f"SELECT MIN({_q(pk)}), MAX({_q(pk)}) FROM {_q(table)};")
+    return cursor.fetchone()
+
+
+def _chunks(low, high, chunk_size):
+    """Yield (start, end) primary key ranges covering low..high inclusive."""
+    if low is None:
+        return
+    start = low
+    while start <= high:
+        end = min(start + chunk_size - 1, high)
+        yield start, end
+        start = end + 1
+
+
+def _copy(conn, cursor, chunk_size, sleep_seconds):
+    copied = {}
+    for table, pk, _ in WIDEN_PLAN:
+        shadow = table + SHADOW_SUFFIX
+        cols = ", ".join(_q(c) for c in _columns(cursor, table))
+        low, high = _pk_range(cursor, table, pk)
+
+        total = 0
+        started = time.perf_counter()
+        for start, end in _chunks(low, high, chunk_size):
+            # IGNORE: rows the triggers already wrote are newer, keep them
+            cursor.execute(
+                f"INSERT IGNORE INTO {_q(shadow)} ({cols}) "
+                f"SELECT {cols} FROM {_q(table)} WHERE {_q(pk)} BETWEEN %s AND %s;",
+                (start, end))
+            conn.commit()
+            total += cursor.rowcount
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+
+        elapsed = time.perf_counter() - started
+        copied[table] = total
+        print(f"  {table}: copied {total} rows in {elapsed:.1f}s")
+
+    return True, copied
+
+
+def copy_rows(chunk_size=1000, sleep_seconds=0.05):
+    return _run_step(_copy, chunk_size, sleep_seconds)
+
+
+# ---------- 3. verify ----------
+
+def _checksum_sql(table, cols, pk):
+    # CONCAT_WS skips NULLs, so wrap each column to keep NULL and '' different
+    row_expr = ", ".join(f"COALESCE({_q(c)}, '\\\\N')" for c in cols)
+    return (f"SELECT COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('#', {row_expr}))), 0) "
+            f"FROM {_q(table)} WHERE {_q(pk)} BETWEEN %s AND %s;")
+
+
+def _verify(conn, cursor, chunk_size, retries):
+    mismatches = []
+    for table, pk, _ in WIDEN_PLAN:
+        shadow = table + SHADOW_SUFFIX
+        cols = _columns(cursor, table)
+        old_sql = _checksum_sql(table, cols, pk)
+        new_sql = _checksum_sql(shadow, cols, pk)
+
+        low, high = _pk_range(cursor, table, pk)
+        new_low, new_high = _pk_range(cursor, shadow, pk)
+        if low is None or (new_low is not None and new_low < low):
+            low = new_low
+        if high is None or (new_high is not None and new_high > high):
+            high = new_high
+
+        rows_checked = 0
+        for start, end in _chunks(low, high, chunk_size):
+            # Writes in flight can cause a brief difference, so retry before failing
+            for attempt in range(retries + 1):
+                cursor.execute(old_sql, (start, end))
+                old = cursor.fetchone()
+                cursor.execute(new_sql, (start, end))
+                new = cursor.fetchone()
+                conn.commit()  # fresh snapshot for the next read
+                if old == new:
+                    break
+                time.sleep(0.2)
+            else:
+                mismatches.append(f"{table} {pk} {start}-{end}: old={old} new={new}")
+            rows_checked += old[0]
+
+        print(f"  {table}: {rows_checked} rows checked")
+
+    if mismatches:
+        return False, "Checksum mismatch:\n" + "\n".join(mismatches)
+    return True, "All row counts and checksums match."
+
+
+def verify(chunk_size=1000, retries=3):
+    return _run_step(_verify, chunk_size, retries)
+
+
+# ---------- 4. cutover ----------
+
+def _fk_sql(key, child, parent):
+    columns = ", ".join(_q(c) for c in key["columns"])
+    parent_columns = ", ".join(_q(c) for c in key["parent_columns"])
+    return (f"ALTER TABLE {_q(child)} ADD FOREIGN KEY ({columns}) "
+            f"REFERENCES {_q(parent)}({parent_columns}) {key['actions']};")
+
+
+def _cutover(conn, cursor):
+    # The live tables' keys (not those of any shadow or old copy)
+    keys = [key for key in _foreign_keys(cursor)
+            if _base_table(key["child"]) == key["child"] and _base_table(key["parent"]) == key["parent"]]
+    # Keys on tables outside the plan that point into it (e.g. Credit_Ledger -> Customer)
+    outside = [key for key in keys if key["child"] not in PLAN_TABLES]
+
+    # Their columns must already match the widened parent, or MySQL refuses the key
+    for key in outside:
+        for col, parent_col in zip(key["columns"], key["parent_columns"]):
+            child_type = _column_type(cursor, key["child"], col)
+            parent_type = _column_type(cursor, key["parent"] + SHADOW_SUFFIX, parent_col)
+            if child_type != parent_type:
+                return False, (f"{key['child']}.{col} is {child_type} but the new {key['parent']}.{parent_col} "
+                               f"is {parent_type}; widen it first (nothing was changed).")
+
+    # Adding FKs with checks off is a quick metadata change (the indexes already
+    # exist); the data was just verified against the old, constrained tables.
+    cursor.execute("SET foreign_key_checks = 0;")
+    try:
+        for key in keys:
+            if key["child"] in PLAN_TABLES:
+                parent = key["parent"] + SHADOW_SUFFIX if key["parent"] in PLAN_TABLES else key["parent"]
+                cursor.execute(_fk_sql(key, key["child"] + SHADOW_SUFFIX, parent))
+
+        # Drop the outside keys now: RENAME would otherwise take them along to the
+        # *_old tables. They're added back on the new tables right after the swap.
+        for key in outside:
+            cursor.execute(f"ALTER TABLE {_q(key['child'])} DROP FOREIGN KEY {_q(key['name'])};")
+
+        # One RENAME statement swaps every table atomically. FKs follow their tables,
+        # so the new tables reference each other and the old ones reference each other.
+        renames = []
+        for table, _, _ in WIDEN_PLAN:
+            renames.append(f"{_q(table)} TO {_q(table + OLD_SUFFIX)}")
+            renames.append(f"{_q(table + SHADOW_SUFFIX)} TO {_q(table)}")
+        cursor.execute("RENAME TABLE " + ", ".join(renames) + ";")
+
+        for key in outside:
+            cursor.execute(_fk_sql(key, key["child"], key["parent"]))
+    finally:
+        cursor.execute("SET foreign_key_checks = 1;")
+
+    # The mirror triggers moved with the old tables; they're no longer needed
+    for table, _, _ in WIDEN_PLAN:
+        for action in ("ins", "upd", "del"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {_trigger_name(table, action)};")
+
+    return True, f"Cut-over done. Old tables kept as *{OLD_SUFFIX} - run 'cleanup' to drop them."
+
+
+def cutover():
+    return _run_step(_cutover)
+
+
+# ---------- 5. cleanup / abort ----------
+
+def _drop_tables(conn, cursor, suffix):
+    # Children first, so FKs between the old tables don't block the drops
+    for table, _, _ in reversed(WIDEN_PLAN):
+        cursor.execute(f"DROP TABLE IF EXISTS {_q(table + suffix)};")
+
+
+def _cleanup(conn, cursor):
+    # Anything outside the plan still pointing at an old table would stop the drop
+    still_used = [f"{key['child']} -> {key['parent']}" for key in _foreign_keys(cursor)
+                  if key["parent"].endswith(OLD_SUFFIX) and not key["child"].endswith(OLD_SUFFIX)]
+    if still_used:
+        return False, "Foreign keys still point at the old tables: " + ", ".join(still_used)
+    _drop_tables(conn, cursor, OLD_SUFFIX)
+    return True, "Old tables dropped."
+
+
+def cleanup():
+    return _run_step(_cleanup)
+
+
+def _abort(conn, cursor):
+    for table, _, _ in WIDEN_PLAN:
+        for action in ("ins", "upd", "del"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {_trigger_name(table, action)};")
+    _drop_tables(conn, cursor, SHADOW_SUFFIX)
+    return True, "Triggers and shadow tables dropped. Original tables untouched."
+
+
+def abort():
+    return _run_step(_abort)
+
+
+def run_all(chunk_size=1000, sleep_seconds=0.05):
+    """Run every step in order, stopping at the first failure (before cut-over if verify fails)."""
+    steps = [
+        ("prepare", prepare, ()),
+        ("copy", copy_rows, (chunk_size, sleep_seconds)),
+        ("verify", verify, (chunk_size,)),
+        ("cutover", cutover, ()),
+    ]
+    for name, step, args in steps:
+        print(f"[{name}]")
+        success, result = step(*args)
+        if not success:
+            return False, f"{name} failed: {result}"
+        print(f"  {result}")
+    return True, "Migration complete."
+
+
+if __name__ == "__main__":
+    commands = {
+        "run": run_all,
+        "prepare": prepare,
+        "copy": copy_rows,
+        "verify": verify,
+        "cutover": cutover,
+        "cleanup": cleanup,
+        "abort": abort,
+    }
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print("Usage: python -m app.online_migration " + "|".join(commands))
+        sys.exit(1)
+
+    success, result = commands[sys.argv[1]]()
+    print(result)
+    if not success:
+        sys.exit(1)
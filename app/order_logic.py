@@ -1,9 +1,14 @@
 # Functions for creating and processing orders
 
 # Connect to DB
-# Connect to DB
+# Everything here uses the primary (create_connection), never a read replica:
+# checkout has to see the latest credit and book status, not a lagging copy.
 from app.db_connect import create_connection
 from app.query_loader import load_queries
+from app.isbn import canonicalize_isbn
+from app.events import publish, OrderCompleted, BookSold, CreditChanged
+from app.credit_ledger import spend_credit
+from decimal import Decimal
 
 
 queries = load_queries("db/queries.sql")
@@ -39,6 +44,10 @@ def search_book_by_isbn_for_order(isbn):
     Searches for a book (for order processing) and includes book_id.
     Returns (True, dict) if found or (False, error message) if not.
     """
+    success, canonical = canonicalize_isbn(isbn)
+    if not success:
+        return False, canonical
+
     conn, error = create_connection()
     if conn is None:
         return False, error
@@ -53,7 +62,7 @@ def search_book_by_isbn_for_order(isbn):
             return False, "Query 'search_book_by_isbn_for_order' not found."
 
         # Execute search
-        cursor.execute(sql, (isbn, isbn))
+        cursor.execute(sql, (canonical,))
         results = cursor.fetchall()
 
         if not results:
@@ -171,6 +180,7 @@ def complete_order(customer_id, employee_id, order_items, credit_used, current_c
     """
     Completes an order: inserts into Order and Order_Detail,
     deducts credit if used, and marks inventory books sold.
+    current_credit is what the screen showed; the credit check uses the live balance.
     """
     conn, error = create_connection()
     if conn is None:
@@ -192,20 +202,30 @@ def complete_order(customer_id, employee_id, order_items, credit_used, current_c
         # Insert Order Details
         sql_detail = queries.get("insert_order_detail")
         sql_mark_sold = queries.get("mark_book_as_sold")
+        events = []
         for item in order_items:
             cursor.execute(sql_detail, (order_id, item["book_id"], item["price"]))
 
             # Mark inventory books as sold (skip manual items with None or 0 ID)
             if item["book_id"] and isinstance(item["book_id"], int):
                 cursor.execute(sql_mark_sold, (item["book_id"],))
+                events.append(BookSold(item["book_id"], order_id, Decimal(f"{float(item['price']):.2f}")))
 
-        # Deduct credit if used
+        # Deduct credit if used: from the balance in the DB, not the one the screen
+        # loaded earlier, and only if it's still there
         if credit_used > 0:
-            new_credit = max(0, float(current_credit) - float(credit_used))
-            sql_update_credit = queries.get("update_customer_credit_after_order")
-            cursor.execute(sql_update_credit, (new_credit, customer_id))
+            used = Decimal(f"{float(credit_used):.2f}")
+            success, new_credit = spend_credit(cursor, customer_id, used, order_id)
+            if not success:
+                conn.rollback()
+                return False, new_credit
+            events.append(CreditChanged(customer_id, -used, new_credit, "order"))
 
         conn.commit()
+
+        # Tell listeners (caches, other terminals) what changed
+        publish(OrderCompleted(order_id, customer_id, int(employee_id),
+                               Decimal(f"{total_amount:.2f}"), Decimal(f"{float(credit_used):.2f}")), *events)
         return True, {"order_id": order_id}
 
     except Exception as e:
@@ -0,0 +1,276 @@
+# app/profiling.py
+# Opt-in profiling of GUI event handlers ("the order screen is slow" - but where?).
+#
+# Turn it on with an environment variable before starting the GUI:
+#   BOOKSTORE_PROFILE=1 python gui/main_gui.py
+#   BOOKSTORE_PROFILE=1 BOOKSTORE_PROFILE_CPROFILE=1 python gui/main_gui.py   (also save cProfile dumps)
+#
+# Every view callback (perform_search, search_and_add_book, complete_order, ...) is
+# timed and split into:
+#   sql_ms    - time spent in MySQL (connecting + cursor calls, measured in db_connect)
+#   dialog_ms - time a messagebox was open (the clerk reading, not the app working)
+#   redraw_ms - Tk redrawing the window after the handler
+#   python_ms - everything else (our own code and widget updates)
+# One JSON line per call goes to logs/profile.log (rotated at 5 MB, 5 files kept).
+# The overhead is a few perf_counter() calls per handler and per query.
+#
+# Summary of the slowest handlers:
+#   python -m app.profiling summary
+
+import cProfile
+import functools
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+from app.db_connect import add_connection_wrapper
+
+ENABLED = os.environ.get("BOOKSTORE_PROFILE", "0") == "1"
+CPROFILE_ENABLED = os.environ.get("BOOKSTORE_PROFILE_CPROFILE", "0") == "1"
+
+PROFILE_LOG_PATH = "logs/profile.log"
+CPROFILE_DIR = "logs/cprofile"
+# Only keep cProfile dumps for calls slower than this
+CPROFILE_MIN_MS = 200
+
+_local = threading.local()
+_logger = None
+
+
+def _counters():
+    """Per-thread running totals that handlers read before and after they run."""
+    if not hasattr(_local, "sql"):
+        _local.sql = 0.0
+        _local.sql_count = 0
+        _local.dialog = 0.0
+        _local.depth = 0
+    return _local
+
+
+# ---------- SQL timing (installed into db_connect) ----------
+
+def _time_sql(method, *args, **kwargs):
+    """Call a DB method and add its duration to this thread's SQL total."""
+    counters = _counters()
+    started = time.perf_counter()
+    try:
+        return method(*args, **kwargs)
+    finally:
+        counters.sql += time.perf_counter() - started
+
+
+class _TimedCursor:
+    """Cursor proxy that adds the time of every call to the SQL total."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        _counters().sql_count += 1
+        return _time_sql(self._cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        _counters().sql_count += 1
+        return _time_sql(self._cursor.executemany, *args, **kwargs)
+
+    def fetchone(self):
+        return _time_sql(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return _time_sql(self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return _time_sql(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TimedConnection:
+    """Connection proxy whose cursors are timed; commits/rollbacks count as SQL too."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return _TimedCursor(self._connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        return _time_sql(self._connection.commit)
+
+    def rollback(self):
+        return _time_sql(self._connection.rollback)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def _wrap_connection(connection, connect_seconds):
+    _counters().sql += connect_seconds
+    return _TimedConnection(connection)
+
+
+# ---------- Dialog timing ----------
+
+def _patch_messageboxes():
+    """Count time spent in modal dialogs, so waiting on the clerk isn't blamed on the app."""
+    from tkinter import messagebox
+
+    def timed(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _counters().dialog += time.perf_counter() - started
+        return wrapper
+
+    for name in ("showinfo", "showwarning", "showerror", "askyesno", "askokcancel", "askquestion"):
+        setattr(messagebox, name, timed(getattr(messagebox, name)))
+
+
+# ---------- Handler wrapping ----------
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(PROFILE_LOG_PATH), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(PROFILE_LOG_PATH, maxBytes=5_000_000, backupCount=5)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger = logging.getLogger("bookstore.profile")
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    return _logger
+
+
+def profiled(name, func):
+    """Wrap a view method so each top-level call is timed and logged."""
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        counters = _counters()
+        if counters.depth > 0:
+            # Called from another handler (e.g. complete_order -> clear_order):
+            # its time is already part of the outer call
+            return func(self, *args, **kwargs)
+
+        sql_before, count_before, dialog_before = counters.sql, counters.sql_count, counters.dialog
+        profiler = cProfile.Profile() if CPROFILE_ENABLED else None
+        counters.depth += 1
+        started = time.perf_counter()
+        try:
+            if profiler:
+                return profiler.runcall(func, self, *args, **kwargs)
+            return func(self, *args, **kwargs)
+        finally:
+            handler_done = time.perf_counter()
+            # Tk normally redraws right after the handler returns; do it now so it can be timed
+            try:
+                self.update_idletasks()
+            except Exception:
+                pass
+            finished = time.perf_counter()
+            counters.depth -= 1
+
+            wall = handler_done - started
+            sql = counters.sql - sql_before
+            dialog = counters.dialog - dialog_before
+            record = {
+                "ts": round(time.time(), 3),
+                "handler": name,
+                "wall_ms": round((finished - started) * 1000, 2),
+                "sql_ms": round(sql * 1000, 2),
+                "sql_count": counters.sql_count - count_before,
+                "dialog_ms": round(dialog * 1000, 2),
+                "redraw_ms": round((finished - handler_done) * 1000, 2),
+                "python_ms": round(max(0.0, wall - sql - dialog) * 1000, 2),
+            }
+            _get_logger().info(json.dumps(record))
+
+            busy_ms = (wall - dialog) * 1000
+            if profiler and busy_ms >= CPROFILE_MIN_MS:
+                os.makedirs(CPROFILE_DIR, exist_ok=True)
+                profiler.dump_stats(os.path.join(CPROFILE_DIR, f"{name}-{int(time.time() * 1000)}.prof"))
+
+    return wrapper
+
+
+def instrument_views(view_classes):
+    """
+    Wrap every public method defined on each view class. Must run before the
+    views are created, because buttons capture their command methods at creation.
+    """
+    for cls in view_classes:
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith("_") or not callable(value) or getattr(value, "_profiled", False):
+                continue
+            wrapped = profiled(f"{cls.__name__}.{attr}", value)
+            wrapped._profiled = True
+            setattr(cls, attr, wrapped)
+
+
+def enable_profiling(view_classes):
+    """Turn on SQL, dialog and handler timing. Called by the Dashboard when ENABLED."""
+    add_connection_wrapper(_wrap_connection)
+    _patch_messageboxes()
+    instrument_views(view_classes)
+
+
+# ---------- Summary ----------
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(path=PROFILE_LOG_PATH, top=15):
+    """Read the log (and its rotated files) and return a text table, slowest p95 first."""
+    stats = {}
+    for log_file in sorted(glob.glob(path + "*")):
+        with open(log_file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                stats.setdefault(record["handler"], []).append(record)
+
+    rows = []
+    for handler, records in stats.items():
+        busy = sorted(r["wall_ms"] - r["dialog_ms"] for r in records)
+        n = len(records)
+        rows.append((
+            _percentile(busy, 0.95), handler, n,
+            _percentile(busy, 0.5), busy[-1],
+            sum(r["sql_ms"] for r in records) / n,
+            sum(r["python_ms"] for r in records) / n,
+            sum(r["redraw_ms"] for r in records) / n,
+            sum(r["sql_count"] for r in records) / n,
+        ))
+    rows.sort(reverse=True)
+
+    lines = [f"{'handler':<45}{'calls':>7}{'p50':>9}{'p95':>9}{'max':>9}"
+             f"{'sql':>9}{'python':>9}{'redraw':>9}{'queries':>9}",
+             "  (milliseconds, excluding time in dialogs; sql/python/redraw/queries are averages)"]
+    for p95, handler, n, p50, worst, sql, python, redraw, queries in rows[:top]:
+        lines.append(f"{handler:<45}{n:>7}{p50:>9.1f}{p95:>9.1f}{worst:>9.1f}"
+                     f"{sql:>9.1f}{python:>9.1f}{redraw:>9.1f}{queries:>9.1f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "summary":
+        print("Usage: python -m app.profiling summary [log path]")
+        sys.exit(1)
+    print(summarize(*sys.argv[2:3]))
@@ -0,0 +1,414 @@
+# app/query_capture.py
+# Capture real query traffic and replay it, to compare two builds or schema versions
+# on the shop's own mix of queries instead of a synthetic benchmark.
+#
+# Capture (opt-in) records every named query a till runs, with its parameters and
+# how long it took, one short JSON line each, to logs/capture-<time>.jsonl:
+#   BOOKSTORE_CAPTURE=1 python gui/main_gui.py
+#   BOOKSTORE_CAPTURE=1 python -m app.cli batch < operations.jsonl
+# Emails, customer/employee names and phone numbers are never written as-is: they
+# are replaced by a keyed hash. The key is BOOKSTORE_CAPTURE_KEY, a secret of your
+# own; without it nothing is captured (a built-in key would let anyone with the
+# capture file test guesses of an email against the hashes).
+# Bulk executemany() calls and SQL that isn't a named query are not captured.
+#
+# Replay runs a capture against a LOCAL copy of the database, using the named
+# queries of the current checkout (so the same capture can be replayed on two
+# builds). The queries of one connection are replayed in order on one worker,
+# inside a transaction that is rolled back at the end, so the copy never changes
+# and every replay starts from the same data:
+#   python -m app.query_capture anonymize              (hash PII in the local copy the
+#                                                       same way, with the same key, so
+#                                                       exact lookups still match)
+#   python -m app.query_capture replay logs/capture-....jsonl --speed 1|4|max
+#                                      [--concurrency 8] --out before.json
+#   python -m app.query_capture compare before.json after.json
+
+import argparse
+import atexit
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.db_connect import add_connection_wrapper, create_connection
+from app.query_loader import load_queries, queries_by_sql, find_query_name
+
+ENABLED = os.environ.get("BOOKSTORE_CAPTURE", "0") == "1"
+CAPTURE_KEY = os.environ.get("BOOKSTORE_CAPTURE_KEY", "").encode("utf-8")
+NO_KEY_ERROR = "Set BOOKSTORE_CAPTURE_KEY to a secret of your own (the same one for capture and anonymize)."
+
+CAPTURE_DIR = "logs"
+DEFAULT_CONCURRENCY = 8
+# compare: flag a query whose p95 got this much slower (with enough samples to trust it)
+REGRESSION_FACTOR = 1.2
+MIN_SAMPLES = 20
+
+# Columns whose values are personal data, and how to hash them
+PII_COLUMNS = {"email": "email", "first_name": "name", "last_name": "name", "phone_number": "phone"}
+
+_PLACEHOLDER_COLUMN = re.compile(r"([\w`.]+)\s*(?:=|LIKE)\s*$", re.IGNORECASE)
+_INSERT_COLUMNS = re.compile(r"^\s*INSERT\s+INTO\s+\S+\s*\(([^)]*)\)\s*VALUES", re.IGNORECASE)
+
+
+# ---------- PII hashing ----------
+
+def _digest(text):
+    return hmac.new(CAPTURE_KEY, text.strip().lower().encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def hash_pii(kind, value):
+    """Deterministic stand-in for a personal value, the same shape as the original."""
+    if not isinstance(value, str):
+        return value
+    if value.endswith("%"):
+        # LIKE 'prefix%' search: hash the typed text, keep it a prefix search. It won't
+        # match the anonymized rows (a hash of the prefix isn't a prefix of the hash)
+        return hash_pii(kind, value[:-1]) + "%"
+    digest = _digest(value)
+    if kind == "email":
+        return f"{digest[:12]}@example.invalid"
+    if kind == "phone":
+        return str(int(digest[:12], 16))[:10]
+    return "x" + digest[:9]   # names: fits VARCHAR(15)
+
+
+def pii_kinds(sql):
+    """For each %s in sql: the PII kind of the value ("email", "name", "phone") or None."""
+    insert = _INSERT_COLUMNS.match(sql)
+    columns = [c.strip().strip("`").lower() for c in insert.group(1).split(",")] if insert else []
+    kinds = []
+    for match in re.finditer(r"%s", sql):
+        if insert and match.start() > insert.end() and len(kinds) < len(columns):
+            name = columns[len(kinds)]   # INSERT ... (cols) VALUES (%s, ...): by position
+        else:
+            column = _PLACEHOLDER_COLUMN.search(sql[max(0, match.start() - 80):match.start()])
+            name = column.group(1).strip("`").split(".")[-1].lower() if column else ""
+        kinds.append(PII_COLUMNS.get(name))
+    return kinds
+
+
+# ---------- Capture ----------
+
+_queries = None
+_by_sql = None
+_names = {}            # SQL text -> (name, appended text), cache
+_kinds = {}            # query name -> pii_kinds()
+_sessions = itertools.count(1)
+_write_lock = threading.Lock()
+_out = None
+
+
+def _lookup(sql):
+    found = _names.get(sql)
+    if found is None:
+        found = find_query_name(sql, _by_sql, _queries)
+        if len(_names) < 1000:
+            _names[sql] = found
+    return found
+
+
+def _record(session, sql, params, seconds):
+    name, suffix = _lookup(sql)
+    if name is None:
+        return
+    kinds = _kinds.get(name)
+    if kinds is None:
+        kinds = _kinds[name] = pii_kinds(sql)
+    values = []
+    for i, value in enumerate(params or ()):
+        kind = kinds[i] if i < len(kinds) else None
+        values.append(hash_pii(kind, value) if kind else value)
+
+    record = {"t": round(time.time(), 4), "s": session, "q": name, "p": values, "ms": round(seconds * 1000, 3)}
+    if suffix:
+        record["x"] = suffix
+    line = json.dumps(record, default=str, separators=(",", ":")) + "\n"
+    with _write_lock:
+        _out.write(line)
+
+
+class _CaptureCursor:
+    """Cursor proxy that records each execute() of a named query."""
+
+    def __init__(self, cursor, session):
+        self._cursor = cursor
+        self._session = session
+
+    def execute(self, operation, *args, **kwargs):
+        params = args[0] if args else kwargs.get("params")
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, *args, **kwargs)
+        finally:
+            _record(self._session, operation, params, time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CaptureConnection:
+    def __init__(self, connection):
+        self._connection = connection
+        self._session = next(_sessions)
+
+    def cursor(self, *args, **kwargs):
+        return _CaptureCursor(self._connection.cursor(*args, **kwargs), self._session)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def _wrap_connection(connection, connect_seconds):
+    return _CaptureConnection(connection)
+
+
+def enable_capture(path=None):
+    """
+    Start recording named queries from every new connection.
+    Returns (True, log path) or (False, error) if BOOKSTORE_CAPTURE_KEY isn't set.
+    """
+    global _out, _queries, _by_sql
+    if not CAPTURE_KEY:
+        return False, NO_KEY_ERROR
+    if _out is not None:
+        return True, _out.name
+    _queries = load_queries("db/queries.sql")
+    _by_sql = queries_by_sql(_queries)
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    path = path or os.path.join(CAPTURE_DIR, f"capture-{datetime.now():%Y%m%d-%H%M%S}.jsonl")
+    _out = open(path, "a", buffering=1024 * 1024)
+    atexit.register(_out.close)
+    add_connection_wrapper(_wrap_connection)
+    return True, path
+
+
+# ---------- Anonymizing the local copy ----------
+
+def anonymize(chunk_size=1000):
+    """
+    Hash names, emails and phone numbers in the local database the same way capture
+    does, so replayed exact lookups (email, phone) find the same rows.
+    Returns (True, counts) or (False, error).
+    """
+    if not CAPTURE_KEY:
+        return False, NO_KEY_ERROR
+    conn, error = create_connection(lane=None)
+    if conn is None:
+        return False, error
+    cursor = None
+    counts = {}
+    try:
+        cursor = conn.cursor()
+        for table, pk, columns in (("Customer", "customer_id", ("first_name", "last_name", "email")),
+                                   ("Employee", "employee_id", ("first_name", "last_name", "phone_number"))):
+            cursor.execute(f"SELECT {pk}, {', '.join(columns)} FROM {table}")
+            rows = cursor.fetchall()
+            sql = f"UPDATE {table} SET {', '.join(f'{c} = %s' for c in columns)} WHERE {pk} = %s"
+            for start in range(0, len(rows), chunk_size):
+                cursor.executemany(sql, [
+                    [hash_pii(PII_COLUMNS[c], value) for c, value in zip(columns, row[1:])] + [row[0]]
+                    for row in rows[start:start + chunk_size]])
+                conn.commit()
+            counts[table] = len(rows)
+        return True, counts
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+# ---------- Replay ----------
+
+def load_capture(path):
+    """Captured records grouped into sessions: list of (first timestamp, [records]), oldest first."""
+    sessions = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                sessions.setdefault(record["s"], []).append(record)
+    return sorted(((records[0]["t"], records) for records in sessions.values()), key=lambda s: s[0])
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def replay(path, speed=1.0, concurrency=DEFAULT_CONCURRENCY, label=None):
+    """
+    Re-run a capture against the local database. speed: 1 = as captured, 4 = four
+    times faster, None = as fast as possible. Returns (True, results) or (False, error).
+    """
+    queries = load_queries("db/queries.sql")
+    sessions = load_capture(path)
+    if not sessions:
+        return False, f"No queries in {path}."
+
+    conns = []
+    for _ in range(concurrency):
+        conn, error = create_connection(lane=None)  # replay sizes its own concurrency
+        if conn is None:
+            for c in conns:
+                c.close()
+            return False, error
+        conns.append(conn)
+
+    first_ts = sessions[0][0]
+    started = time.perf_counter()
+    latencies = {}
+    errors = {}
+    stats_lock = threading.Lock()
+    free = list(conns)
+    free_lock = threading.Lock()
+
+    def run_session(session):
+        with free_lock:
+            conn = free.pop()
+        cursor = conn.cursor(buffered=True)
+        try:
+            conn.start_transaction()
+            for record in session[1]:
+                if speed:
+                    delay = (record["t"] - first_ts) / speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                sql = queries.get(record["q"])
+                t0 = time.perf_counter()
+                try:
+                    if sql is None:
+                        raise KeyError(f"Query '{record['q']}' not in this build")
+                    cursor.execute(sql + record.get("x", ""), record["p"])
+                    if cursor.with_rows:
+                        cursor.fetchall()
+                    ms = (time.perf_counter() - t0) * 1000
+                    with stats_lock:
+                        latencies.setdefault(record["q"], []).append(ms)
+                except Exception as e:
+                    with stats_lock:
+                        errors.setdefault(record["q"], {}).setdefault(str(e)[:120], 0)
+                        errors[record["q"]][str(e)[:120]] += 1
+        finally:
+            try:
+                conn.rollback()
+            finally:
+                cursor.close()
+                with free_lock:
+                    free.append(conn)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(run_session, sessions))
+    finally:
+        for conn in conns:
+            conn.close()
+
+    seconds = time.perf_counter() - started
+    results = {"label": label or os.path.basename(path), "capture": path, "speed": speed,
+               "concurrency": concurrency, "seconds": seconds, "queries": {}}
+    for name in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(name, []))
+        results["queries"][name] = {
+            "count": len(values),
+            "errors": sum(errors.get(name, {}).values()),
+            "error_messages": errors.get(name, {}),
+            "p50_ms": _percentile(values, 0.50),
+            "p95_ms": _percentile(values, 0.95),
+            "p99_ms": _percentile(values, 0.99),
+            "latencies_ms": [round(v, 3) for v in values],
+        }
+    return True, results
+
+
+def format_results(results):
+    lines = [f"{results['label']}: {sum(q['count'] for q in results['queries'].values())} queries in "
+             f"{results['seconds']:.1f}s (speed {results['speed'] or 'max'}, {results['concurrency']} workers)",
+             f"  {'query':<40}{'count':>7}{'errors':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+    for name, q in results["queries"].items():
+        lines.append(f"  {name:<40}{q['count']:>7}{q['errors']:>7}{q['p50_ms']:>9.2f}{q['p95_ms']:>9.2f}"
+                     f"{q['p99_ms']:>9.2f}")
+    return "\n".join(lines)
+
+
+def compare(before, after):
+    """Text table of p50/p95/p99 per query for two replay results. Returns (no regressions?, text)."""
+    lines = [f"{'query':<40}{'p50 before':>11}{'after':>9}{'p95 before':>11}{'after':>9}{'change':>9}"]
+    regressions = []
+    for name in sorted(set(before["queries"]) | set(after["queries"])):
+        a = before["queries"].get(name)
+        b = after["queries"].get(name)
+        if a is None or b is None:
+            lines.append(f"{name:<40}  only in {'after' if a is None else 'before'}")
+            continue
+        change = (b["p95_ms"] / a["p95_ms"] - 1) if a["p95_ms"] else 0.0
+        flag = ""
+        if (b["p95_ms"] > a["p95_ms"] * REGRESSION_FACTOR
+                and min(a["count"], b["count"]) >= MIN_SAMPLES):
+            flag = "  SLOWER"
+            regressions.append(name)
+        if b["errors"] > a["errors"]:
+            flag += f"  +{b['errors'] - a['errors']} errors"
+        lines.append(f"{name:<40}{a['p50_ms']:>11.2f}{b['p50_ms']:>9.2f}{a['p95_ms']:>11.2f}{b['p95_ms']:>9.2f}"
+                     f"{change:>+9.0%}{flag}")
+    lines.append(f"{len(regressions)} queries slower at p95." if regressions else "No p95 regressions.")
+    return not regressions, "\n".join(lines)
+
+
+def _speed(text):
+    return None if text == "max" else float(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured queries and compare latencies.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("anonymize", help="hash PII in the local database like capture does")
+    p_replay = sub.add_parser("replay", help="re-run a capture against the local database")
+    p_replay.add_argument("capture")
+    p_replay.add_argument("--speed", type=_speed, default=1.0, help="1, 2, 10, ... or max")
+    p_replay.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    p_replay.add_argument("--label")
+    p_replay.add_argument("--out", help="save results (JSON) for compare")
+    p_compare = sub.add_parser("compare", help="compare two saved replay results")
+    p_compare.add_argument("before")
+    p_compare.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.before) as f_before, open(args.after) as f_after:
+            success, text = compare(json.load(f_before), json.load(f_after))
+        print(text)
+        sys.exit(0 if success else 1)
+
+    from app.load_test import _check_local
+    success, error = _check_local()
+    if not success:
+        print(error)
+        sys.exit(1)
+
+    if args.command == "anonymize":
+        success, result = anonymize()
+        print(result if not success else ", ".join(f"{table}: {n} rows" for table, n in result.items()))
+    else:
+        success, result = replay(args.capture, args.speed, args.concurrency, args.label)
+        if success:
+            if args.out:
+                with open(args.out, "w") as f:
+                    json.dump(result, f)
+            result = format_results(result)
+        print(result)
+    sys.exit(0 if success else 1)
@@ -1,14 +1,75 @@
-
 # app/query_loader.py
 # This file loads the SQL queries into the Python app logic (.py) files
+#
+# Each query starts with "-- name: <name>". Optional lines right under it:
+#   -- class: interactive | report | batch     (default interactive)
+#   -- timeout: 300ms | 5s | none              (default: the class's budget below)
+# A SELECT with a time budget gets a /*+ MAX_EXECUTION_TIME(ms) */ hint, so MySQL
+# itself stops it when the budget runs out (app/db_connect.py turns that into a
+# clean "took too long" error). MySQL only supports the hint on SELECT, so a
+# timeout on any other statement is an error in queries.sql.
 
-def load_queries(path="db/queries.sql"):
-    queries = {}
+import re
+from dataclasses import dataclass
+
+# Default time budget per class of query, in milliseconds (None = no limit)
+#   interactive - a clerk is waiting on the screen
+#   report      - reports and heavier lookups, allowed to take a while but not forever
+#   batch       - exports and background jobs that scan whole tables on purpose
+CLASS_TIMEOUTS_MS = {"interactive": 2000, "report": 30000, "batch": None}
+DEFAULT_CLASS = "interactive"
+
+_SELECT = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+
+
+@dataclass
+class QueryInfo:
+    name: str
+    sql: str                 # with the MAX_EXECUTION_TIME hint, if any
+    query_class: str
+    timeout_ms: int = None
+
+
+def parse_timeout(text):
+    """'300ms' / '5s' / 'none' -> milliseconds or None."""
+    text = text.strip().lower()
+    if text == "none":
+        return None
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*(ms|s)", text)
+    if not match:
+        raise ValueError(f"Bad timeout '{text}' (use e.g. 300ms, 5s or none)")
+    value, unit = float(match.group(1)), match.group(2)
+    return int(value if unit == "ms" else value * 1000)
+
+
+def _finish(name, lines, meta):
+    sql = "".join(lines).strip()
+    query_class = meta.get("class", DEFAULT_CLASS)
+    if query_class not in CLASS_TIMEOUTS_MS:
+        raise ValueError(f"Query '{name}': unknown class '{query_class}'")
+
+    if "timeout" in meta:
+        timeout_ms = parse_timeout(meta["timeout"])
+        if timeout_ms is not None and not _SELECT.match(sql):
+            raise ValueError(f"Query '{name}': MySQL can only time out SELECT statements")
+    else:
+        # Class default, for SELECTs only
+        timeout_ms = CLASS_TIMEOUTS_MS[query_class] if _SELECT.match(sql) else None
+
+    if timeout_ms is not None:
+        sql = _SELECT.sub(f"SELECT /*+ MAX_EXECUTION_TIME({timeout_ms}) */", sql, count=1)
+    return QueryInfo(name, sql, query_class, timeout_ms)
+
+
+def load_query_info(path="db/queries.sql"):
+    """{name: QueryInfo} for every named query in the file."""
+    infos = {}
     with open(path, "r") as file:
         lines = file.readlines()
 
     current_name = None
     current_query = []
+    meta = {}
 
     for line in lines:
         stripped = line.strip()
@@ -16,9 +77,14 @@ def load_queries(path="db/queries.sql"):
         # Start of a named query
         if stripped.startswith("-- name:"):
             if current_name:
-                queries[current_name] = "".join(current_query).strip()
+                infos[current_name] = _finish(current_name, current_query, meta)
                 current_query = []
+                meta = {}
             current_name = stripped.split("-- name:")[1].strip()
+        # Query metadata (only before the SQL starts)
+        elif current_name and not current_query and re.match(r"--\s*(class|timeout):", stripped):
+            key, value = stripped[2:].split(":", 1)
+            meta[key.strip()] = value.strip()
         # Skip all other comments
         elif stripped.startswith("--"):
             continue
@@ -28,6 +94,34 @@ def load_queries(path="db/queries.sql"):
 
     # Add the final query if any
     if current_name:
-        queries[current_name] = "".join(current_query).strip()
+        infos[current_name] = _finish(current_name, current_query, meta)
+
+    return infos
+
+
+def load_queries(path="db/queries.sql"):
+    """{name: SQL} for every named query (SELECTs include their time budget hint)."""
+    return {name: info.sql for name, info in load_query_info(path).items()}
+
+
+def queries_by_sql(queries):
+    """
+    Reverse of load_queries(): {SQL: name}. Statements built by appending to a named
+    query (e.g. filter_books) don't match exactly; see find_query_name().
+    """
+    return {sql: name for name, sql in queries.items()}
+
 
-    return queries
\ No newline at end of file
+def find_query_name(sql, by_sql, queries):
+    """(name, appended text) for a statement run from a named query, or (None, None)."""
+    name = by_sql.get(sql)
+    if name is not None:
+        return name, ""
+    # Built from a named query: the longest query the statement starts with
+    best = None
+    for candidate, text in queries.items():
+        if sql.startswith(text) and (best is None or len(text) > len(queries[best])):
+            best = candidate
+    if best is None:
+        return None, None
+    return best, sql[len(queries[best]):]
@@ -0,0 +1,111 @@
+# app/report_logic.py
+# Sales reports and customer order history.
+#
+# Recent orders live in `Order` (hot), old ones in Order_Archive (cold, see
+# app/archive_logic.py). Every function here always reads the hot tables and
+# only reads the cold ones when the requested date range reaches back far enough.
+
+from datetime import datetime
+
+from app.db_connect import create_connection_for
+from app.query_loader import load_queries
+from app.archive_logic import needs_archive
+
+queries = load_queries("db/queries.sql")
+
+# Used when the caller leaves a date open ("all time")
+EARLIEST_DATE = datetime(1000, 1, 1)
+LATEST_DATE = datetime(9999, 12, 31)
+
+
+def sales_summary_by_day(start_date=None, end_date=None):
+    """
+    Totals per day for orders with start_date <= order_date < end_date.
+    Returns (True, list of dicts sorted by day) or (False, message).
+    """
+    conn, error = create_connection_for("report_sales_by_day")
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        params = (start_date or EARLIEST_DATE, end_date or LATEST_DATE)
+
+        sql_names = ["report_sales_by_day"]
+        if needs_archive(cursor, start_date):
+            sql_names.append("report_sales_by_day_archive")
+
+        days = {}
+        for name in sql_names:
+            sql = queries.get(name)
+            if not sql:
+                return False, f"Query '{name}' not found."
+            cursor.execute(sql, params)
+
+            # A day can appear in both stores while an archive run is in progress
+            for day, orders, total, credit_used, paid in cursor.fetchall():
+                row = days.setdefault(day, {"day": day, "orders": 0, "total_amount": 0,
+                                            "store_credit_used": 0, "final_amount_paid": 0})
+                row["orders"] += orders
+                row["total_amount"] += total or 0
+                row["store_credit_used"] += credit_used or 0
+                row["final_amount_paid"] += paid or 0
+
+        return True, [days[day] for day in sorted(days)]
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def customer_order_history(customer_id, start_date=None, end_date=None):
+    """
+    A customer's orders, newest first, for start_date <= order_date < end_date.
+    Returns (True, list of dicts) or (False, message).
+    """
+    conn, error = create_connection_for("lookup_customer_order_history")
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        params = (customer_id, start_date or EARLIEST_DATE, end_date or LATEST_DATE)
+
+        sql_names = ["lookup_customer_order_history"]
+        if needs_archive(cursor, start_date):
+            sql_names.append("lookup_customer_order_history_archive")
+
+        orders = []
+        for name in sql_names:
+            sql = queries.get(name)
+            if not sql:
+                return False, f"Query '{name}' not found."
+            cursor.execute(sql, params)
+
+            for order_id, order_date, total, credit_used, paid, item_count in cursor.fetchall():
+                orders.append({
+                    "order_id": order_id,
+                    "order_date": order_date,
+                    "total_amount": total,
+                    "store_credit_used": credit_used,
+                    "final_amount_paid": paid,
+                    "items": item_count,
+                    "archived": name.endswith("_archive"),
+                })
+
+        orders.sort(key=lambda o: o["order_date"], reverse=True)
+        return True, orders
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
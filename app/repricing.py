@@ -0,0 +1,245 @@
+# app/repricing.py
+# Bulk repricing of stale stock, with a price history.
+#
+# Rules live in db/repricing_rules.json. Each rule discounts available books that
+# have been in stock for at least min_age_days, optionally only for some
+# conditions or a rating band:
+#   {"name": "stale-90-days", "min_age_days": 90, "discount_percent": 20,
+#    "conditions": ["Fair", "Poor"], "min_rating": 1.0, "max_rating": 3.0}
+# A price never drops below what we paid (purchase_price), and each rule discounts
+# a given book only once, so running the job every night is safe.
+#
+#   python -m app.repricing preview            (counts only; plain reads, no locks)
+#   python -m app.repricing apply [--chunk-size 1000]
+#   python -m app.repricing history BOOK_ID
+#
+# New prices are computed in SQL. Apply works through the table by book_id range;
+# every chunk writes its Price_History rows and updates the prices from them in one
+# short transaction, so the tills are never blocked for long.
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from app.db_connect import create_connection
+from app.lanes import BACKGROUND
+from app.query_loader import load_queries
+
+queries = load_queries("db/queries.sql")
+
+RULES_PATH = "db/repricing_rules.json"
+
+
+def load_rules(path=RULES_PATH):
+    """Read and check the rules file. Returns (True, list of rules) or (False, error)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+    except (OSError, ValueError) as e:
+        return False, f"Could not read {path}: {e}"
+
+    names = set()
+    for i, rule in enumerate(rules, start=1):
+        name = rule.get("name")
+        if not name or len(name) > 50:
+            return False, f"Rule {i} needs a name (up to 50 characters)."
+        if name in names:
+            return False, f"Two rules are called '{name}'."
+        names.add(name)
+        try:
+            percent = Decimal(str(rule["discount_percent"]))
+            int(rule["min_age_days"])
+            for band in ("min_rating", "max_rating"):
+                if rule.get(band) is not None:
+                    Decimal(str(rule[band]))
+        except (KeyError, InvalidOperation, TypeError, ValueError):
+            return False, f"Rule '{name}' needs a numeric discount_percent and min_age_days."
+        if not 0 < percent < 100:
+            return False, f"Rule '{name}': discount_percent must be between 0 and 100."
+    return True, rules
+
+
+def _rule_params(rule):
+    """(price multiplier, intake cutoff) for a rule."""
+    multiplier = (Decimal(100) - Decimal(str(rule["discount_percent"]))) / Decimal(100)
+    cutoff = datetime.now() - timedelta(days=int(rule["min_age_days"]))
+    return multiplier, cutoff
+
+
+def _rule_conditions(rule):
+    """Extra "AND ..." SQL and params for a rule's condition list and rating band."""
+    clauses = []
+    params = []
+    if rule.get("conditions"):
+        clauses.append("b.book_Condition IN (" + ", ".join(["%s"] * len(rule["conditions"])) + ")")
+        params.extend(rule["conditions"])
+    if rule.get("min_rating") is not None:
+        clauses.append("b.average_Ratings >= %s")
+        params.append(Decimal(str(rule["min_rating"])))
+    if rule.get("max_rating") is not None:
+        clauses.append("b.average_Ratings < %s")
+        params.append(Decimal(str(rule["max_rating"])))
+    sql = "".join(f" AND {clause}" for clause in clauses)
+    return sql, params
+
+
+def preview(rules):
+    """
+    How many books each rule would discount now, and by how much in total.
+    Uses plain SELECTs, which InnoDB answers from a snapshot without locking rows.
+    Returns (True, [{"rule", "books", "total_discount"}]) or (False, error).
+    """
+    sql_preview = queries.get("reprice_preview")
+    if not sql_preview:
+        return False, "Query 'reprice_preview' not found."
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        results = []
+        for rule in rules:
+            multiplier, cutoff = _rule_params(rule)
+            extra_sql, extra_params = _rule_conditions(rule)
+            cursor.execute(sql_preview + extra_sql,
+                           (multiplier, cutoff, multiplier, rule["name"], *extra_params))
+            books, total_discount = cursor.fetchone()
+            results.append({"rule": rule["name"], "books": books, "total_discount": total_discount})
+        return True, results
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def apply(rules, chunk_size=1000, sleep_seconds=0.05):
+    """
+    Apply the rules in order (a later rule sees the prices set by an earlier one).
+    Returns (True, {"run_id": ..., "changed": {rule name: books repriced}}) or (False, error).
+    """
+    names = ["reprice_record_chunk", "reprice_apply_chunk", "reprice_book_id_range"]
+    sql = {name: queries.get(name) for name in names}
+    missing = [name for name, text in sql.items() if not text]
+    if missing:
+        return False, f"Query '{missing[0]}' not found."
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    run_id = uuid.uuid4().hex
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql["reprice_book_id_range"])
+        first_id, last_id = cursor.fetchone()
+        changed = {rule["name"]: 0 for rule in rules}
+        if first_id is None:
+            return True, {"run_id": run_id, "changed": changed}
+
+        for rule in rules:
+            multiplier, cutoff = _rule_params(rule)
+            extra_sql, extra_params = _rule_conditions(rule)
+
+            for lo in range(first_id, last_id + 1, chunk_size):
+                hi = lo + chunk_size - 1
+                # History first (it records the old price), then set the prices from it
+                cursor.execute(sql["reprice_record_chunk"] + extra_sql,
+                               (run_id, multiplier, rule["name"], lo, hi, cutoff, multiplier, rule["name"],
+                                *extra_params))
+                if cursor.rowcount:
+                    cursor.execute(sql["reprice_apply_chunk"], (run_id, rule["name"], lo, hi))
+                    changed[rule["name"]] += cursor.rowcount
+                conn.commit()
+                if sleep_seconds:
+                    time.sleep(sleep_seconds)
+
+        return True, {"run_id": run_id, "changed": changed}
+
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def price_history(book_id):
+    """Returns (True, [(changed_at, old_price, new_price, reason)]) or (False, error)."""
+    sql_history = queries.get("fetch_price_history")
+    if not sql_history:
+        return False, "Query 'fetch_price_history' not found."
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql_history, (book_id,))
+        return True, cursor.fetchall()
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discount stale stock by rules.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for command in ("preview", "apply"):
+        p = sub.add_parser(command)
+        p.add_argument("--rules", default=RULES_PATH)
+        if command == "apply":
+            p.add_argument("--chunk-size", type=int, default=1000, help="book_id range per transaction")
+    p_history = sub.add_parser("history")
+    p_history.add_argument("book_id", type=int)
+    args = parser.parse_args()
+
+    if args.command == "history":
+        success, result = price_history(args.book_id)
+        if not success:
+            print(f"Failed: {result}")
+            sys.exit(1)
+        for changed_at, old_price, new_price, reason in result:
+            print(f"{changed_at:%Y-%m-%d %H:%M}  ${old_price:.2f} -> ${new_price:.2f}  ({reason})")
+        if not result:
+            print("No price changes for this book.")
+        sys.exit(0)
+
+    success, rules = load_rules(args.rules)
+    if not success:
+        print(rules)
+        sys.exit(1)
+
+    if args.command == "preview":
+        success, result = preview(rules)
+        if not success:
+            print(f"Preview failed: {result}")
+            sys.exit(1)
+        for row in result:
+            print(f"{row['rule']:<30} {row['books']:>7} books  ${row['total_discount']:.2f} off in total")
+    else:
+        success, result = apply(rules, args.chunk_size)
+        if not success:
+            print(f"Repricing failed: {result}")
+            sys.exit(1)
+        for name, count in result["changed"].items():
+            print(f"{name:<30} {count:>7} books repriced")
+        print(f"Run {result['run_id']}. Refresh the catalog snapshot: python -m app.catalog_snapshot export")
@@ -0,0 +1,370 @@
+# app/stocktake.py
+# Quarterly stocktake: compare the ISBNs scanned on the shelves with the Book table.
+#
+# Scans are streamed into the Stocktake_Scan staging table in batches (one round
+# trip per batch, not per book), then the comparison is done with two set-based
+# queries instead of a lookup per scan:
+#   missing     - copies marked available, but fewer copies were scanned
+#   unexpected  - more copies scanned than are marked available (the extra
+#                 copies are recorded as sold or missing, or were never recorded)
+#
+#   python -m app.stocktake load 2026-Q4 scans.txt     (one ISBN per line, "-" = stdin)
+#   python -m app.stocktake report 2026-Q4 [--csv logs/stocktake.csv]
+#   python -m app.stocktake fix 2026-Q4                (mark missing copies 'missing')
+#   python -m app.stocktake found 2026-Q4              ('missing' copies scanned again -> 'available')
+#   python -m app.stocktake clear 2026-Q4
+#
+# A scan can't tell which copy of an ISBN is gone, so "fix" marks the newest
+# available copies as missing, and "found" puts copies marked missing that were
+# scanned again back on sale. Sold/unknown books on the shelf are only reported:
+# they need a person to look at them.
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+from app.db_connect import create_connection
+from app.lanes import BACKGROUND
+from app.query_loader import load_queries
+from app.isbn import canonicalize_isbn
+
+queries = load_queries("db/queries.sql")
+
+INSERT_BATCH_SIZE = 1000
+
+
+def _get_queries(*names):
+    sql = {name: queries.get(name) for name in names}
+    missing = [name for name, text in sql.items() if not text]
+    if missing:
+        return False, f"Query '{missing[0]}' not found."
+    return True, sql
+
+
+def load_scans(stocktake, lines, batch_size=INSERT_BATCH_SIZE):
+    """
+    Canonicalize scanned ISBNs and insert them in batches.
+    Scans that aren't valid ISBNs are skipped and returned so they can be re-scanned.
+    Returns (True, {"loaded": n, "invalid": [(line number, text)]}) or (False, error).
+    """
+    success, sql = _get_queries("stocktake_insert_scan")
+    if not success:
+        return False, sql
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        loaded = 0
+        invalid = []
+        batch = []
+
+        for line_number, line in enumerate(lines, start=1):
+            text = line.strip()
+            if not text:
+                continue
+            ok, isbn = canonicalize_isbn(text)
+            if not ok:
+                invalid.append((line_number, text))
+                continue
+            batch.append((stocktake, isbn))
+            if len(batch) >= batch_size:
+                cursor.executemany(sql["stocktake_insert_scan"], batch)
+                conn.commit()
+                loaded += len(batch)
+                batch = []
+
+        if batch:
+            cursor.executemany(sql["stocktake_insert_scan"], batch)
+            conn.commit()
+            loaded += len(batch)
+
+        return True, {"loaded": loaded, "invalid": invalid}
+
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def reconcile(stocktake):
+    """
+    Compare the scans with the Book table.
+    Returns (True, {"scanned": n, "missing": [...], "unexpected": [...]}) where
+      missing    rows are {isbn, book_name, available, scanned, missing, book_ids}
+      unexpected rows are {isbn, book_name, scanned, available, sold, missing, extra, reason,
+                           missing_ids}
+    """
+    success, sql = _get_queries("stocktake_scan_count", "stocktake_missing", "stocktake_unexpected")
+    if not success:
+        return False, sql
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        # Room for the copy lists of ISBNs we hold many copies of
+        cursor.execute("SET SESSION group_concat_max_len = 1000000")
+
+        cursor.execute(sql["stocktake_scan_count"], (stocktake,))
+        (scanned_total,) = cursor.fetchone()
+        if not scanned_total:
+            return False, f"No scans loaded for stocktake '{stocktake}'."
+
+        cursor.execute(sql["stocktake_missing"], (stocktake,))
+        missing = []
+        for isbn, book_name, available, scanned, book_ids in cursor.fetchall():
+            missing.append({
+                "isbn": isbn,
+                "book_name": book_name,
+                "available": int(available),
+                "scanned": int(scanned),
+                "missing": int(available) - int(scanned),
+                "book_ids": [int(book_id) for book_id in book_ids.split(",")],  # newest first
+            })
+
+        cursor.execute(sql["stocktake_unexpected"], (stocktake, stocktake))
+        unexpected = []
+        for isbn, book_name, scanned, available, sold, missing_count, missing_ids in cursor.fetchall():
+            reasons = [label for label, count in (("marked missing", missing_count), ("marked sold", sold)) if count]
+            unexpected.append({
+                "isbn": isbn,
+                "book_name": book_name or "",
+                "scanned": int(scanned),
+                "available": int(available),
+                "sold": int(sold),
+                "missing": int(missing_count),
+                "extra": int(scanned) - int(available),
+                "reason": ", ".join(reasons) or "not in catalog",
+                "missing_ids": [int(book_id) for book_id in missing_ids.split(",")] if missing_ids else [],
+            })
+
+        return True, {"scanned": scanned_total, "missing": missing, "unexpected": unexpected}
+
+    except Exception as e:
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def write_report_csv(result, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["problem", "isbn", "book_name", "in_db_available", "scanned", "difference", "detail"])
+        for row in result["missing"]:
+            writer.writerow(["missing", row["isbn"], row["book_name"], row["available"], row["scanned"],
+                             row["missing"], " ".join(str(b) for b in row["book_ids"])])
+        for row in result["unexpected"]:
+            writer.writerow(["unexpected", row["isbn"], row["book_name"], row["available"], row["scanned"],
+                             row["extra"], row["reason"]])
+
+
+def mark_missing(stocktake, chunk_size=500, sleep_seconds=0.05):
+    """
+    Set book_status = 'missing' on available copies that weren't found on the shelves.
+    Each chunk is its own short transaction, so the tills keep working during the fix.
+    Returns (True, number of books marked) or (False, error).
+    """
+    success, result = reconcile(stocktake)
+    if not success:
+        return False, result
+
+    book_ids = []
+    for row in result["missing"]:
+        book_ids.extend(row["book_ids"][:row["missing"]])
+
+    success, sql = _get_queries("stocktake_mark_missing")
+    if not success:
+        return False, sql
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        marked = 0
+        for start in range(0, len(book_ids), chunk_size):
+            chunk = book_ids[start:start + chunk_size]
+            cursor.executemany(sql["stocktake_mark_missing"], [(book_id,) for book_id in chunk])
+            conn.commit()
+            # A copy sold since the report was made is skipped by the status check
+            marked += cursor.rowcount
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+        return True, marked
+
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def mark_found(stocktake, sleep_seconds=0.05):
+    """
+    Put copies marked 'missing' back to 'available' when they were scanned on the shelf
+    (at most as many per ISBN as the extra copies scanned).
+    Returns (True, number of books restored) or (False, error).
+    """
+    success, result = reconcile(stocktake)
+    if not success:
+        return False, result
+
+    book_ids = []
+    for row in result["unexpected"]:
+        book_ids.extend(row["missing_ids"][:row["extra"]])
+
+    success, sql = _get_queries("stocktake_mark_found")
+    if not success:
+        return False, sql
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        restored = 0
+        for start in range(0, len(book_ids), INSERT_BATCH_SIZE):
+            chunk = book_ids[start:start + INSERT_BATCH_SIZE]
+            cursor.executemany(sql["stocktake_mark_found"], [(book_id,) for book_id in chunk])
+            conn.commit()
+            restored += cursor.rowcount
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+        return True, restored
+
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def clear_scans(stocktake):
+    """Delete a stocktake's scans. Returns (True, rows deleted) or (False, error)."""
+    success, sql = _get_queries("stocktake_clear")
+    if not success:
+        return False, sql
+
+    conn, error = create_connection(lane=BACKGROUND)
+    if conn is None:
+        return False, error
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql["stocktake_clear"], (stocktake,))
+        conn.commit()
+        return True, cursor.rowcount
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quarterly stocktake against scanned shelf ISBNs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_load = sub.add_parser("load", help="load a file of scanned ISBNs")
+    p_load.add_argument("stocktake")
+    p_load.add_argument("file", help='one ISBN per line, "-" for stdin')
+
+    p_report = sub.add_parser("report", help="list missing and unexpected books")
+    p_report.add_argument("stocktake")
+    p_report.add_argument("--csv", help="also write the report to this CSV file")
+
+    p_fix = sub.add_parser("fix", help="mark missing copies as 'missing'")
+    p_fix.add_argument("stocktake")
+    p_fix.add_argument("--chunk-size", type=int, default=500)
+
+    p_found = sub.add_parser("found", help="put 'missing' copies that were scanned back to 'available'")
+    p_found.add_argument("stocktake")
+
+    p_clear = sub.add_parser("clear", help="delete a stocktake's scans")
+    p_clear.add_argument("stocktake")
+
+    args = parser.parse_args()
+
+    if args.command == "load":
+        if args.file == "-":
+            success, result = load_scans(args.stocktake, sys.stdin)
+        else:
+            with open(args.file, encoding="utf-8") as f:
+                success, result = load_scans(args.stocktake, f)
+        if not success:
+            print(f"Load failed: {result}")
+            sys.exit(1)
+        print(f"Loaded {result['loaded']} scans into stocktake '{args.stocktake}'.")
+        for line_number, text in result["invalid"]:
+            print(f"  line {line_number}: not a valid ISBN: {text}")
+
+    elif args.command == "report":
+        success, result = reconcile(args.stocktake)
+        if not success:
+            print(f"Report failed: {result}")
+            sys.exit(1)
+        total_missing = sum(row["missing"] for row in result["missing"])
+        total_extra = sum(row["extra"] for row in result["unexpected"])
+        print(f"{result['scanned']} books scanned.")
+        print(f"Missing from shelves: {total_missing} copies of {len(result['missing'])} ISBNs")
+        for row in result["missing"]:
+            print(f"  {row['isbn']}  {row['book_name'][:40]:<40} have {row['available']}, "
+                  f"scanned {row['scanned']}")
+        print(f"On shelves but not available in the DB: {total_extra} copies of {len(result['unexpected'])} ISBNs")
+        for row in result["unexpected"]:
+            print(f"  {row['isbn']}  {row['book_name'][:40]:<40} scanned {row['scanned']}, "
+                  f"available {row['available']} ({row['reason']})")
+        if args.csv:
+            write_report_csv(result, args.csv)
+            print(f"Report written to {args.csv}")
+
+    elif args.command == "fix":
+        success, result = mark_missing(args.stocktake, args.chunk_size)
+        if not success:
+            print(f"Fix failed: {result}")
+            sys.exit(1)
+        print(f"Marked {result} books as missing.")
+
+    elif args.command == "found":
+        success, result = mark_found(args.stocktake)
+        if not success:
+            print(f"Found failed: {result}")
+            sys.exit(1)
+        print(f"Put {result} missing books back on sale.")
+
+    else:
+        success, result = clear_scans(args.stocktake)
+        if not success:
+            print(f"Clear failed: {result}")
+            sys.exit(1)
+        print(f"Deleted {result} scans.")
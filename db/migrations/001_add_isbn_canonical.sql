@@ -0,0 +1,13 @@
+-- 001_add_isbn_canonical.sql
+-- Adds a single indexed ISBN-13 column that all lookups use,
+-- instead of "WHERE isbn = %s OR isbn_13 = %s".
+--
+-- After running this, fill the new column for existing books
+-- (validates checksums and converts ISBN-10 to ISBN-13):
+--   python -m app.isbn backfill
+
+USE used_bookstore_db;
+
+ALTER TABLE Book
+    ADD COLUMN isbn_canonical CHAR(13) NULL AFTER isbn_13,
+    ADD INDEX idx_book_isbn_canonical (isbn_canonical);
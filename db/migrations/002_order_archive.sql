@@ -0,0 +1,30 @@
+-- 002_order_archive.sql
+-- Date indexes on `Order` plus compressed archive tables for old orders.
+-- Old orders are moved by: python -m app.archive_logic --years 3
+
+USE used_bookstore_db;
+
+ALTER TABLE `Order`
+    ADD INDEX idx_order_date (order_date),
+    ADD INDEX idx_order_customer_date (customer_id, order_date);
+
+CREATE TABLE IF NOT EXISTS Order_Archive (
+    order_id INT UNSIGNED,
+    customer_id INT UNSIGNED,
+    employee_id INT UNSIGNED NOT NULL,
+    order_date DATETIME NOT NULL,
+    total_amount DECIMAL(10,2) NOT NULL,
+    store_credit_used DECIMAL(10,2) DEFAULT 0.00,
+    final_amount_paid DECIMAL(10,2) NOT NULL,
+    PRIMARY KEY (order_id),
+    INDEX idx_order_archive_date (order_date),
+    INDEX idx_order_archive_customer_date (customer_id, order_date)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE IF NOT EXISTS Order_Detail_Archive (
+    order_id INT UNSIGNED,
+    book_id INT UNSIGNED,
+    final_price DECIMAL(10,2) NOT NULL,
+    PRIMARY KEY (book_id),
+    INDEX idx_order_detail_archive_order (order_id)
+) ROW_FORMAT=COMPRESSED;
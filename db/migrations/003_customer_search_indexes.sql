@@ -0,0 +1,10 @@
+-- 003_customer_search_indexes.sql
+-- Indexes for customer search by name or email prefix, and exact email lookups.
+
+USE used_bookstore_db;
+
+ALTER TABLE Customer
+    ADD INDEX idx_customer_status_last_first (customer_status, last_name, first_name),
+    ADD INDEX idx_customer_status_first (customer_status, first_name),
+    ADD INDEX idx_customer_status_email (customer_status, email),
+    ADD INDEX idx_customer_email (email);
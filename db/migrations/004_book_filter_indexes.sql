@@ -0,0 +1,11 @@
+-- 004_book_filter_indexes.sql
+-- Composite indexes for the Browse Books filters (condition, language, price).
+-- Every filter includes book_status, so it leads each index; resale_price is last
+-- so results come back already sorted by price.
+
+USE used_bookstore_db;
+
+ALTER TABLE Book
+    ADD INDEX idx_book_filter_language (book_status, `language`, book_Condition, resale_price),
+    ADD INDEX idx_book_filter_condition (book_status, book_Condition, resale_price),
+    ADD INDEX idx_book_filter_price (book_status, resale_price);
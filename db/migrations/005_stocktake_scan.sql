@@ -0,0 +1,12 @@
+-- 005_stocktake_scan.sql
+-- Staging table for quarterly stocktakes: python -m app.stocktake load ...
+
+USE used_bookstore_db;
+
+CREATE TABLE IF NOT EXISTS Stocktake_Scan (
+    scan_id INT UNSIGNED AUTO_INCREMENT,
+    stocktake VARCHAR(20) NOT NULL,
+    isbn_canonical CHAR(13) NOT NULL,
+    PRIMARY KEY (scan_id),
+    INDEX idx_stocktake_isbn (stocktake, isbn_canonical)
+);
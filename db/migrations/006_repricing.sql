@@ -0,0 +1,30 @@
+-- 006_repricing.sql
+-- Intake date on Book plus a price history table for the repricing job
+-- (python -m app.repricing preview / apply).
+--
+-- Books already in the table get the date this migration runs, so the age rules
+-- only start discounting them once they have really been on the shelf that long.
+--
+-- Price_History.book_id is INT UNSIGNED with a foreign key to Book.book_id. On a database
+-- from before the ids were widened (book_id still SMALLINT), run
+-- python -m app.online_migration run FIRST, or MySQL rejects the foreign key.
+
+USE used_bookstore_db;
+
+ALTER TABLE Book
+    ADD COLUMN intake_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP AFTER book_status,
+    ADD INDEX idx_book_status_intake (book_status, intake_date);
+
+CREATE TABLE IF NOT EXISTS Price_History (
+    history_id INT UNSIGNED AUTO_INCREMENT,
+    run_id CHAR(32) NOT NULL,
+    book_id INT UNSIGNED NOT NULL,
+    old_price DECIMAL(8,2),
+    new_price DECIMAL(8,2) NOT NULL,
+    reason VARCHAR(50) NOT NULL,
+    changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (history_id),
+    INDEX idx_price_history_book (book_id, reason),
+    INDEX idx_price_history_run (run_id, book_id),
+    FOREIGN KEY (book_id) REFERENCES Book(book_id)
+);
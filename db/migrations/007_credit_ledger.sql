@@ -0,0 +1,33 @@
+-- 007_credit_ledger.sql
+-- Append-only store credit ledger. Customer.credit_total stays as the cached balance
+-- and is only ever changed with "credit_total = credit_total + delta" next to a ledger row.
+--
+-- Existing balances become one 'opening_balance' entry per customer, so the ledger
+-- and the balances agree from the start (check with: python -m app.credit_ledger reconcile).
+-- Run it with the tills closed, before starting the new version of the app.
+--
+-- Credit_Ledger.customer_id is INT UNSIGNED with a foreign key to Customer.customer_id. On a
+-- database from before the ids were widened (customer_id still SMALLINT), run
+-- python -m app.online_migration run FIRST, or MySQL rejects the foreign key.
+-- Safe to run again: customers that already have ledger entries get no second opening entry.
+
+USE used_bookstore_db;
+
+CREATE TABLE IF NOT EXISTS Credit_Ledger (
+    entry_id INT UNSIGNED AUTO_INCREMENT,
+    customer_id INT UNSIGNED NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    reason VARCHAR(20) NOT NULL,
+    order_id INT UNSIGNED NULL,
+    book_id INT UNSIGNED NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (entry_id),
+    INDEX idx_credit_ledger_customer (customer_id, entry_id),
+    FOREIGN KEY (customer_id) REFERENCES Customer(customer_id)
+);
+
+INSERT INTO Credit_Ledger (customer_id, amount, reason)
+SELECT c.customer_id, c.credit_total, 'opening_balance'
+FROM Customer c
+WHERE c.credit_total <> 0
+  AND NOT EXISTS (SELECT 1 FROM Credit_Ledger l WHERE l.customer_id = c.customer_id);
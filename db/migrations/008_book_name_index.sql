@@ -0,0 +1,6 @@
+-- 008_book_name_index.sql
+-- Title prefix search ("Search All Stores" by title). Run it in every shop's database.
+
+USE used_bookstore_db;
+
+ALTER TABLE Book ADD INDEX idx_book_name (book_Name);
@@ -1,4 +1,7 @@
 -- Query file
+-- Named queries start with "-- name:". Optional "-- class:" (interactive, report,
+-- batch) and "-- timeout:" lines right under the name set the query's time budget;
+-- see app/query_loader.py. SELECTs without them get the interactive budget (2s).
 -- Insert rows into table 'Customer'
 -- Author: Gonçalo Nascimento
 INSERT INTO Customer (customer_id, first_name, last_name, email)
@@ -32,24 +35,35 @@ SELECT 1 FROM Customer WHERE email = %s;
 
 -- name: add_book_and_credit_customer
 INSERT INTO Book (book_Name, author_Name, book_Condition, average_Ratings,
-                  isbn, isbn_13, `language`, num_pages,
+                  isbn, isbn_13, isbn_canonical, `language`, num_pages,
                   purchase_price, resale_price)
-VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
 
 -- name: fetch_credit_by_customer_id
+-- timeout: 500ms
 SELECT credit_total FROM Customer WHERE customer_id = %s;
 
+-- Store credit is only changed by adding a delta (never by writing back a balance
+-- read earlier), so two tills changing the same customer can't lose an update.
+-- Each change also gets a Credit_Ledger row in the same transaction.
 -- name: update_customer_credit_total
-UPDATE Customer SET credit_total = %s WHERE customer_id = %s;
+UPDATE Customer SET credit_total = credit_total + %s WHERE customer_id = %s;
+
+-- name: insert_credit_ledger_entry
+INSERT INTO Credit_Ledger (customer_id, amount, reason, order_id, book_id)
+VALUES (%s, %s, %s, %s, %s);
 
 
 -- name: lookup_customer_credit_by_email
+-- timeout: 500ms
 SELECT credit_total FROM Customer WHERE email = %s;
 
 -- name: search_book_by_isbn
-SELECT book_Name, author_Name, resale_price, book_status
+-- timeout: 500ms
+SELECT book_id, book_Name, author_Name, resale_price, book_status
 FROM Book
-WHERE isbn = %s OR isbn_13 = %s;
+WHERE isbn_canonical = %s
+ORDER BY book_status = 'available' DESC, book_id;
 
 -- name: mark_employee_as_terminated
 UPDATE Employee SET employee_status = 'terminated' WHERE employee_id = %s;
@@ -61,14 +75,17 @@ UPDATE Customer SET customer_status = 'inactive' WHERE customer_id = %s;
 
 -- Order Logic Code
 -- name: fetch_customer_by_id
+-- timeout: 500ms
 SELECT customer_id, first_name, last_name, credit_total
 FROM Customer
 WHERE customer_id = %s AND customer_status = 'active';
 
 -- name: search_book_by_isbn_for_order
+-- timeout: 500ms
 SELECT book_id, book_Name, author_Name, resale_price, book_status
 FROM Book
-WHERE isbn = %s OR isbn_13 = %s;
+WHERE isbn_canonical = %s
+ORDER BY book_status = 'available' DESC, book_id;
 
 -- name: validate_book_by_id
 SELECT book_id, book_Name, resale_price, book_status
@@ -86,5 +103,431 @@ VALUES (%s, %s, %s);
 -- name: mark_book_as_sold
 UPDATE Book SET book_status = 'sold' WHERE book_id = %s;
 
+-- Params: credit used, customer_id, credit used. Changes nothing if the balance is too low.
 -- name: update_customer_credit_after_order
-UPDATE Customer SET credit_total = %s WHERE customer_id = %s;
+UPDATE Customer SET credit_total = credit_total - %s WHERE customer_id = %s AND credit_total >= %s;
+
+-- name: export_catalog_snapshot
+-- class: batch
+SELECT book_id, book_Name, author_Name, isbn_canonical, resale_price, book_status
+FROM Book
+WHERE isbn_canonical IS NOT NULL;
+
+-- ISBN backfill (python -m app.isbn backfill)
+-- name: select_books_missing_canonical_isbn
+-- class: batch
+SELECT book_id, isbn, isbn_13
+FROM Book
+WHERE isbn_canonical IS NULL AND book_id > %s
+ORDER BY book_id
+LIMIT %s;
+
+-- name: set_book_canonical_isbn
+UPDATE Book SET isbn_canonical = %s WHERE book_id = %s;
+
+
+-- Order archiving (app/archive_logic.py)
+-- Orders older than the cutoff move from `Order`/Order_Detail to the archive tables.
+-- name: archive_select_order_chunk
+-- class: batch
+SELECT order_id FROM `Order` WHERE order_date < %s ORDER BY order_id LIMIT %s;
+
+-- name: archive_copy_orders
+INSERT INTO Order_Archive (order_id, customer_id, employee_id, order_date,
+                           total_amount, store_credit_used, final_amount_paid)
+SELECT order_id, customer_id, employee_id, order_date,
+       total_amount, store_credit_used, final_amount_paid
+FROM `Order`
+WHERE order_id BETWEEN %s AND %s AND order_date < %s;
+
+-- name: archive_copy_order_details
+INSERT INTO Order_Detail_Archive (order_id, book_id, final_price)
+SELECT d.order_id, d.book_id, d.final_price
+FROM Order_Detail d
+JOIN `Order` o ON o.order_id = d.order_id
+WHERE o.order_id BETWEEN %s AND %s AND o.order_date < %s;
+
+-- name: archive_delete_order_details
+DELETE d FROM Order_Detail d
+JOIN `Order` o ON o.order_id = d.order_id
+WHERE o.order_id BETWEEN %s AND %s AND o.order_date < %s;
+
+-- name: archive_delete_orders
+DELETE FROM `Order` WHERE order_id BETWEEN %s AND %s AND order_date < %s;
+
+-- name: fetch_archive_cutoff
+-- class: batch
+SELECT MAX(order_date) FROM Order_Archive;
+
+
+-- Reports and order history (app/report_logic.py)
+-- Each has a hot (`Order`) and cold (Order_Archive) version; the cold one
+-- is only run when the date range reaches back into archived orders.
+-- name: report_sales_by_day
+-- class: report
+SELECT DATE(order_date), COUNT(*), SUM(total_amount), SUM(store_credit_used), SUM(final_amount_paid)
+FROM `Order`
+WHERE order_date >= %s AND order_date < %s
+GROUP BY DATE(order_date);
+
+-- name: report_sales_by_day_archive
+-- class: report
+SELECT DATE(order_date), COUNT(*), SUM(total_amount), SUM(store_credit_used), SUM(final_amount_paid)
+FROM Order_Archive
+WHERE order_date >= %s AND order_date < %s
+GROUP BY DATE(order_date);
+
+-- name: lookup_customer_order_history
+-- class: report
+-- timeout: 5s
+SELECT o.order_id, o.order_date, o.total_amount, o.store_credit_used, o.final_amount_paid,
+       (SELECT COUNT(*) FROM Order_Detail d WHERE d.order_id = o.order_id)
+FROM `Order` o
+WHERE o.customer_id = %s AND o.order_date >= %s AND o.order_date < %s
+ORDER BY o.order_date DESC;
+
+-- name: lookup_customer_order_history_archive
+-- class: report
+-- timeout: 5s
+SELECT o.order_id, o.order_date, o.total_amount, o.store_credit_used, o.final_amount_paid,
+       (SELECT COUNT(*) FROM Order_Detail_Archive d WHERE d.order_id = o.order_id)
+FROM Order_Archive o
+WHERE o.customer_id = %s AND o.order_date >= %s AND o.order_date < %s
+ORDER BY o.order_date DESC;
+
+
+-- Streaming exports (app/export.py)
+-- name: export_orders
+-- class: batch
+SELECT o.order_id, o.order_date, o.customer_id, o.employee_id,
+       o.total_amount, o.store_credit_used, o.final_amount_paid,
+       d.book_id, b.isbn_canonical, b.book_Name, b.author_Name,
+       b.purchase_price, d.final_price
+FROM `Order` o
+JOIN Order_Detail d ON d.order_id = o.order_id
+JOIN Book b ON b.book_id = d.book_id
+WHERE o.order_date >= %s AND o.order_date < %s
+ORDER BY o.order_date;
+
+-- name: export_orders_archive
+-- class: batch
+SELECT o.order_id, o.order_date, o.customer_id, o.employee_id,
+       o.total_amount, o.store_credit_used, o.final_amount_paid,
+       d.book_id, b.isbn_canonical, b.book_Name, b.author_Name,
+       b.purchase_price, d.final_price
+FROM Order_Archive o
+JOIN Order_Detail_Archive d ON d.order_id = o.order_id
+LEFT JOIN Book b ON b.book_id = d.book_id
+WHERE o.order_date >= %s AND o.order_date < %s
+ORDER BY o.order_date;
+
+-- name: export_inventory
+-- class: batch
+SELECT book_id, isbn_canonical, isbn, book_Name, author_Name, book_Condition,
+       `language`, num_pages, average_Ratings, purchase_price, resale_price, book_status
+FROM Book
+WHERE (%s IS NULL OR book_status = %s);
+
+
+-- Customer search by name or email prefix (app/customer_logic.py, app/customer_search.py)
+-- Each branch is a range scan on one of the idx_customer_status_* indexes.
+-- name: search_customers_by_prefix
+-- timeout: 300ms
+SELECT customer_id, first_name, last_name, email
+FROM (
+    (SELECT customer_id, first_name, last_name, email FROM Customer
+     WHERE customer_status = 'active' AND last_name LIKE %s LIMIT %s)
+    UNION
+    (SELECT customer_id, first_name, last_name, email FROM Customer
+     WHERE customer_status = 'active' AND first_name LIKE %s LIMIT %s)
+    UNION
+    (SELECT customer_id, first_name, last_name, email FROM Customer
+     WHERE customer_status = 'active' AND email LIKE %s LIMIT %s)
+) matches
+ORDER BY last_name, first_name, customer_id
+LIMIT %s;
+
+-- name: select_active_customers_after
+-- class: batch
+SELECT customer_id, first_name, last_name, email
+FROM Customer
+WHERE customer_status = 'active' AND customer_id > %s
+ORDER BY customer_id
+LIMIT %s;
+
+-- Browse Books filters (app/book_logic.py)
+-- filter_books is the start of the query: book_logic.filter_books adds
+-- "AND ..." for each filter that is set, then ORDER BY and LIMIT.
+-- name: filter_books
+-- timeout: 1s
+SELECT book_id, book_Name, author_Name, book_Condition, `language`,
+       average_Ratings, resale_price, book_status
+FROM Book
+WHERE book_status = %s
+
+-- Facet counts for the filter panel: one row per (language, condition) pair.
+-- Params: status, min_price x2, max_price x2, min_rating x2 (NULL = no limit)
+-- name: book_facet_counts
+-- timeout: 1s
+SELECT `language`, book_Condition, COUNT(*)
+FROM Book
+WHERE book_status = %s
+  AND (%s IS NULL OR resale_price >= %s)
+  AND (%s IS NULL OR resale_price <= %s)
+  AND (%s IS NULL OR average_Ratings >= %s)
+GROUP BY `language`, book_Condition;
+
+-- Customer dedupe merge (app/customer_dedupe.py), all in one transaction
+-- name: dedupe_lock_customers
+SELECT customer_id, credit_total, customer_status
+FROM Customer
+WHERE customer_id IN (%s, %s)
+ORDER BY customer_id
+FOR UPDATE;
+
+-- name: dedupe_move_orders
+UPDATE `Order` SET customer_id = %s WHERE customer_id = %s;
+
+-- name: dedupe_move_archived_orders
+UPDATE Order_Archive SET customer_id = %s WHERE customer_id = %s;
+
+
+-- name: dedupe_retire_customer
+UPDATE Customer SET customer_status = 'merged' WHERE customer_id = %s;
+
+-- Stocktake (app/stocktake.py)
+-- name: stocktake_insert_scan
+INSERT INTO Stocktake_Scan (stocktake, isbn_canonical) VALUES (%s, %s);
+
+-- Available copies per ISBN where fewer copies were scanned than we think we have.
+-- name: stocktake_missing
+-- class: batch
+SELECT b.isbn_canonical, MAX(b.book_Name), COUNT(*), COALESCE(MAX(s.scanned), 0),
+       GROUP_CONCAT(b.book_id ORDER BY b.book_id DESC)
+FROM Book b
+LEFT JOIN (SELECT isbn_canonical, COUNT(*) AS scanned
+           FROM Stocktake_Scan WHERE stocktake = %s
+           GROUP BY isbn_canonical) s ON s.isbn_canonical = b.isbn_canonical
+WHERE b.book_status = 'available' AND b.isbn_canonical IS NOT NULL
+GROUP BY b.isbn_canonical
+HAVING COUNT(*) > COALESCE(MAX(s.scanned), 0)
+ORDER BY b.isbn_canonical;
+
+-- Scanned ISBNs with more copies on the shelf than available in the DB
+-- (the extra copies are recorded as sold, marked missing by an earlier fix,
+-- or not recorded at all). The last column lists the 'missing' copies.
+-- name: stocktake_unexpected
+-- class: batch
+SELECT s.isbn_canonical, b.book_name, s.scanned, COALESCE(b.available, 0), COALESCE(b.sold, 0),
+       COALESCE(b.missing, 0), b.missing_ids
+FROM (SELECT isbn_canonical, COUNT(*) AS scanned
+      FROM Stocktake_Scan WHERE stocktake = %s
+      GROUP BY isbn_canonical) s
+LEFT JOIN (SELECT isbn_canonical, MAX(book_Name) AS book_name,
+                  SUM(book_status = 'available') AS available, SUM(book_status = 'sold') AS sold,
+                  SUM(book_status = 'missing') AS missing,
+                  GROUP_CONCAT(CASE WHEN book_status = 'missing' THEN book_id END ORDER BY book_id) AS missing_ids
+           FROM Book
+           WHERE isbn_canonical IN (SELECT isbn_canonical FROM Stocktake_Scan WHERE stocktake = %s)
+           GROUP BY isbn_canonical) b ON b.isbn_canonical = s.isbn_canonical
+WHERE s.scanned > COALESCE(b.available, 0)
+ORDER BY s.isbn_canonical;
+
+-- name: stocktake_mark_missing
+UPDATE Book SET book_status = 'missing' WHERE book_id = %s AND book_status = 'available';
+
+-- A 'missing' copy that turned up on the shelf again
+-- name: stocktake_mark_found
+UPDATE Book SET book_status = 'available' WHERE book_id = %s AND book_status = 'missing';
+
+-- name: stocktake_scan_count
+-- class: batch
+SELECT COUNT(*) FROM Stocktake_Scan WHERE stocktake = %s;
+
+-- name: stocktake_clear
+DELETE FROM Stocktake_Scan WHERE stocktake = %s;
+
+-- Repricing (app/repricing.py)
+-- The first three are the start of the query: app/repricing.py adds "AND ..."
+-- for the rule's condition and rating limits.
+-- A rule only ever discounts a book once (the NOT EXISTS), and never below purchase_price.
+-- name: reprice_preview
+-- class: report
+SELECT COUNT(*), COALESCE(SUM(b.resale_price - GREATEST(b.purchase_price, ROUND(b.resale_price * %s, 2))), 0)
+FROM Book b
+WHERE b.book_status = 'available' AND b.intake_date < %s
+  AND GREATEST(b.purchase_price, ROUND(b.resale_price * %s, 2)) < b.resale_price
+  AND NOT EXISTS (SELECT 1 FROM Price_History h WHERE h.book_id = b.book_id AND h.reason = %s)
+
+-- name: reprice_record_chunk
+INSERT INTO Price_History (run_id, book_id, old_price, new_price, reason)
+SELECT %s, b.book_id, b.resale_price, GREATEST(b.purchase_price, ROUND(b.resale_price * %s, 2)), %s
+FROM Book b
+WHERE b.book_id BETWEEN %s AND %s
+  AND b.book_status = 'available' AND b.intake_date < %s
+  AND GREATEST(b.purchase_price, ROUND(b.resale_price * %s, 2)) < b.resale_price
+  AND NOT EXISTS (SELECT 1 FROM Price_History h WHERE h.book_id = b.book_id AND h.reason = %s)
+
+-- name: reprice_apply_chunk
+UPDATE Book b
+JOIN Price_History h ON h.book_id = b.book_id
+SET b.resale_price = h.new_price
+WHERE h.run_id = %s AND h.reason = %s AND b.book_id BETWEEN %s AND %s
+  AND b.resale_price = h.old_price;
+
+-- name: reprice_book_id_range
+-- class: batch
+SELECT MIN(book_id), MAX(book_id) FROM Book WHERE book_status = 'available';
+
+-- name: fetch_price_history
+-- class: report
+SELECT changed_at, old_price, new_price, reason
+FROM Price_History
+WHERE book_id = %s
+ORDER BY changed_at, history_id;
+
+-- Credit ledger (app/credit_ledger.py)
+-- name: credit_customer_id_range
+-- class: batch
+SELECT MIN(customer_id), MAX(customer_id) FROM Customer;
+
+-- Customers in an id range whose cached balance doesn't match their ledger.
+-- One statement, so both sides come from the same consistent snapshot.
+-- name: credit_reconcile_chunk
+-- class: batch
+SELECT c.customer_id, c.credit_total, COALESCE(l.total, 0) AS ledger_total, COALESCE(l.entries, 0) AS entries
+FROM Customer c
+LEFT JOIN (SELECT customer_id, SUM(amount) AS total, COUNT(*) AS entries
+           FROM Credit_Ledger
+           WHERE customer_id BETWEEN %s AND %s
+           GROUP BY customer_id) l ON l.customer_id = c.customer_id
+WHERE c.customer_id BETWEEN %s AND %s
+  AND c.credit_total <> COALESCE(l.total, 0);
+
+-- name: fetch_credit_ledger
+-- class: report
+SELECT created_at, amount, reason, order_id, book_id
+FROM Credit_Ledger
+WHERE customer_id = %s
+ORDER BY entry_id;
+
+-- Data integrity scan (app/integrity.py). Each query covers one key range and takes
+-- (lo, hi) once per BETWEEN. Order ids are shared by `Order` and Order_Archive, and a
+-- sold book's detail row can be in Order_Detail or Order_Detail_Archive.
+-- name: integrity_book_id_range
+-- class: batch
+SELECT MIN(book_id), MAX(book_id) FROM Book;
+
+-- name: integrity_order_id_range
+-- class: batch
+SELECT MIN(lo), MAX(hi)
+FROM (SELECT MIN(order_id) AS lo, MAX(order_id) AS hi FROM `Order`
+      UNION ALL
+      SELECT MIN(order_id), MAX(order_id) FROM Order_Archive) ids;
+
+-- Fingerprints: a row count and a checksum of the columns the checks read, per table.
+-- Only primary key / index range reads, no joins. Same fingerprint = nothing to rescan.
+-- name: integrity_book_fingerprint
+-- class: batch
+SELECT (SELECT CONCAT(COUNT(*), ':', BIT_XOR(CRC32(CONCAT_WS(',', book_id, book_status))))
+        FROM Book WHERE book_id BETWEEN %s AND %s),
+       (SELECT CONCAT(COUNT(*), ':', BIT_XOR(CRC32(CONCAT_WS(',', book_id, order_id))))
+        FROM Order_Detail WHERE book_id BETWEEN %s AND %s),
+       (SELECT CONCAT(COUNT(*), ':', BIT_XOR(CRC32(CONCAT_WS(',', book_id, order_id))))
+        FROM Order_Detail_Archive WHERE book_id BETWEEN %s AND %s);
+
+-- name: integrity_order_fingerprint
+-- class: batch
+SELECT (SELECT CONCAT(COUNT(*), ':', BIT_XOR(CRC32(CONCAT_WS(',', order_id, total_amount,
+                                                             store_credit_used, final_amount_paid))))
+        FROM `Order` WHERE order_id BETWEEN %s AND %s),
+       (SELECT CONCAT(COUNT(*), ':', BIT_XOR(CRC32(CONCAT_WS(',', order_id, book_id, final_price))))
+        FROM Order_Detail WHERE order_id BETWEEN %s AND %s),
+       (SELECT CONCAT(COUNT(*), ':', BIT_XOR(CRC32(CONCAT_WS(',', order_id, total_amount,
+                                                             store_credit_used, final_amount_paid))))
+        FROM Order_Archive WHERE order_id BETWEEN %s AND %s),
+       (SELECT CONCAT(COUNT(*), ':', BIT_XOR(CRC32(CONCAT_WS(',', order_id, book_id, final_price))))
+        FROM Order_Detail_Archive WHERE order_id BETWEEN %s AND %s);
+
+-- The ledger is append-only, so its count and newest entry are enough
+-- name: integrity_customer_fingerprint
+-- class: batch
+SELECT (SELECT CONCAT(COUNT(*), ':', BIT_XOR(CRC32(CONCAT_WS(',', customer_id, credit_total))))
+        FROM Customer WHERE customer_id BETWEEN %s AND %s),
+       (SELECT CONCAT(COUNT(*), ':', COALESCE(MAX(entry_id), 0))
+        FROM Credit_Ledger WHERE customer_id BETWEEN %s AND %s);
+
+-- Books marked sold that aren't on any order, hot or archived
+-- name: integrity_sold_without_detail
+-- class: batch
+SELECT b.book_id, b.book_Name AS book_name
+FROM Book b
+WHERE b.book_id BETWEEN %s AND %s
+  AND b.book_status = 'sold'
+  AND NOT EXISTS (SELECT 1 FROM Order_Detail d WHERE d.book_id = b.book_id)
+  AND NOT EXISTS (SELECT 1 FROM Order_Detail_Archive a WHERE a.book_id = b.book_id);
+
+-- Books on an order that are still for sale
+-- name: integrity_detail_book_available
+-- class: batch
+SELECT d.book_id, d.order_id, 'Order_Detail' AS found_in
+FROM Order_Detail d
+JOIN Book b ON b.book_id = d.book_id
+WHERE d.book_id BETWEEN %s AND %s AND b.book_status = 'available'
+UNION ALL
+SELECT a.book_id, a.order_id, 'Order_Detail_Archive'
+FROM Order_Detail_Archive a
+JOIN Book b ON b.book_id = a.book_id
+WHERE a.book_id BETWEEN %s AND %s AND b.book_status = 'available';
+
+-- Orders whose total isn't the sum of their lines (or that have no lines at all)
+-- name: integrity_order_total_mismatch
+-- class: batch
+SELECT o.order_id, o.total_amount, COALESCE(d.total, 0) AS details_total,
+       COALESCE(d.line_count, 0) AS line_count, 'Order' AS found_in
+FROM `Order` o
+LEFT JOIN (SELECT order_id, SUM(final_price) AS total, COUNT(*) AS line_count
+           FROM Order_Detail
+           WHERE order_id BETWEEN %s AND %s
+           GROUP BY order_id) d ON d.order_id = o.order_id
+WHERE o.order_id BETWEEN %s AND %s
+  AND o.total_amount <> COALESCE(d.total, 0)
+UNION ALL
+SELECT o.order_id, o.total_amount, COALESCE(d.total, 0), COALESCE(d.line_count, 0), 'Order_Archive'
+FROM Order_Archive o
+LEFT JOIN (SELECT order_id, SUM(final_price) AS total, COUNT(*) AS line_count
+           FROM Order_Detail_Archive
+           WHERE order_id BETWEEN %s AND %s
+           GROUP BY order_id) d ON d.order_id = o.order_id
+WHERE o.order_id BETWEEN %s AND %s
+  AND o.total_amount <> COALESCE(d.total, 0);
+
+-- Orders where paid != total - credit used (never below zero), as complete_order works it out
+-- name: integrity_order_paid_mismatch
+-- class: batch
+SELECT order_id, total_amount, store_credit_used, final_amount_paid, 'Order' AS found_in
+FROM `Order`
+WHERE order_id BETWEEN %s AND %s
+  AND final_amount_paid <> GREATEST(0, total_amount - COALESCE(store_credit_used, 0))
+UNION ALL
+SELECT order_id, total_amount, store_credit_used, final_amount_paid, 'Order_Archive'
+FROM Order_Archive
+WHERE order_id BETWEEN %s AND %s
+  AND final_amount_paid <> GREATEST(0, total_amount - COALESCE(store_credit_used, 0));
+
+-- Cross-store search (book_logic.search_all_stores), run against every shop
+-- name: search_books_by_title
+-- timeout: 1s
+SELECT book_id, book_Name, author_Name, isbn_canonical, resale_price, book_status
+FROM Book
+WHERE book_Name LIKE %s
+ORDER BY book_Name, book_id
+LIMIT %s;
+
+-- name: search_books_by_isbn_all_copies
+-- timeout: 1s
+SELECT book_id, book_Name, author_Name, isbn_canonical, resale_price, book_status
+FROM Book
+WHERE isbn_canonical = %s
+ORDER BY book_status = 'available' DESC, book_id
+LIMIT %s;
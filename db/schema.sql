@@ -9,7 +9,7 @@ USE used_bookstore_db;
 -- 'Employee' Table creation
 -- Author: Gabriel Sosa
 CREATE TABLE Employee (
-    employee_id SMALLINT UNSIGNED AUTO_INCREMENT,
+    employee_id INT UNSIGNED AUTO_INCREMENT,
     first_name VARCHAR(15) NOT NULL,
     last_name VARCHAR(15) NOT NULL,
     phone_number VARCHAR(15) NOT NULL,
@@ -21,44 +21,60 @@ CREATE TABLE Employee (
 -- 'Customer' Table creation
 -- Author: Gonçalo Nascimento
 CREATE TABLE Customer(
-    customer_id SMALLINT UNSIGNED AUTO_INCREMENT,
+    customer_id INT UNSIGNED AUTO_INCREMENT,
     first_name VARCHAR(15) NOT NULL,
     last_name VARCHAR(15) NOT NULL,
     email VARCHAR(50) NOT NULL,
-    credit_total DECIMAL(6,2) NOT NULL DEFAULT 0.00 CHECK (credit_total >= 0),
+    credit_total DECIMAL(10,2) NOT NULL DEFAULT 0.00 CHECK (credit_total >= 0),
     customer_status VARCHAR(10) NOT NULL DEFAULT 'active',
-    PRIMARY KEY(customer_id)
+    PRIMARY KEY(customer_id),
+    -- Name/email prefix search (customer_logic.search_customers)
+    INDEX idx_customer_status_last_first (customer_status, last_name, first_name),
+    INDEX idx_customer_status_first (customer_status, first_name),
+    INDEX idx_customer_status_email (customer_status, email),
+    INDEX idx_customer_email (email)
 );
 
 -- 'Book' Table creation
 -- Auther: Dario Morlote
 CREATE TABLE Book (
-    book_id SMALLINT UNSIGNED AUTO_INCREMENT,
+    book_id INT UNSIGNED AUTO_INCREMENT,
     book_Name VARCHAR(100) NOT NULL,
     author_Name VARCHAR(20) NOT NULL,
     book_Condition VARCHAR(15),
     average_Ratings DECIMAL(3,2),
     isbn CHAR(10),
     isbn_13 CHAR(13),
+    isbn_canonical CHAR(13),   -- always ISBN-13, no hyphens (see app/isbn.py)
     `language` VARCHAR(30),
     num_pages INT,
     resale_price DECIMAL(8,2),
     purchase_price DECIMAL(8,2) NOT NULL,
     book_status VARCHAR(10) NOT NULL DEFAULT 'available',
-    PRIMARY KEY (book_id)
+    intake_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,   -- when we bought it (repricing by age)
+    PRIMARY KEY (book_id),
+    INDEX idx_book_isbn_canonical (isbn_canonical),
+    -- Browse Books filters (book_logic.filter_books), most specific combination first
+    INDEX idx_book_filter_language (book_status, `language`, book_Condition, resale_price),
+    INDEX idx_book_filter_condition (book_status, book_Condition, resale_price),
+    INDEX idx_book_filter_price (book_status, resale_price),
+    INDEX idx_book_status_intake (book_status, intake_date),
+    INDEX idx_book_name (book_Name)
 );
 
 -- `Order` Table creation
 -- Author: Danielle Maki
 CREATE TABLE `Order` (
     order_id INT UNSIGNED AUTO_INCREMENT,
-    customer_id SMALLINT UNSIGNED,
-    employee_id SMALLINT UNSIGNED NOT NULL,
+    customer_id INT UNSIGNED,
+    employee_id INT UNSIGNED NOT NULL,
     order_date DATETIME NOT NULL,
-    total_amount DECIMAL(6,2) NOT NULL CHECK (total_amount >= 0),
-    store_credit_used DECIMAL(6,2) DEFAULT 0.00 CHECK (store_credit_used >= 0),
-    final_amount_paid DECIMAL(6,2) NOT NULL CHECK (final_amount_paid >= 0) ,
+    total_amount DECIMAL(10,2) NOT NULL CHECK (total_amount >= 0),
+    store_credit_used DECIMAL(10,2) DEFAULT 0.00 CHECK (store_credit_used >= 0),
+    final_amount_paid DECIMAL(10,2) NOT NULL CHECK (final_amount_paid >= 0) ,
     PRIMARY KEY (order_id),
+    INDEX idx_order_date (order_date),
+    INDEX idx_order_customer_date (customer_id, order_date),
     FOREIGN KEY (customer_id) REFERENCES Customer(customer_id)
         ON DELETE SET NULL,
     FOREIGN KEY (employee_id) REFERENCES Employee(employee_id)
@@ -70,11 +86,76 @@ CREATE TABLE `Order` (
 -- Author: Danielle Maki
 CREATE TABLE Order_Detail (
     order_id INT UNSIGNED,
-    book_id SMALLINT UNSIGNED,
-    final_price DECIMAL(6,2) NOT NULL CHECK (final_price >= 0),
+    book_id INT UNSIGNED,
+    final_price DECIMAL(10,2) NOT NULL CHECK (final_price >= 0),
     PRIMARY KEY (book_id),
     FOREIGN KEY (order_id) REFERENCES `Order`(order_id)
         ON DELETE CASCADE,
     FOREIGN KEY (book_id) REFERENCES Book(book_id)
         ON DELETE RESTRICT
 );
+
+-- Archive tables for old orders (see app/archive_logic.py)
+-- MySQL can't partition tables that have foreign keys, so instead of
+-- partitioning `Order` by date, orders older than N years are moved here.
+-- No foreign keys: archived rows are history and never change.
+CREATE TABLE Order_Archive (
+    order_id INT UNSIGNED,
+    customer_id INT UNSIGNED,
+    employee_id INT UNSIGNED NOT NULL,
+    order_date DATETIME NOT NULL,
+    total_amount DECIMAL(10,2) NOT NULL,
+    store_credit_used DECIMAL(10,2) DEFAULT 0.00,
+    final_amount_paid DECIMAL(10,2) NOT NULL,
+    PRIMARY KEY (order_id),
+    INDEX idx_order_archive_date (order_date),
+    INDEX idx_order_archive_customer_date (customer_id, order_date)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE Order_Detail_Archive (
+    order_id INT UNSIGNED,
+    book_id INT UNSIGNED,
+    final_price DECIMAL(10,2) NOT NULL,
+    PRIMARY KEY (book_id),
+    INDEX idx_order_detail_archive_order (order_id)
+) ROW_FORMAT=COMPRESSED;
+
+-- Every change to a customer's store credit (app/credit_ledger.py).
+-- Append-only: Customer.credit_total is a cached balance, always SUM(amount) of these rows.
+CREATE TABLE Credit_Ledger (
+    entry_id INT UNSIGNED AUTO_INCREMENT,
+    customer_id INT UNSIGNED NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,        -- + credit given, - credit spent
+    reason VARCHAR(20) NOT NULL,          -- book_purchase, order, merge, adjustment, opening_balance
+    order_id INT UNSIGNED NULL,
+    book_id INT UNSIGNED NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (entry_id),
+    INDEX idx_credit_ledger_customer (customer_id, entry_id),
+    FOREIGN KEY (customer_id) REFERENCES Customer(customer_id)
+);
+
+-- Price changes made by the repricing job (app/repricing.py)
+CREATE TABLE Price_History (
+    history_id INT UNSIGNED AUTO_INCREMENT,
+    run_id CHAR(32) NOT NULL,             -- one repricing run
+    book_id INT UNSIGNED NOT NULL,
+    old_price DECIMAL(8,2),
+    new_price DECIMAL(8,2) NOT NULL,
+    reason VARCHAR(50) NOT NULL,          -- repricing rule name
+    changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (history_id),
+    INDEX idx_price_history_book (book_id, reason),
+    INDEX idx_price_history_run (run_id, book_id),
+    FOREIGN KEY (book_id) REFERENCES Book(book_id)
+);
+
+-- Stocktake scans (app/stocktake.py): one row per book scanned on the shelves.
+-- A staging table, not linked to Book, since scans can include books we never recorded.
+CREATE TABLE Stocktake_Scan (
+    scan_id INT UNSIGNED AUTO_INCREMENT,
+    stocktake VARCHAR(20) NOT NULL,      -- e.g. '2026-Q4'
+    isbn_canonical CHAR(13) NOT NULL,
+    PRIMARY KEY (scan_id),
+    INDEX idx_stocktake_isbn (stocktake, isbn_canonical)
+);
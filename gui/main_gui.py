@@ -1,8 +1,10 @@
 # gui/main_gui.py
 import tkinter as tk
 from tkinter import Frame, Button, Label
+import queue
 import sys
 import os
+import traceback
 
 # --- Setup Project Path ---
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,7 +15,34 @@ sys.path.append(project_root)
 # Now that the working directory and path are correct, these imports will work.
 # Import the new CustomerManagementView and OrderProcessingView
 from gui.views import BookSearchView, CustomerManagementView, BuyBookView, CreditLookUpView, EmployeeManagementView, \
-    OrderProcessingView
+    OrderProcessingView, BookFilterView
+
+# Change events (this till's writes + other tills over the LAN) are optional too
+try:
+    from app.events import subscribe
+    from app.live_sync import start_live_sync
+    from app.customer_search import preload_customer_index, apply_customer_event
+    from app.db_connect import note_write
+    EVENTS_AVAILABLE = True
+except ImportError:
+    EVENTS_AVAILABLE = False
+
+# Opt-in handler profiling (BOOKSTORE_PROFILE=1), see app/profiling.py
+try:
+    from app import profiling
+    PROFILING_ENABLED = profiling.ENABLED
+except ImportError:
+    PROFILING_ENABLED = False
+
+# Opt-in query capture for replay tests (BOOKSTORE_CAPTURE=1), see app/query_capture.py
+try:
+    from app import query_capture
+    CAPTURE_ENABLED = query_capture.ENABLED
+except ImportError:
+    CAPTURE_ENABLED = False
+
+# How often the GUI thread checks for change events (ms)
+CHANGE_POLL_MS = 200
 
 
 class Dashboard(tk.Tk):
@@ -51,11 +80,20 @@ class Dashboard(tk.Tk):
             "Process Order": OrderProcessingView,
             "Buy Book": BuyBookView,
             "Search Book": BookSearchView,
+            "Browse Books": BookFilterView,
             "Manage Customers": CustomerManagementView,
             "Look Up Credit": CreditLookUpView,
             "Manage Employees": EmployeeManagementView,
         }
 
+        # Profiling wraps the view classes, so it has to happen before they're created
+        if PROFILING_ENABLED:
+            profiling.enable_profiling(self.pages.values())
+        if CAPTURE_ENABLED:
+            success, result = query_capture.enable_capture()
+            if not success:
+                print(f"Query capture is off: {result}", file=sys.stderr)
+
         self.frames = {}
         for page_name, F in self.pages.items():
             frame = F(container)
@@ -74,6 +112,60 @@ class Dashboard(tk.Tk):
         # --- Initial Page ---
         self.show_welcome_message()
 
+        # --- Live refresh ---
+        # Events arrive on other threads; Tk widgets may only be touched from this one,
+        # so they go through a queue that is drained with after(). Each is queued with
+        # remote=True if it came from another till (live_sync), False if from this one.
+        self.change_events = queue.Queue()
+        self.live_sync = None
+        if EVENTS_AVAILABLE:
+            subscribe(None, lambda event: self.change_events.put((event, False)))
+            self.live_sync = start_live_sync(self.on_remote_event)
+            preload_customer_index()
+            self.after(CHANGE_POLL_MS, self.process_change_events)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_remote_event(self, event):
+        """
+        Another till changed something (live_sync thread). The replicas may not have that
+        write yet, so read from the primary for a while, as after our own writes;
+        otherwise the refresh below could show a just-sold book as available again.
+        """
+        note_write()
+        self.change_events.put((event, True))
+
+    def process_change_events(self):
+        """
+        Pass queued change events to every view that wants them. A handler that fails
+        is reported and skipped, so it can't stop live refresh for the other views or
+        the rest of the session.
+        """
+        try:
+            while True:
+                try:
+                    event, remote = self.change_events.get_nowait()
+                except queue.Empty:
+                    break
+                self.handle_change_event(apply_customer_event, event)
+                for frame in self.frames.values():
+                    if hasattr(frame, "on_change_event"):
+                        self.handle_change_event(frame.on_change_event, event, remote)
+        finally:
+            self.after(CHANGE_POLL_MS, self.process_change_events)
+
+    def handle_change_event(self, handler, event, *args):
+        try:
+            handler(event, *args)
+        except Exception:
+            print(f"Change event handler {handler!r} failed for {event!r}:", file=sys.stderr)
+            traceback.print_exc()
+
+    def on_close(self):
+        """Stop the live sync listener before closing the window."""
+        if self.live_sync:
+            self.live_sync.stop()
+        self.destroy()
+
     def navigate_to(self, page_name):
         """Raises the selected page frame to the top."""
         # Remove welcome message if it exists
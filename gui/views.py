@@ -6,7 +6,14 @@ from tkinter import messagebox, ttk
 
 # Try to import your backend logic functions, but make them optional for testing
 try:
-    from app.book_logic import search_book_by_isbn, add_book_and_credit_customer
+    from app.book_logic import (
+        search_book_by_isbn, add_book_and_credit_customer, filter_books, book_facets, search_all_stores
+    )
+    from app.catalog_snapshot import lookup_book_by_isbn, describe_age, MAX_FRESH_AGE_SECONDS
+    from app.isbn import resolve_book_isbns, canonicalize_isbn
+    from app.isbn_metadata import lookup_isbn_metadata
+    from app.events import BookAdded, BookSold, CreditChanged, CustomerDeactivated
+    from app.customer_search import find_customers
     from app.customer_logic import add_new_customer, lookup_customer_credit_by_email, mark_customer_as_inactive
     from app.employee_logic import add_new_employee, mark_employee_as_terminated
     from app.order_logic import (
@@ -29,6 +36,61 @@ def create_page_title(parent, text):
     return tk.Label(parent, text=text, font=("Arial", 20, "bold"), bg="#ecf0f1", fg="#2c3e50")
 
 
+class CustomerSearchBox(ttk.Combobox):
+    """
+    Customer ID box that also accepts part of a name or email: matching customers
+    show up in the drop-down list (press Down or click the arrow) as you type.
+    """
+
+    MIN_CHARS = 2
+    MAX_MATCHES = 15
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.matches = {}  # drop-down label -> customer_id
+        self.bind("<KeyRelease>", self.on_key)
+
+    def on_key(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab") or not BACKEND_AVAILABLE:
+            return
+        text = self.get().strip()
+        if len(text) < self.MIN_CHARS or text.isdigit():
+            self.matches = {}
+            self["values"] = ()
+            return
+
+        success, customers = find_customers(text, self.MAX_MATCHES)
+        if not success:
+            return
+        self.matches = {
+            f"{c['last_name']}, {c['first_name']} <{c['email']}> #{c['customer_id']}": c["customer_id"]
+            for c in customers
+        }
+        self["values"] = list(self.matches)
+
+    def resolve(self):
+        """
+        Work out which customer is meant: an ID, a picked suggestion, or text
+        that matches exactly one customer. Returns (True, customer_id) or (False, message).
+        """
+        text = self.get().strip()
+        if not text:
+            return False, "Please enter a customer ID, name or email."
+        if text.isdigit():
+            return True, int(text)
+        if text in self.matches:
+            return True, self.matches[text]
+
+        success, customers = find_customers(text, 2)
+        if not success:
+            return False, customers
+        if len(customers) == 1:
+            return True, customers[0]["customer_id"]
+        if not customers:
+            return False, f"No active customer matches '{text}'."
+        return False, f"More than one customer matches '{text}'. Pick one from the list."
+
+
 # --- Book-Related Views ---
 
 class BookSearchView(tk.Frame):
@@ -52,14 +114,43 @@ class BookSearchView(tk.Frame):
                                   bg="#3498db", fg="white", relief="flat", highlightthickness=0)
         search_button.grid(row=0, column=2, padx=10)
 
+        # Other shops: by ISBN or the start of a title
+        all_stores_button = tk.Button(input_frame, text="Search All Stores", command=self.perform_store_search,
+                                      font=("Arial", 12), bg="#8e44ad", fg="white", relief="flat",
+                                      highlightthickness=0)
+        all_stores_button.grid(row=0, column=3, padx=(0, 10))
+
         results_frame = tk.Frame(self, bg="white", relief="sunken", borderwidth=1)
         results_frame.pack(pady=20, padx=20, fill="x")
 
         tk.Label(results_frame, text="Search Results", font=("Arial", 14, "bold"), bg="white").pack(pady=10)
         self.result_text = tk.Label(results_frame, text="Enter an ISBN and click Search.", font=("Arial", 12),
-                                    bg="white", justify="left", wraplength=400)
+                                    bg="white", justify="left", wraplength=600)
         self.result_text.pack(pady=10, padx=10)
 
+        # Shows where the result came from (offline snapshot or live database)
+        self.source_label = tk.Label(results_frame, text="", font=("Arial", 10, "italic"), bg="white", fg="#7f8c8d")
+        self.source_label.pack(pady=(0, 10))
+
+        # The book currently on screen, so change events can refresh it
+        self.current_isbn = None
+        self.current_book_id = None
+
+        # Books changed since this view started: the snapshot is out of date for these
+        self.changed_book_ids = set()
+        self.changed_isbns = set()
+
+    def show_book(self, result, source_text, source_color="#7f8c8d"):
+        """Formats a found book and the freshness indicator for display."""
+        book_info = (
+            f"Book Name: {result['book_name']}\n\n"
+            f"Author: {result['author_name']}\n\n"
+            f"Price: ${result['resale_price']:.2f}\n\n"
+            f"Availability: {result['availability']}"
+        )
+        self.result_text.config(text=book_info, fg="black")
+        self.source_label.config(text=source_text, fg=source_color)
+
     def perform_search(self):
         """Handles the button click to search for a book by calling the backend."""
         isbn = self.isbn_entry.get().strip()
@@ -71,20 +162,239 @@ class BookSearchView(tk.Frame):
             self.result_text.config(text="Backend not available - this is a test", fg="orange")
             return
 
+        self.search(isbn)
+
+    def perform_store_search(self):
+        """Looks the ISBN or title up in every shop and lists the copies found."""
+        text = self.isbn_entry.get().strip()
+        if not text:
+            messagebox.showwarning("Input Error", "Please enter an ISBN or the start of a title.")
+            return
+
+        if not BACKEND_AVAILABLE:
+            self.result_text.config(text="Backend not available - this is a test", fg="orange")
+            return
+
+        success, result = search_all_stores(text)
+        if not success:
+            self.result_text.config(text=result, fg="red")
+            self.source_label.config(text="")
+            return
+
+        # Not one book any more, so change events have nothing to refresh
+        self.current_isbn = None
+        self.current_book_id = None
+
+        lines = [f"{book['store']}: {book['book_name']} by {book['author_name']} - "
+                 f"${book['resale_price']:.2f} ({book['availability']})"
+                 for book in result["results"]]
+        self.result_text.config(text="\n".join(lines) or "No copies found in any store.", fg="black")
+        self.source_label.config(
+            text="; ".join(f"{store}: {error}" for store, error in result["errors"].items()) or "All stores answered",
+            fg="#e67e22" if result["errors"] else "#7f8c8d")
+
+    def search(self, isbn, live_only=False):
+        """Looks up an ISBN and shows it (snapshot first unless live_only)."""
+        canonical_ok, canonical = canonicalize_isbn(isbn)
+        self.current_isbn = canonical if canonical_ok else None
+        self.current_book_id = None
+
+        # 1. Try the offline snapshot first, no DB round trip needed
+        snap_success, snap_result = lookup_book_by_isbn(isbn)
+        snapshot_usable = (snap_success and not live_only
+                           and snap_result["snapshot_age"] <= MAX_FRESH_AGE_SECONDS
+                           and snap_result["book_id"] not in self.changed_book_ids
+                           and self.current_isbn not in self.changed_isbns)
+        if snapshot_usable:
+            self.current_book_id = snap_result["book_id"]
+            self.show_book(snap_result, f"From offline snapshot ({describe_age(snap_result['snapshot_age'])})")
+            return
+
+        # 2. Fall back to the live query (snapshot missing, stale, or book changed since)
         success, result = search_book_by_isbn(isbn)
 
         if success:
-            # Format the successful result for display
-            book_info = (
-                f"Book Name: {result['book_name']}\n\n"
-                f"Author: {result['author_name']}\n\n"
-                f"Price: ${result['resale_price']:.2f}\n\n"
-                f"Availability: {result['availability']}"
-            )
-            self.result_text.config(text=book_info, fg="black")
+            self.current_book_id = result["book_id"]
+            self.show_book(result, "From live database")
+        elif snap_success and not result.startswith("No book found"):
+            # DB is unreachable, a stale snapshot is better than nothing
+            self.show_book(snap_result,
+                           f"Database unavailable - from offline snapshot ({describe_age(snap_result['snapshot_age'])})",
+                           "#e67e22")
         else:
             # Display the error message from the backend (e.g., "No book found...")
             self.result_text.config(text=result, fg="red")
+            self.source_label.config(text="")
+
+    def on_change_event(self, event, remote=False):
+        """Called by the Dashboard when a book changes here or on another till."""
+        if isinstance(event, BookSold):
+            self.changed_book_ids.add(event.book_id)
+            if event.book_id == self.current_book_id:
+                self.search(self.current_isbn, live_only=True)
+        elif isinstance(event, BookAdded):
+            self.changed_isbns.add(event.isbn)
+            if event.isbn == self.current_isbn:
+                self.search(self.current_isbn, live_only=True)
+
+
+class BookFilterView(tk.Frame):
+    """A view for browsing books by condition, language, price and rating."""
+
+    PAGE_SIZE = 25
+    ANY = "Any"
+
+    def __init__(self, parent, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        self.configure(bg="#ecf0f1")
+
+        create_page_title(self, "Browse Books").pack(pady=20, padx=20, anchor="w")
+
+        # --- Filter panel ---
+        filter_frame = tk.LabelFrame(self, text="Filters", font=("Arial", 12, "bold"), bg="#ecf0f1",
+                                     padx=15, pady=10)
+        filter_frame.pack(pady=5, padx=20, fill="x")
+
+        # Drop-down label (e.g. "Spanish (12)") -> value, filled from the facet counts
+        self.condition_choices = {}
+        self.language_choices = {}
+
+        tk.Label(filter_frame, text="Condition:", font=("Arial", 12), bg="#ecf0f1").grid(
+            row=0, column=0, padx=5, pady=5, sticky="w")
+        self.condition_box = ttk.Combobox(filter_frame, font=("Arial", 12), width=18, state="readonly")
+        self.condition_box.grid(row=0, column=1, padx=5, pady=5)
+
+        tk.Label(filter_frame, text="Language:", font=("Arial", 12), bg="#ecf0f1").grid(
+            row=0, column=2, padx=5, pady=5, sticky="w")
+        self.language_box = ttk.Combobox(filter_frame, font=("Arial", 12), width=18, state="readonly")
+        self.language_box.grid(row=0, column=3, padx=5, pady=5)
+
+        tk.Label(filter_frame, text="Status:", font=("Arial", 12), bg="#ecf0f1").grid(
+            row=0, column=4, padx=5, pady=5, sticky="w")
+        self.status_box = ttk.Combobox(filter_frame, font=("Arial", 12), width=10, state="readonly",
+                                       values=("available", "sold", "missing"))
+        self.status_box.set("available")
+        self.status_box.grid(row=0, column=5, padx=5, pady=5)
+
+        tk.Label(filter_frame, text="Min Price:", font=("Arial", 12), bg="#ecf0f1").grid(
+            row=1, column=0, padx=5, pady=5, sticky="w")
+        self.min_price_entry = tk.Entry(filter_frame, font=("Arial", 12), width=10)
+        self.min_price_entry.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+
+        tk.Label(filter_frame, text="Max Price:", font=("Arial", 12), bg="#ecf0f1").grid(
+            row=1, column=2, padx=5, pady=5, sticky="w")
+        self.max_price_entry = tk.Entry(filter_frame, font=("Arial", 12), width=10)
+        self.max_price_entry.grid(row=1, column=3, padx=5, pady=5, sticky="w")
+
+        tk.Label(filter_frame, text="Min Rating:", font=("Arial", 12), bg="#ecf0f1").grid(
+            row=1, column=4, padx=5, pady=5, sticky="w")
+        self.min_rating_entry = tk.Entry(filter_frame, font=("Arial", 12), width=10)
+        self.min_rating_entry.grid(row=1, column=5, padx=5, pady=5, sticky="w")
+
+        search_button = tk.Button(filter_frame, text="Search", command=self.perform_filter, font=("Arial", 12),
+                                  bg="#3498db", fg="white", relief="flat", highlightthickness=0)
+        search_button.grid(row=2, column=0, columnspan=6, pady=10)
+
+        for box in (self.condition_box, self.language_box, self.status_box):
+            box.bind("<<ComboboxSelected>>", lambda e: self.perform_filter())
+
+        # --- Results ---
+        columns = ("book_id", "title", "author", "condition", "language", "rating", "price", "status")
+        self.results_tree = ttk.Treeview(self, columns=columns, show="headings", height=12)
+        for column, heading, width, anchor in (
+                ("book_id", "Book ID", 70, "center"), ("title", "Title", 240, "w"), ("author", "Author", 130, "w"),
+                ("condition", "Condition", 90, "w"), ("language", "Language", 90, "w"),
+                ("rating", "Rating", 60, "center"), ("price", "Price", 70, "e"), ("status", "Status", 80, "center")):
+            self.results_tree.heading(column, text=heading)
+            self.results_tree.column(column, width=width, anchor=anchor)
+        self.results_tree.pack(padx=20, pady=10, fill="both", expand=True)
+
+        # --- Paging ---
+        page_frame = tk.Frame(self, bg="#ecf0f1")
+        page_frame.pack(pady=(0, 15))
+        self.prev_button = tk.Button(page_frame, text="< Previous", command=self.previous_page, font=("Arial", 10),
+                                     relief="flat", highlightthickness=0, state="disabled")
+        self.prev_button.pack(side="left", padx=10)
+        self.page_label = tk.Label(page_frame, text="", font=("Arial", 11), bg="#ecf0f1")
+        self.page_label.pack(side="left", padx=10)
+        self.next_button = tk.Button(page_frame, text="Next >", command=self.next_page, font=("Arial", 10),
+                                     relief="flat", highlightthickness=0, state="disabled")
+        self.next_button.pack(side="left", padx=10)
+
+        self.page = 0
+        self.set_choices(self.condition_box, self.condition_choices, {})
+        self.set_choices(self.language_box, self.language_choices, {})
+
+    def current_filters(self):
+        return {
+            "status": self.status_box.get(),
+            "condition": self.condition_choices.get(self.condition_box.get()),
+            "language": self.language_choices.get(self.language_box.get()),
+            "min_price": self.min_price_entry.get(),
+            "max_price": self.max_price_entry.get(),
+            "min_rating": self.min_rating_entry.get(),
+        }
+
+    def set_choices(self, box, choices, counts):
+        """Fill a facet drop-down with 'value (count)' labels, keeping the current choice."""
+        selected = choices.get(box.get())
+        counts = dict(counts)
+        if selected is not None:
+            # The results are still filtered by it, so keep showing it (with 0) rather than "Any"
+            counts.setdefault(selected, 0)
+        choices.clear()
+        choices[self.ANY] = None
+        for value, count in sorted(counts.items()):
+            choices[f"{value} ({count})"] = value
+        box["values"] = list(choices)
+        box.set(next((label for label, value in choices.items() if value == selected and value is not None),
+                     self.ANY))
+
+    def perform_filter(self):
+        """Handles the Search button and filter changes: back to the first page."""
+        self.page = 0
+        self.show_page()
+
+    def previous_page(self):
+        if self.page > 0:
+            self.page -= 1
+            self.show_page()
+
+    def next_page(self):
+        self.page += 1
+        self.show_page()
+
+    def show_page(self):
+        if not BACKEND_AVAILABLE:
+            messagebox.showinfo("Test Mode", "Backend not available.")
+            return
+
+        filters = self.current_filters()
+        success, result = filter_books(filters, self.page, self.PAGE_SIZE)
+        if not success:
+            messagebox.showerror("Error", result)
+            return
+
+        self.results_tree.delete(*self.results_tree.get_children())
+        for book in result["books"]:
+            rating = f"{book['rating']:.2f}" if book["rating"] is not None else ""
+            price = f"${book['resale_price']:.2f}" if book["resale_price"] is not None else ""
+            self.results_tree.insert("", "end", values=(
+                book["book_id"], book["book_name"], book["author_name"], book["condition"] or "",
+                book["language"] or "", rating, price, book["availability"]))
+
+        self.prev_button.config(state="normal" if self.page > 0 else "disabled")
+        self.next_button.config(state="normal" if result["has_next"] else "disabled")
+        shown = len(result["books"])
+        first = self.page * self.PAGE_SIZE + 1
+        self.page_label.config(text=f"Page {self.page + 1}: books {first}-{first + shown - 1}" if shown
+                               else "No books match these filters.")
+
+        # Facet counts are cached in book_logic, so refreshing them on every page is cheap
+        facets_ok, facets = book_facets(filters)
+        if facets_ok:
+            self.set_choices(self.condition_box, self.condition_choices, facets["condition"])
+            self.set_choices(self.language_box, self.language_choices, facets["language"])
 
 
 class BuyBookView(tk.Frame):
@@ -146,10 +456,18 @@ class BuyBookView(tk.Frame):
         # Configure the scrollable frame to expand the entry column
         scrollable_frame.grid_columnconfigure(1, weight=1)
 
+        # Scanning (or typing) an ISBN fills in the book details from the offline ISBN index
+        for name in ("isbn", "isbn_13"):
+            self.entries[name].bind("<Return>", self.autofill_from_isbn)
+            self.entries[name].bind("<FocusOut>", self.autofill_from_isbn)
+
         # --- Submit Button (outside the scrollable area) ---
         button_frame = tk.Frame(self, bg="#ecf0f1")
         button_frame.pack(pady=20)
 
+        self.autofill_label = tk.Label(button_frame, text="", font=("Arial", 10), bg="#ecf0f1", fg="#7f8c8d")
+        self.autofill_label.pack(pady=(0, 8))
+
         submit_button = tk.Button(button_frame, text="Submit Purchase", command=self.perform_purchase,
                                   font=("Arial", 14, "bold"), bg="#27ae60", fg="white", relief="flat",
                                   highlightthickness=0, padx=20, pady=8)
@@ -161,6 +479,35 @@ class BuyBookView(tk.Frame):
 
         canvas.bind("<MouseWheel>", _on_mousewheel)
 
+    def autofill_from_isbn(self, event):
+        """Fills the empty fields from the ISBN index; never overwrites what the clerk typed."""
+        isbn = event.widget.get().strip()
+        if not BACKEND_AVAILABLE or not isbn:
+            return
+
+        success, book = lookup_isbn_metadata(isbn)
+        if not success:
+            self.autofill_label.config(text=book, fg="#7f8c8d")
+            return
+
+        filled = []
+        for name in ("isbn", "isbn_13", "book_name", "author_name", "language", "num_pages", "average_ratings"):
+            entry = self.entries[name]
+            if book[name] is not None and not entry.get().strip():
+                entry.insert(0, str(book[name]))
+                if name not in ("isbn", "isbn_13"):
+                    filled.append(name.replace("_", " "))
+
+        if filled:
+            self.autofill_label.config(text=f"Filled in from the ISBN index: {', '.join(filled)}. Please check them.",
+                                       fg="#27ae60")
+        # Straight on to the first field still empty (usually the condition)
+        if event.keysym == "Return":
+            for entry in self.entries.values():
+                if not entry.get().strip():
+                    entry.focus_set()
+                    break
+
     def perform_purchase(self):
         """Gathers data, validates it, and calls the backend function."""
         if not BACKEND_AVAILABLE:
@@ -170,6 +517,10 @@ class BuyBookView(tk.Frame):
         data = {}
         for name, entry in self.entries.items():
             value = entry.get().strip()
+            # Only one of ISBN / ISBN-13 is needed, the backend checks them
+            if not value and name in ["isbn", "isbn_13"]:
+                data[name] = ""
+                continue
             if not value:
                 messagebox.showwarning("Input Error", f"Field '{name.replace('_', ' ').title()}' cannot be empty.")
                 return
@@ -188,6 +539,12 @@ class BuyBookView(tk.Frame):
             else:
                 data[name] = value
 
+        # Catch mistyped ISBNs here, before they become duplicate records
+        isbn_ok, isbn_result = resolve_book_isbns(data["isbn"], data["isbn_13"])
+        if not isbn_ok:
+            messagebox.showwarning("Input Error", isbn_result)
+            return
+
         success, result = add_book_and_credit_customer(
             book_name=data["book_name"], author_name=data["author_name"],
             book_condition=data["book_condition"], average_ratings=data["average_ratings"],
@@ -202,6 +559,7 @@ class BuyBookView(tk.Frame):
                                 f"Book purchased and customer credited!\nNew Book ID: {result['book_id']}\nCustomer's New Credit Total: ${result['credit_total']:.2f}")
             for entry in self.entries.values():
                 entry.delete(0, tk.END)
+            self.autofill_label.config(text="")
         else:
             messagebox.showerror("Database Error", f"Could not complete purchase.\nError: {result}")
 
@@ -247,9 +605,9 @@ class CustomerManagementView(tk.Frame):
                                          bg="#ecf0f1", padx=15, pady=15)
         deactivate_frame.pack(pady=20, padx=20, fill="x")
 
-        tk.Label(deactivate_frame, text="Customer ID:", font=("Arial", 12), bg="#ecf0f1").grid(row=0, column=0, padx=5,
-                                                                                               pady=8, sticky="w")
-        self.deactivate_id_entry = tk.Entry(deactivate_frame, font=("Arial", 12), width=30)
+        tk.Label(deactivate_frame, text="Customer:", font=("Arial", 12), bg="#ecf0f1").grid(row=0, column=0, padx=5,
+                                                                                            pady=8, sticky="w")
+        self.deactivate_id_entry = CustomerSearchBox(deactivate_frame, font=("Arial", 12), width=40)
         self.deactivate_id_entry.grid(row=0, column=1, padx=5, pady=8)
 
         deactivate_button = tk.Button(deactivate_frame, text="Mark as Inactive",
@@ -283,19 +641,23 @@ class CustomerManagementView(tk.Frame):
 
     def perform_deactivate_customer(self):
         """Handles the button click to mark a customer as inactive."""
-        customer_id = self.deactivate_id_entry.get().strip()
-        if not customer_id:
+        if not self.deactivate_id_entry.get().strip():
             messagebox.showwarning("Input Error", "Customer ID is required.")
             return
 
-        if not messagebox.askyesno("Confirm Deactivation",
-                                   f"Are you sure you want to mark customer with ID: {customer_id} as inactive?"):
-            return
-
         if not BACKEND_AVAILABLE:
             messagebox.showinfo("Test Mode", "Backend not available.")
             return
 
+        found, customer_id = self.deactivate_id_entry.resolve()
+        if not found:
+            messagebox.showwarning("Input Error", customer_id)
+            return
+
+        if not messagebox.askyesno("Confirm Deactivation",
+                                   f"Are you sure you want to mark customer with ID: {customer_id} as inactive?"):
+            return
+
         success, result = mark_customer_as_inactive(customer_id)
 
         if success:
@@ -508,10 +870,11 @@ class OrderProcessingView(tk.Frame):
         customer_frame.pack(fill="x", pady=(0, 20))
 
         # Customer ID input
-        tk.Label(customer_frame, text="Customer ID:", font=("Arial", 12), bg="#ecf0f1").grid(
+        tk.Label(customer_frame, text="Customer:", font=("Arial", 12), bg="#ecf0f1").grid(
             row=0, column=0, padx=5, pady=8, sticky="w")
-        self.customer_id_entry = tk.Entry(customer_frame, font=("Arial", 12), width=15)
+        self.customer_id_entry = CustomerSearchBox(customer_frame, font=("Arial", 12), width=40)
         self.customer_id_entry.grid(row=0, column=1, padx=5, pady=8)
+        self.customer_id_entry.bind("<<ComboboxSelected>>", lambda e: self.load_customer_info())
 
         load_customer_btn = tk.Button(customer_frame, text="Load Customer",
                                       command=self.load_customer_info,
@@ -582,6 +945,9 @@ class OrderProcessingView(tk.Frame):
         self.items_tree.column("title", width=300, anchor="w")
         self.items_tree.column("price", width=100, anchor="e")
 
+        # Books sold at another till while they sat in this order
+        self.items_tree.tag_configure("sold_elsewhere", foreground="#c0392b")
+
         self.items_tree.pack(fill="x", pady=(0, 10))
 
         # Remove item button
@@ -653,9 +1019,12 @@ class OrderProcessingView(tk.Frame):
 
     def load_customer_info(self):
         """Load customer information and credit balance."""
-        customer_id = self.customer_id_entry.get().strip()
-        if not customer_id:
-            messagebox.showwarning("Input Error", "Please enter a customer ID.")
+        if not BACKEND_AVAILABLE:
+            messagebox.showinfo("Test Mode", "Backend not available.")
+            return
+        found, customer_id = self.customer_id_entry.resolve()
+        if not found:
+            messagebox.showwarning("Input Error", customer_id)
             return
         """ #DELETE?
         if not BACKEND_AVAILABLE:
@@ -807,11 +1176,12 @@ class OrderProcessingView(tk.Frame):
         # Add items to treeview
         subtotal = 0.0
         for item in self.order_items:
+            sold_elsewhere = item.get('sold_elsewhere', False)
             self.items_tree.insert("", "end", values=(
                 item['book_id'],
-                item['title'],
+                item['title'] + (" (SOLD at another till)" if sold_elsewhere else ""),
                 f"${item['price']:.2f}"
-            ))
+            ), tags=("sold_elsewhere",) if sold_elsewhere else ())
             subtotal += item['price']
 
         # Update subtotal
@@ -883,6 +1253,11 @@ Final Amount: ${final_amount:.2f}"""
             messagebox.showwarning("Missing Employee", "Please enter an employee ID.")
             return
 
+        if any(item.get('sold_elsewhere') for item in self.order_items):
+            messagebox.showwarning("Book Already Sold",
+                                   "A book in this order was sold at another till. Please remove it first.")
+            return
+
         if not messagebox.askyesno("Confirm Order", "Are you sure you want to complete this order?"):
             return
 
@@ -914,6 +1289,31 @@ Final Amount: ${final_amount:.2f}"""
         """
 
 
+    def on_change_event(self, event, remote=False):
+        """
+        Called by the Dashboard when data changes here or on another till (remote=True).
+        Only another till's sale can take a book out of this cart; our own BookSold
+        events arrive after checkout, while the success message is still open.
+        """
+        if isinstance(event, BookSold) and remote:
+            changed = False
+            for item in self.order_items:
+                if item['book_id'] == event.book_id and not item.get('sold_elsewhere'):
+                    item['sold_elsewhere'] = True
+                    changed = True
+            if changed:
+                self.update_order_display()
+
+        elif isinstance(event, CreditChanged) and event.customer_id == self.selected_customer_id:
+            self.customer_credit = float(event.credit_total)
+            name = self.customer_info_label.cget("text").split(" | ")[0]
+            self.customer_info_label.config(text=f"{name} | Available Credit: ${self.customer_credit:.2f}")
+            self.available_credit_label.config(text=f"Available: ${self.customer_credit:.2f}")
+            self.update_final_total()
+
+        elif isinstance(event, CustomerDeactivated) and event.customer_id == self.selected_customer_id:
+            self.customer_info_label.config(text="This customer was just marked inactive.", fg="#c0392b")
+
     def clear_order(self):
         """Clear all order data and reset the form."""
         if self.order_items and not messagebox.askyesno("Clear Order", "Are you sure you want to clear this order?"):